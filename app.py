@@ -1,25 +1,42 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_from_directory, session
+from startup_profile import startup_profiler
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, g, has_request_context, abort
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
-from werkzeug.utils import secure_filename
 from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.routing import BaseConverter
 from sqlalchemy import or_
 from sqlalchemy.exc import OperationalError
 from config import Config
-from db import db
-from models import Admin, Product, Category, Order, Review, Portfolio, FAQ, ExchangeRate, SiteSettings, Collection, Store, SampleRequest, Article, DesignConsultation, UserActivity, MainCategory, Brand, Client, FirstVisit, Service
-from translations import TRANSLATIONS, get_translation, t
+from db import READ_BIND, configure_engines, db, force_primary, set_replica_reads
+from db_metrics import instrument_pools, pool_metrics
+from query_stats import begin_request_queries, endpoint_stats, explain, finish_request_queries, install_query_hooks, slow_queries
+from models import Admin, Product, Category, Order, Review, Portfolio, FAQ, ExchangeRate, SiteSettings, Collection, Store, SampleRequest, Article, DesignConsultation, UserActivity, MainCategory, Brand, Client, FirstVisit, Service, NotificationOutbox, slugify_brand_slug, unique_brand_slug
+from translations import TRANSLATIONS, CATALOGS, t
+from template_i18n import TranslatingEnvironment, TranslationExtension
+import click
+from markupsafe import Markup, escape
 import os
+import hmac
 import json
+import math
 import re
 import threading
 import time
-import urllib.request
 import urllib.parse
-import requests
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal, ROUND_HALF_UP
 
-from storage_utils import delete_uploaded_file, public_storage_url, save_uploaded_file
+from image_utils import DERIVATIVE_PREFIX, ResizeBusy, UnsupportedImage, backfill_variants, derivative_cache, describe_image, image_placeholder, image_srcset, parse_resize_params, pillow_available
+from storage_utils import content_key, public_storage_url, release_uploaded_file, save_uploaded_file, save_uploaded_files
+from upload_serving import is_fingerprinted, serve_upload, upload_info, upload_url
+from upload_gc import collect_garbage_exclusive, gc_settings, upload_gc
+from migrations import migrate, schema_status
+from chunked_uploads import ChunkError, ChunkedUpload, chunk_size, claim_upload, finish_upload, start_upload, write_chunk
+from telegram_utils import outbox_stats, queue_notification, telegram_sender
+from translation_utils import backfill_translations, enqueue_translations, translate_text
+
+startup_profiler.mark("importlar")
 
 # Portfolio: faqat ushbu room_type_uz qiymatlari (admin forma bilan mos)
 PORTFOLIO_ALLOWED_ROOM_TYPES = ('Restoran va kafe', 'Klinika', 'Xonadon')
@@ -82,303 +99,59 @@ def format_som_filter(usd_amount, usd_rate, sep: str = " "):
     return format_som(usd_amount, usd_rate, sep=sep)
 
 
-def slugify_brand_slug(text: str) -> str:
-    """URL uchun xavfsiz slug (brend nomidan)."""
-    if not (text or "").strip():
-        return "brend"
-    s = text.strip().lower()
-    s = re.sub(r"[^\w\s-]", "", s, flags=re.UNICODE)
-    s = re.sub(r"[-\s]+", "-", s).strip("-")
-    return (s[:100] or "brend").lower()
-
-
-def unique_brand_slug(base: str, exclude_brand_id=None) -> str:
-    """Brend jadvalida noyob slug."""
-    slug = base or "brend"
-    original = slug
-    n = 2
-    while True:
-        q = Brand.query.filter_by(slug=slug)
-        if exclude_brand_id is not None:
-            q = q.filter(Brand.id != exclude_brand_id)
-        if q.first() is None:
-            return slug
-        slug = f"{original}-{n}"
-        n += 1
-
-
-def seed_default_services():
-    """Birinchi marta — standart 6 ta xizmat."""
-    if Service.query.first():
-        return
-    defaults = [
-        {
-            'title_uz': '3D Dizayn Xizmati', 'title_ru': '3D Дизайн', 'title_en': '3D Design',
-            'description_uz': 'Professional dizaynerlarimiz sizning uyingiz uchun fotorealistik 3D loyiha tayyorlaydi.',
-            'description_ru': 'Профессиональные дизайнеры создадут фотореалистичный 3D проект вашей мебели.',
-            'description_en': 'Professional designers will create a photorealistic 3D project of your furniture.',
-            'features_uz': "3D vizualizatsiya\nCheksiz tahrirlash\nMaterial va rang tanlash",
-            'features_ru': "3D визуализация\nБезлимитные правки\nВыбор материалов",
-            'features_en': "3D visualization\nUnlimited revisions\nMaterial selection",
-            'price_label_uz': 'BEPUL', 'price_label_ru': 'БЕСПЛАТНО', 'price_label_en': 'FREE',
-            'cta_text_uz': 'Buyurtma', 'cta_text_ru': 'Заказать', 'cta_text_en': 'Order',
-            'cta_url': '/contact', 'icon': 'design', 'icon_theme': 'dark', 'order': 1,
-        },
-        {
-            'title_uz': "O'lchov Xizmati", 'title_ru': 'Замер', 'title_en': 'Measurement',
-            'description_uz': "Mutaxassisimiz uyingizga kelib, lazer o'lchagich yordamida millimetrgacha aniq o'lchov oladi.",
-            'description_ru': 'Специалист приедет к вам домой и сделает точные замеры лазерным инструментом.',
-            'description_en': 'A specialist will come to your home and take precise measurements with a laser tool.',
-            'features_uz': "Uyga chiqish\nLazer o'lchov\nTexnik maslahat",
-            'features_ru': "Выезд на дом\nЛазерный замер\nКонсультация",
-            'features_en': "Home visit\nLaser measurement\nConsultation",
-            'price_label_uz': 'BEPUL', 'price_label_ru': 'БЕСПЛАТНО', 'price_label_en': 'FREE',
-            'cta_text_uz': 'Raqam qoldirish', 'cta_text_ru': 'Оставить номер', 'cta_text_en': 'Leave number',
-            'cta_url': '/contact', 'icon': 'measure', 'icon_theme': 'accent', 'order': 2,
-        },
-        {
-            'title_uz': 'Ishlab Chiqarish', 'title_ru': 'Производство', 'title_en': 'Production',
-            'description_uz': '5000 m² zamonaviy fabrikamizda CNC dastgohlarida yuqori aniqlikda ishlab chiqaramiz.',
-            'description_ru': 'Современная фабрика 5000 м² с CNC станками для высокоточного производства.',
-            'description_en': 'Modern 5000 m² factory with CNC machines for high-precision manufacturing.',
-            'features_uz': "CNC texnologiyasi\nImport materiallar\n7-21 kun muddat",
-            'features_ru': "CNC технология\nИмпортные материалы\n7-21 день",
-            'features_en': "CNC technology\nImport materials\n7-21 days",
-            'price_label_uz': "Loyihaga bog'liq", 'price_label_ru': 'Цена по проекту', 'price_label_en': 'Price by project',
-            'cta_text_uz': "Ko'rish", 'cta_text_ru': 'Смотреть', 'cta_text_en': 'View',
-            'cta_url': '/products', 'icon': 'production', 'icon_theme': 'dark', 'order': 3,
-        },
-        {
-            'title_uz': 'Yetkazib Berish', 'title_ru': 'Доставка', 'title_en': 'Delivery',
-            'description_uz': "O'z transportimiz orqali O'zbekiston bo'ylab xavfsiz qadoqlash bilan yetkazamiz.",
-            'description_ru': 'Собственный транспорт для безопасной доставки по всему Узбекистану.',
-            'description_en': 'Own transport for safe delivery throughout Uzbekistan.',
-            'features_uz': "Toshkent - BEPUL\nViloyatlarga yetkazish\nXavfsiz qadoqlash",
-            'features_ru': "Ташкент - бесплатно\nДоставка в регионы\nБезопасная упаковка",
-            'features_en': "Tashkent - free\nRegional delivery\nSafe packaging",
-            'price_label_uz': 'BEPUL*', 'price_label_ru': 'БЕСПЛАТНО*', 'price_label_en': 'FREE*',
-            'price_note_uz': "*Toshkent bo'ylab", 'price_note_ru': '*По Ташкенту', 'price_note_en': '*In Tashkent',
-            'cta_url': '/contact', 'icon': 'delivery', 'icon_theme': 'accent', 'order': 4,
-        },
-        {
-            'title_uz': "O'rnatish Xizmati", 'title_ru': 'Установка', 'title_en': 'Installation',
-            'description_uz': "Tajribali ustalarimiz mebelni professional tarzda o'rnatib, sozlab berishadi.",
-            'description_ru': 'Опытные мастера профессионально установят и настроят вашу мебель.',
-            'description_en': 'Experienced craftsmen will professionally install and adjust your furniture.',
-            'features_uz': "Professional o'rnatish\nChiqindilarni olib ketish\nSozlash va tekshirish",
-            'features_ru': "Профессиональная установка\nВывоз мусора\nНастройка",
-            'features_en': "Professional installation\nWaste removal\nAdjustment",
-            'price_label_uz': "Ko'pincha bepul", 'price_label_ru': 'Часто бесплатно', 'price_label_en': 'Often free',
-            'cta_text_uz': "So'rash", 'cta_text_ru': 'Спросить', 'cta_text_en': 'Ask',
-            'cta_url': '/contact', 'icon': 'installation', 'icon_theme': 'dark', 'order': 5,
-        },
-        {
-            'title_uz': 'Kafolat Xizmati', 'title_ru': 'Гарантия', 'title_en': 'Warranty',
-            'description_uz': "25 yilgacha kafolat. Muammo bo'lsa bepul ta'mirlaymiz yoki almashtiramiz.",
-            'description_ru': 'До 25 лет гарантии. При проблемах бесплатно отремонтируем или заменим.',
-            'description_en': "Up to 25 years warranty. We'll repair or replace for free if there are issues.",
-            'features_uz': "25 yil kafolat\nBepul ta'mirlash\n24/7 qo'llab-quvvatlash",
-            'features_ru': "25 лет гарантии\nБесплатный ремонт\n24/7 поддержка",
-            'features_en': "25 year warranty\nFree repair\n24/7 support",
-            'price_label_uz': '25 YIL', 'price_label_ru': '25 ЛЕТ', 'price_label_en': '25 YEARS',
-            'price_note_uz': 'maksimal kafolat', 'price_note_ru': 'максимум', 'price_note_en': 'maximum',
-            'cta_url': '/contact', 'icon': 'warranty', 'icon_theme': 'accent', 'order': 6,
-        },
-    ]
-    for d in defaults:
-        db.session.add(Service(**d, is_active=True))
-    db.session.commit()
-    print('Created default services')
-
-
 # ============ AUTO-TRANSLATE FUNCTION (FREE) ============
 def auto_translate(text, target_lang='ru'):
     """
-    Avtomatik tarjima qilish (Google Translate API - bepul)
+    Avtomatik tarjima qilish (sinxron — kichik formalar uchun)
     text: o'zbek tilidagi matn
     target_lang: maqsad til ('ru' yoki 'en')
+    Tarjima xotirasi + provayder (TRANSLATION_PROVIDER); xato bo'lsa asl matn qaytadi.
     """
-    if not text or not text.strip():
-        return text
-    
-    try:
-        # Google Translate API (bepul, cheklangan)
-        base_url = "https://translate.googleapis.com/translate_a/single"
-        params = {
-            'client': 'gtx',
-            'sl': 'uz',  # source language: Uzbek
-            'tl': target_lang,  # target language
-            'dt': 't',
-            'q': text
-        }
-        url = f"{base_url}?{urllib.parse.urlencode(params)}"
-        
-        req = urllib.request.Request(url, headers={'User-Agent': 'Mozilla/5.0'})
-        response = urllib.request.urlopen(req, timeout=5)
-        result = json.loads(response.read().decode('utf-8'))
-        
-        # Tarjima natijasini olish
-        if result and result[0]:
-            translated = ''.join([item[0] for item in result[0] if item[0]])
-            return translated
-        return text
-    except Exception as e:
-        print(f"Translation error: {e}")
-        return text  # Xato bo'lsa, asl matnni qaytarish
+    translated = translate_text(text, target_lang)
+    return text if translated is None else translated
 
+startup_profiler.mark("yordamchi funksiyalar")
 app = Flask(__name__)
 app.config.from_object(Config)
 
+# Shablonlar har til uchun alohida kompilyatsiya qilinadi: T.nav.home[lang] -> tayyor matn
+app.jinja_environment = TranslatingEnvironment
+app.jinja_options = {**app.jinja_options, "extensions": [TranslationExtension]}
+
 # Register money filters (app must exist first)
 app.jinja_env.filters["to_som"] = to_som_filter
 app.jinja_env.filters["format_som"] = format_som_filter
 
 db.init_app(app)
+configure_engines(app)
+instrument_pools(app)
+install_query_hooks(app)
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'admin_login'
+startup_profiler.mark("app, config, kengaytmalar")
 
 
-def _table_column_names(inspector, table_name):
-    try:
-        return [c["name"] for c in inspector.get_columns(table_name)]
-    except Exception:
-        return None
-
-
-def apply_db_migrations():
+def ensure_schema():
     """
-    Render/Gunicorn ishga tushganda migratsiyalar ( __main__ dagi kabi ).
-    Yetishmayotgan ustunlar va jadvallar — 500 xatolarning asosiy sababi.
+    Import vaqtida faqat sxema versiyasi tekshiriladi (bitta so'rov). Migratsiyalarni release
+    bosqichi qo'llaydi: flask --app app db-migrate. AUTO_MIGRATE=1 — worker o'zi qo'llaydi (lock ostida).
     """
-    from sqlalchemy import inspect, text
-
-    inspector = inspect(db.engine)
-    tables = set(inspector.get_table_names())
-
-    # PostgreSQL: `order` rezerv so'z — `orders` ga o'tkazish
-    if "order" in tables and "orders" not in tables:
-        try:
-            if db.engine.dialect.name == "postgresql":
-                db.session.execute(text('ALTER TABLE "order" RENAME TO orders'))
-            else:
-                db.session.execute(text('ALTER TABLE "order" RENAME TO orders'))
-            db.session.commit()
-            tables = set(inspect(db.engine).get_table_names())
-            print("Renamed order table to orders")
-        except Exception as e:
-            print(f"Order table rename note: {e}")
-            db.session.rollback()
-
-    db.create_all()
-    inspector = inspect(db.engine)
-    tables = set(inspector.get_table_names())
-
-    def add_col(table, column, coltype):
-        cols = _table_column_names(inspector, table)
-        if cols is None or column in cols:
-            return
-        db.session.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {coltype}"))
-
-    # category
-    if "category" in tables:
-        add_col("category", "name_ru", "VARCHAR(100)")
-        add_col("category", "name_en", "VARCHAR(100)")
-        add_col("category", "main_category_id", "INTEGER")
-
-    # product
-    if "product" in tables:
-        for col, ctype in (
-            ("name_ru", "VARCHAR(200)"),
-            ("name_en", "VARCHAR(200)"),
-            ("description_ru", "TEXT"),
-            ("description_en", "TEXT"),
-            ("colors", "TEXT"),
-            ("price_som", "INTEGER"),
-            ("discount", "INTEGER DEFAULT 0"),
-            ("material_ru", "VARCHAR(100)"),
-            ("material_en", "VARCHAR(100)"),
-            ("material_uz", "VARCHAR(100)"),
-            ("warranty_uz", "VARCHAR(50)"),
-        ):
-            add_col("product", col, ctype)
-
-    # portfolio
-    if "portfolio" in tables:
-        portfolio_cols = _table_column_names(inspector, "portfolio") or []
-        for col, ctype in (
-            ("title_ru", "VARCHAR(200)"),
-            ("title_en", "VARCHAR(200)"),
-            ("description_ru", "TEXT"),
-            ("description_en", "TEXT"),
-            ("room_type_uz", "VARCHAR(50)"),
-        ):
-            add_col("portfolio", col, ctype)
-        if "room_type_uz" in (_table_column_names(inspector, "portfolio") or []) and "room_type" in portfolio_cols:
-            try:
-                db.session.execute(
-                    text(
-                        "UPDATE portfolio SET room_type_uz = room_type "
-                        "WHERE (room_type_uz IS NULL OR room_type_uz = '') AND room_type IS NOT NULL"
-                    )
-                )
-            except Exception as e:
-                print(f"Portfolio room_type_uz backfill note: {e}")
-
-    # review
-    if "review" in tables:
-        add_col("review", "main_category_id", "INTEGER")
-        add_col("review", "text_ru", "TEXT")
-        add_col("review", "text_en", "TEXT")
-
-    # brand
-    if "brand" in tables:
-        brand_columns = _table_column_names(inspector, "brand") or []
-        if "slug" not in brand_columns:
-            add_col("brand", "slug", "VARCHAR(120)")
-        for colname, coltype in (
-            ("tagline_uz", "VARCHAR(500)"),
-            ("tagline_ru", "VARCHAR(500)"),
-            ("tagline_en", "VARCHAR(500)"),
-            ("description_uz", "TEXT"),
-            ("description_ru", "TEXT"),
-            ("description_en", "TEXT"),
-        ):
-            add_col("brand", colname, coltype)
-
-    try:
-        db.session.commit()
-    except Exception as e:
-        print(f"Migration commit error: {e}")
-        db.session.rollback()
-
-    db.create_all()
-
-    try:
-        seed_default_services()
-    except Exception as e:
-        print(f"Service seed note: {e}")
-        db.session.rollback()
-
-    try:
-        if "brand" in inspect(db.engine).get_table_names():
-            slug_cols = _table_column_names(inspect(db.engine), "brand") or []
-            if "slug" in slug_cols:
-                for b in Brand.query.order_by(Brand.id).all():
-                    if not getattr(b, "slug", None) or not str(b.slug).strip():
-                        base = slugify_brand_slug(b.name_uz or b.name or f"brend-{b.id}")
-                        b.slug = unique_brand_slug(base, exclude_brand_id=b.id)
-                db.session.commit()
-    except Exception as e:
-        print(f"Brand slug backfill note: {e}")
-        db.session.rollback()
-
-
-def ensure_schema():
-    """App import vaqtida migratsiyalar (Render/gunicorn uchun)."""
     try:
         with app.app_context():
-            apply_db_migrations()
+            if startup_profiler.enabled:
+                with startup_profiler.phase("DB ulanish"):
+                    db.engine.connect().close()
+            with startup_profiler.phase("sxema versiyasi"):
+                current, latest = schema_status()
+            if current is not None and current >= latest:
+                return
+            if app.config.get('AUTO_MIGRATE'):
+                with startup_profiler.phase("migratsiyalar"):
+                    migrate(app)
+            else:
+                print(f"DIQQAT: baza sxemasi eski (versiya {current}, kerak {latest}) — "
+                      f"flask --app app db-migrate ni ishga tushiring")
     except Exception as e:
         print(f"Schema ensure error: {e}")
 
@@ -466,18 +239,8 @@ def ensure_upload_dirs():
     os.makedirs(os.path.join(upload_folder, 'brands'), exist_ok=True)
 
 # Initialize upload directories
-ensure_upload_dirs()
-
-# Ensure all tables exist (protect against missing tables in existing DB)
-def ensure_tables():
-    try:
-        with app.app_context():
-            db.create_all()
-    except OperationalError as e:
-        print(f"DB init error: {e}")
-
-# Run once on startup
-ensure_tables()
+with startup_profiler.phase("upload papkalari"):
+    ensure_upload_dirs()
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 
@@ -486,6 +249,22 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def product_upload_keys(product):
+    """Mahsulot ishlatadigan barcha fayl kalitlari (rasmlar + rang rasmlari)"""
+    keys = []
+    try:
+        keys.extend(json.loads(product.images) if product.images else [])
+    except (TypeError, ValueError):
+        pass
+    try:
+        colors = json.loads(product.colors) if product.colors else []
+    except (TypeError, ValueError):
+        colors = []
+    if isinstance(colors, list):
+        keys.extend(c['image'] for c in colors if isinstance(c, dict) and c.get('image'))
+    return keys
+
+
 # ============ CURRENCY / EXCHANGE RATE HELPERS ============
 
 _EXCHANGE_RATE_CACHE = {"value": None, "expires_mono": 0.0}
@@ -524,7 +303,7 @@ def get_exchange_rate() -> float:
     return v
 
 
-DEFAULT_HERO_BACKGROUND = '/uploads/designs/3.jpg'
+DEFAULT_HERO_BACKGROUND = 'designs/3.jpg'
 
 
 def get_site_settings() -> SiteSettings:
@@ -537,15 +316,83 @@ def get_site_settings() -> SiteSettings:
     return s
 
 
-def get_hero_background_url() -> str:
-    """Bosh sahifa Hero fon rasmi URL (default — designs/3.jpg)."""
+def get_hero_background_key() -> str:
+    """Bosh sahifa Hero fon rasmi kaliti (default — designs/3.jpg)."""
     s = get_site_settings()
     if s.hero_background_image and s.hero_background_image.strip():
-        return f"/uploads/{s.hero_background_image.lstrip('/')}"
+        return s.hero_background_image
     return DEFAULT_HERO_BACKGROUND
 
+
+def get_hero_background_url() -> str:
+    """Bosh sahifa Hero fon rasmi URL."""
+    return upload_url(app, get_hero_background_key(), w=1920)
+
 # ============ USER ACTIVITY TRACKING ============
 
+# Activity yozuvlari kichik thread pool da (har so'rovga yangi thread emas); shutdown da kutiladi
+ACTIVITY_WRITERS = 2
+_activity_executor = None
+_activity_pid = None
+_activity_lock = threading.Lock()
+_activity_pending = set()
+# Navbat chegarasi (yozilayotgan + kutayotgan): DB sekinlashsa xotira o'smasin — to'lsa yozuv tashlanadi
+_activity_slots = threading.BoundedSemaphore(max(1, int(os.environ.get("ACTIVITY_QUEUE_SIZE", "500"))))
+
+
+def _get_activity_executor():
+    global _activity_executor, _activity_pid
+    with _activity_lock:
+        # fork dan keyin (gunicorn worker) ota jarayonning thread lari yo'q
+        if _activity_executor is None or _activity_pid != os.getpid():
+            _activity_executor = ThreadPoolExecutor(max_workers=ACTIVITY_WRITERS, thread_name_prefix="activity")
+            _activity_pid = os.getpid()
+            _activity_pending.clear()
+        return _activity_executor
+
+
+def _activity_done(future):
+    with _activity_lock:
+        _activity_pending.discard(future)
+    _activity_slots.release()
+
+
+def _submit_user_activity(payload):
+    """Activity yozuvini navbatga qo'yadi; navbat to'la yoki executor yopilgan bo'lsa tashlanadi."""
+    if not _activity_slots.acquire(blocking=False):
+        print(f"Activity navbati to'la — yozuv tashlandi ({payload['activity_type']} {payload['page_url']})")
+        return
+    try:
+        future = _get_activity_executor().submit(_save_user_activity_background, app, payload)
+    except RuntimeError:
+        _activity_slots.release()
+        return
+    with _activity_lock:
+        _activity_pending.add(future)
+    future.add_done_callback(_activity_done)
+
+
+def wait_for_user_activity(timeout=None) -> bool:
+    """
+    Navbatdagi activity yozuvlarini ``timeout`` soniyagacha kutadi (graceful shutdown), keyin
+    boshlanmaganlarini bekor qiladi. Hammasi yozilgan bo'lsa True.
+    """
+    from concurrent.futures import wait
+
+    global _activity_executor
+    with _activity_lock:
+        executor, _activity_executor = _activity_executor, None
+        owned = _activity_pid == os.getpid()
+        pending = list(_activity_pending)
+    if executor is None or not owned:
+        return True
+    _done, not_done = wait(pending, timeout=timeout)
+    executor.shutdown(wait=False, cancel_futures=True)
+    if not_done:
+        print(f"Activity navbati: {len(not_done)} ta yozuv {timeout}s ichida tugamadi — bekor qilindi")
+    return not not_done
+
+
 def _save_user_activity_background(flask_app, payload):
     """PG ga yozishni so'rovdan ajratadi — sahifa tezroq ochiladi."""
     with flask_app.app_context():
@@ -582,15 +429,56 @@ def _save_user_activity_background(flask_app, payload):
                 pass
 
 
+@app.before_request
+def start_query_log():
+    """QUERY_DEBUG: shu so'rovdagi SQL lar sanaladi (birinchi hook — hammasi hisobga kirsin)."""
+    if app.config.get('QUERY_DEBUG'):
+        begin_request_queries()
+
+@app.after_request
+def report_query_log(response):
+    return finish_request_queries(app, response)
+
+@app.before_request
+def start_background_senders():
+    """Outbox yuboruvchisi worker da ishlab turishini ta'minlaydi (qayta ishga tushgandan keyin ham)."""
+    telegram_sender.ensure_running(app)
+    upload_gc.ensure_running(app)
+
+# DATABASE_REPLICA_URL: GET/HEAD sahifalar (katalog, analitika, sitemap) replikadan o'qiydi
+REPLICA_ROUTING = app.config.get('DB_READ_ROUTING') == 'request' and READ_BIND in app.config.get('SQLALCHEMY_BINDS', {})
+
+# Yozuvdan keyin (POST -> redirect -> GET) bir necha soniya asosiy bazadan — o'z yozuvini ko'radi.
+# Alohida qisqa muddatli cookie: sessiya o'qilmaydi/qayta yozilmaydi (Vary: Cookie yo'q)
+PRIMARY_PIN_COOKIE = 'db_primary'
+
+@app.before_request
+def choose_read_database():
+    if not REPLICA_ROUTING:
+        return
+    pinned = PRIMARY_PIN_COOKIE in request.cookies
+    set_replica_reads(request.method in ('GET', 'HEAD') and not pinned)
+
+@app.after_request
+def pin_primary_after_write(response):
+    # Faqat haqiqatan yozuv commit qilingan so'rovlardan keyin (db.RoutingSession.committed_write)
+    if REPLICA_ROUTING and db.session().committed_write:
+        sticky = app.config.get('DATABASE_REPLICA_STICKY_SECONDS', 5)
+        response.set_cookie(PRIMARY_PIN_COOKIE, '1', max_age=max(1, math.ceil(sticky)), httponly=True,
+                            samesite='Lax', secure=request.is_secure)
+    return response
+
 @app.before_request
 def track_user_activity():
     """Track user activity - sahifalar va mahsulotlar ko'rish (refreshlarni filtrlash)"""
+    # /ru/..., /en/... prefiksisiz yo'l — sahifa nomlari barcha tillar uchun bir xil
+    path = split_lang_prefix(request.path)[1]
     # Admin panel va static fayllarni kuzatmaymiz
-    if request.path.startswith('/admin') or request.path.startswith('/static') or request.path.startswith('/uploads'):
+    if path.startswith('/admin') or path.startswith('/static') or path.startswith('/uploads'):
         return
     
     # API endpointlarni ham kuzatmaymiz
-    if request.path.startswith('/api') or request.path.startswith('/search'):
+    if path.startswith('/api') or path.startswith('/search') or path.startswith('/metrics'):
         return
     
     # Refreshlarni filtrlash - bir xil sahifaga 30 soniya ichida qayta kirishni sanamaslik
@@ -640,43 +528,43 @@ def track_user_activity():
         product_id = None
         product_name = None
         
-        if request.path == '/':
+        if path == '/':
             page_name = 'Bosh sahifa'
-        elif request.path.startswith('/products'):
+        elif path.startswith('/products'):
             page_name = 'Mahsulotlar'
-        elif request.path.startswith('/product/'):
+        elif path.startswith('/product/'):
             try:
-                product_id_str = request.path.split('/product/')[1].split('/')[0]
+                product_id_str = path.split('/product/')[1].split('/')[0]
                 product_id = int(product_id_str)
                 activity_type = 'product_view'
                 page_name = 'Mahsulot'
             except Exception:
                 product_id = None
-        elif request.path.startswith('/category/'):
+        elif path.startswith('/category/'):
             page_name = 'Kategoriya'
-        elif request.path.startswith('/portfolio'):
+        elif path.startswith('/portfolio'):
             page_name = 'Portfolio'
-        elif request.path.startswith('/collections'):
+        elif path.startswith('/collections'):
             page_name = 'Kolleksiyalar'
-        elif request.path.startswith('/brands/'):
+        elif path.startswith('/brands/'):
             page_name = 'Brend'
-        elif request.path == '/brands':
+        elif path == '/brands':
             page_name = 'Brendlar'
-        elif request.path.startswith('/about'):
+        elif path.startswith('/about'):
             page_name = 'Biz haqimizda'
-        elif request.path.startswith('/contact'):
+        elif path.startswith('/contact'):
             page_name = 'Kontakt'
-        elif request.path.startswith('/faq'):
+        elif path.startswith('/faq'):
             page_name = 'FAQ'
-        elif request.path.startswith('/services'):
+        elif path.startswith('/services'):
             page_name = 'Xizmatlar'
-        elif request.path.startswith('/why-us'):
+        elif path.startswith('/why-us'):
             page_name = 'Nima uchun biz'
-        elif request.path.startswith('/interior-design'):
+        elif path.startswith('/interior-design'):
             page_name = 'Interer dizayn'
-        elif request.path.startswith('/order'):
+        elif path.startswith('/order'):
             page_name = 'Buyurtma'
-        elif request.path.startswith('/cart'):
+        elif path.startswith('/cart'):
             page_name = 'Savatcha'
         
         payload = {
@@ -690,11 +578,7 @@ def track_user_activity():
             "product_name": product_name,
             "referrer": referrer[:500],
         }
-        threading.Thread(
-            target=_save_user_activity_background,
-            args=(app, payload),
-            daemon=True,
-        ).start()
+        _submit_user_activity(payload)
     except Exception as e:
         print(f"Activity tracking error: {e}")
 
@@ -719,7 +603,7 @@ def index():
     hero_background_url = get_hero_background_url()
     return render_template('index.html', main_categories=main_categories, categories=categories, bestsellers=bestsellers, 
                          reviews=reviews, portfolios=portfolios, collections=collections, articles=articles, brands=brands, clients=clients,
-                         hero_background_url=hero_background_url)
+                         hero_background_url=hero_background_url, hero_placeholder=image_placeholder(get_hero_background_key()))
 
 @app.route('/search')
 def search():
@@ -773,20 +657,23 @@ def search():
             'name': p.name_uz,
             'price': usd_to_som(p.price, rate) if p.price is not None else None,
             'image': json.loads(p.images)[0] if p.images else None,
+            'image_url': upload_url(app, json.loads(p.images)[0]) if p.images else None,
             'category': p.category.name_uz if p.category else None,
-            'url': f'/product/{p.id}'
+            'url': url_for('product_detail', product_id=p.id)
         } for p in products],
         'categories': [{
             'id': c.id,
             'name': c.name_uz,
             'image': c.image,
-            'url': f'/category/{c.slug}'
+            'image_url': upload_url(app, c.image) or None,
+            'url': url_for('category_detail', slug=c.slug)
         } for c in categories],
         'portfolios': [{
             'id': p.id,
             'title': p.title_uz,
             'image': p.after_image,
-            'url': f'/portfolio'
+            'image_url': upload_url(app, p.after_image) or None,
+            'url': url_for('portfolio')
         } for p in portfolios]
     }
     
@@ -1091,6 +978,10 @@ def api_portfolio():
             'room_type_uz': p.room_type_uz or '',
             'before_image': p.before_image,
             'after_image': p.after_image,
+            'before_image_url': upload_url(app, p.before_image),
+            'after_image_url': upload_url(app, p.after_image),
+            'before_image_placeholder': image_placeholder(p.before_image),
+            'after_image_placeholder': image_placeholder(p.after_image),
         })
     return jsonify(ok=True, portfolios=items)
 
@@ -1136,8 +1027,7 @@ def order():
             if 'design_image' in request.files:
                 file = request.files['design_image']
                 if file and allowed_file(file.filename):
-                    filename = secure_filename(file.filename)
-                    filepath = os.path.join('designs', filename)
+                    filepath = content_key('designs', file)
                     save_uploaded_file(app, file, filepath)
                     design_image = filepath
 
@@ -1162,28 +1052,13 @@ def order():
     categories = Category.query.all()
     return render_template('order.html', categories=categories)
 
-def send_telegram_message(message):
-    """Telegram botga xabar yuborish"""
-    try:
-        token = app.config.get('TELEGRAM_BOT_TOKEN')
-        chat_id = app.config.get('TELEGRAM_CHAT_ID')
-        
-        if not token or not chat_id:
-            print("Telegram bot token yoki chat_id topilmadi")
-            return False
-        
-        url = f"https://api.telegram.org/bot{token}/sendMessage"
-        data = {
-            'chat_id': chat_id,
-            'text': message,
-            'parse_mode': 'HTML'
-        }
-        
-        response = requests.post(url, data=data, timeout=10)
-        return response.status_code == 200
-    except Exception as e:
-        print(f"Telegram xabar yuborishda xatolik: {e}")
-        return False
+def send_telegram_message(message, kind='general'):
+    """Telegram xabarini outbox ga qo'shadi — chaqiruvchi uni asosiy yozuv bilan bitta commit da saqlaydi."""
+    return queue_notification(message, kind)
+
+def notify_telegram_sender():
+    """Commit dan keyin: fon yuboruvchini uyg'otish."""
+    telegram_sender.wake(app)
 
 @app.route('/custom')
 def custom():
@@ -1237,32 +1112,28 @@ def custom_order():
 {message_display}
 """
         
-        # Telegram'ga yuborish
-        telegram_sent = send_telegram_message(telegram_message)
-        
-        # Database'ga saqlash (ixtiyoriy)
-        try:
-            order = Order(
-                furniture_type=f'Individual: {legs}, {seat}, {backrest}',
-                size='',
-                color=material,
-                material=seat,
-                phone=phone,
-                name=name,
-                address=message
-            )
-            db.session.add(order)
-            db.session.commit()
-        except Exception as e:
-            print(f"Database'ga saqlashda xatolik: {e}")
-            db.session.rollback()
+        # Buyurtma va Telegram xabari bitta tranzaksiyada (outbox)
+        order = Order(
+            furniture_type=f'Individual: {legs}, {seat}, {backrest}',
+            size='',
+            color=material,
+            material=seat,
+            phone=phone,
+            name=name,
+            address=message
+        )
+        db.session.add(order)
+        send_telegram_message(telegram_message, kind='custom_order')
+        db.session.commit()
+        notify_telegram_sender()
         
         return jsonify({
             'success': True,
-            'telegram_sent': telegram_sent,
+            'telegram_queued': True,
             'message': 'Buyurtmangiz qabul qilindi! Tez orada siz bilan bog\'lanamiz.'
         })
     except Exception as e:
+        db.session.rollback()
         print(f"Xatolik: {e}")
         return jsonify({
             'success': False,
@@ -1308,28 +1179,24 @@ def first_visit():
 <b>Vaqt:</b> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
 """
         
-        # Telegram'ga yuborish
-        telegram_sent = send_telegram_message(telegram_message)
-        
-        # DB ga saqlash
-        try:
-            first_visit_record = FirstVisit(
-                name=name,
-                phone=phone,
-                interest=interest
-            )
-            db.session.add(first_visit_record)
-            db.session.commit()
-        except Exception as db_error:
-            print(f"DB saqlash xatolik: {db_error}")
-            db.session.rollback()
+        # DB ga saqlash (Telegram xabari outbox orqali, shu tranzaksiyada)
+        first_visit_record = FirstVisit(
+            name=name,
+            phone=phone,
+            interest=interest
+        )
+        db.session.add(first_visit_record)
+        send_telegram_message(telegram_message, kind='first_visit')
+        db.session.commit()
+        notify_telegram_sender()
         
         return jsonify({
             'success': True,
-            'telegram_sent': telegram_sent,
+            'telegram_queued': True,
             'message': 'Rahmat! Ma\'lumotlaringiz qabul qilindi.'
         })
     except Exception as e:
+        db.session.rollback()
         print(f"Xatolik: {e}")
         return jsonify({
             'success': False,
@@ -1371,15 +1238,15 @@ def contact():
 <b>Xabar:</b>
 {message if message else "Qo'shimcha xabar yo'q"}
 """
-            send_telegram_message(telegram_message)
-
             db.session.add(Order(
                 furniture_type=f'Aloqa: {subject_display}',
                 phone=phone,
                 name=name or None,
                 address=message or None,
             ))
+            send_telegram_message(telegram_message, kind='contact')
             db.session.commit()
+            notify_telegram_sender()
             flash('Xabaringiz yuborildi! Tez orada siz bilan bog\'lanamiz.', 'success')
         except Exception as e:
             db.session.rollback()
@@ -1526,6 +1393,31 @@ def get_cart_total():
             total += unit * int(item['quantity'])
     return total
 
+@app.context_processor
+def image_context():
+    """Rasm URL lari: ``{{ upload_url(images[0]) }}`` va ``{{ responsive_attrs(images[0], '50vw') }}``"""
+    def responsive_attrs(key, sizes='100vw'):
+        attrs = []
+        srcset = image_srcset(app, key)
+        if srcset:
+            attrs.append(f'srcset="{escape(srcset)}" sizes="{escape(sizes)}"')
+        # O'lcham (layout shift yo'q) va rasm yuklanguncha xira LQIP fon
+        placeholder = image_placeholder(key)
+        if placeholder:
+            attrs.append(f'width="{placeholder["width"]}" height="{placeholder["height"]}"')
+            if placeholder['lqip']:
+                attrs.append(
+                    f'style="background:{escape(placeholder["color"])} url({escape(placeholder["lqip"])}) center/cover no-repeat" '
+                    'onload="this.style.background=\'\'"'
+                )
+        return Markup(' '.join(attrs))
+    return {
+        'responsive_attrs': responsive_attrs,
+        'upload_url': lambda key, **params: upload_url(app, key, **params),
+        # JS da yig'iladigan URL lar uchun (admin oldindan ko'rish)
+        'uploads_base': public_storage_url(app, '_').rstrip('_'),
+    }
+
 @app.context_processor
 def cart_context():
     """Make cart count available in all templates"""
@@ -1548,34 +1440,118 @@ def currency_context():
 
 SUPPORTED_LANGUAGES = ['uz', 'ru', 'en']
 DEFAULT_LANGUAGE = 'uz'
+# O'zbekcha — ildizda (/products), qolganlari prefiks bilan (/ru/products, /en/products)
+PREFIXED_LANGUAGES = [l for l in SUPPORTED_LANGUAGES if l != DEFAULT_LANGUAGE]
+# Til prefiksi qo'shilmaydigan yo'llar (admin, fayllar, SEO xizmat fayllari)
+LANGUAGE_NEUTRAL_PATHS = ('/admin', '/static', '/uploads', '/set-language', '/robots.txt', '/sitemap.xml', '/google', '/metrics')
+
+
+class LanguageConverter(BaseConverter):
+    """URL dagi til prefiksi: faqat PREFIXED_LANGUAGES qiymatlari."""
+    regex = '|'.join(PREFIXED_LANGUAGES)
+
+
+app.url_map.converters['lang'] = LanguageConverter
+
+
+def _template_language():
+    """Shablon kompilyatsiyasi uchun til — so'rov konteksti bo'lmasa None."""
+    if not has_request_context():
+        return None
+    return get_locale()
+
+
+app.jinja_env.language_getter = _template_language
+
+
+def split_lang_prefix(path):
+    """'/ru/products' -> ('ru', '/products'); prefiks bo'lmasa (DEFAULT_LANGUAGE, path)."""
+    for code in PREFIXED_LANGUAGES:
+        prefix = f'/{code}'
+        if path == prefix or path.startswith(prefix + '/'):
+            return code, path[len(prefix):] or '/'
+    return DEFAULT_LANGUAGE, path
+
+
+def lang_path(path, lang):
+    """Yo'lni boshqa til variantiga o'tkazish: lang_path('/ru/products', 'en') -> '/en/products'."""
+    _, bare = split_lang_prefix(path)
+    if lang not in PREFIXED_LANGUAGES or bare.startswith(LANGUAGE_NEUTRAL_PATHS):
+        return bare
+    return f'/{lang}{bare}'
+
 
 def get_locale():
-    """Get current language from session"""
-    return session.get('lang', DEFAULT_LANGUAGE)
+    """Joriy til — URL prefiksidan olinadi; prefikssiz yo'l o'zbekcha."""
+    lang = g.get('lang_code')
+    if lang is None:
+        lang = split_lang_prefix(request.path)[0]
+    return lang
+
+
+@app.url_value_preprocessor
+def pull_lang_code(endpoint, values):
+    """/<lang_code>/... qoidalaridan tilni olib, view funksiyalarga uzatmaydi."""
+    g.lang_code = (values or {}).pop('lang_code', None) or split_lang_prefix(request.path)[0]
+
+
+@app.url_defaults
+def add_lang_code(endpoint, values):
+    """url_for joriy til prefiksini saqlaydi (o'zbekcha uchun prefiks qo'shilmaydi)."""
+    if values.get('lang_code') == DEFAULT_LANGUAGE:
+        values.pop('lang_code')
+        return
+    if 'lang_code' in values:
+        return
+    lang = g.get('lang_code', DEFAULT_LANGUAGE)
+    if lang != DEFAULT_LANGUAGE and app.url_map.is_endpoint_expecting(endpoint, 'lang_code'):
+        values['lang_code'] = lang
+
+
+def register_language_routes():
+    """Barcha ommaviy sahifalar uchun /ru/... va /en/... nusxa qoidalarini qo'shadi."""
+    for rule in list(app.url_map.iter_rules()):
+        if rule.rule.startswith(LANGUAGE_NEUTRAL_PATHS) or 'lang_code' in rule.arguments:
+            continue
+        methods = sorted((rule.methods or set()) - {'HEAD', 'OPTIONS'})
+        app.add_url_rule(f'/<lang:lang_code>{rule.rule}', endpoint=rule.endpoint, methods=methods)
+
 
 @app.context_processor
 def language_context():
     """Make language and translations available in all templates"""
     current_lang = get_locale()
+    catalog = CATALOGS.get(current_lang) or CATALOGS[DEFAULT_LANGUAGE]
     
     def translate(key_path):
-        """Template helper for translations"""
-        return get_translation(key_path, current_lang)
+        """Template helper for translations (o'zgarmas kalitlar kompilyatsiyada almashtiriladi)"""
+        return catalog.get(key_path, key_path)
+    
+    query = request.query_string.decode('utf-8', 'ignore')
+    suffix = f'?{query}' if query else ''
+    lang_urls = {code: lang_path(request.path, code) + suffix for code in SUPPORTED_LANGUAGES}
     
     return {
         'lang': current_lang, 
         'languages': SUPPORTED_LANGUAGES,
+        'lang_prefix': '' if current_lang == DEFAULT_LANGUAGE else f'/{current_lang}',
+        'lang_urls': lang_urls,
         't': translate,
         'T': TRANSLATIONS
     }
 
 @app.route('/set-language/<lang>')
 def set_language(lang):
-    """Set language preference"""
-    if lang in SUPPORTED_LANGUAGES:
-        session['lang'] = lang
-        session.modified = True
-    return redirect(request.referrer or url_for('index'))
+    """Eski havolalar uchun: referrer sahifaning tanlangan tildagi URL iga yo'naltiradi."""
+    if lang not in SUPPORTED_LANGUAGES:
+        lang = DEFAULT_LANGUAGE
+    ref = urllib.parse.urlsplit(request.referrer or '')
+    if ref.netloc and ref.netloc != request.host:
+        return redirect(lang_path('/', lang))
+    target = lang_path(ref.path or '/', lang)
+    if ref.query:
+        target = f'{target}?{ref.query}'
+    return redirect(target)
 
 @app.route('/cart')
 def cart():
@@ -1746,9 +1722,6 @@ def checkout():
 {comment if comment else "Qo'shimcha izoh yo'q"}
 """
         
-        # Telegram'ga yuborish
-        telegram_sent = send_telegram_message(telegram_message)
-        
         # Create order
         order = Order(
             furniture_type=', '.join(products_list),
@@ -1758,7 +1731,9 @@ def checkout():
             status='Yangi'
         )
         db.session.add(order)
+        send_telegram_message(telegram_message, kind='order')
         db.session.commit()
+        notify_telegram_sender()
         
         # Clear cart
         session['cart'] = []
@@ -1842,6 +1817,66 @@ def admin_dashboard():
     return render_template('admin/dashboard.html', stats=stats, recent_orders=recent_orders, usd_rate=rate)
 
 
+def _chunked_upload_json(upload):
+    return {
+        'success': True,
+        'upload_id': upload.id,
+        'size': upload.size,
+        'received': upload.received,
+        'complete': upload.status != 'uploading',
+        'chunk_size': chunk_size(app),
+    }
+
+@app.route('/admin/uploads', methods=['POST'])
+@login_required
+def admin_chunked_upload_start():
+    """Bo'laklab yuklash sessiyasini ochadi: {folder, filename, size, content_type}"""
+    data = request.get_json(silent=True) or {}
+    try:
+        upload = start_upload(
+            app,
+            folder=str(data.get('folder') or ''),
+            filename=str(data.get('filename') or ''),
+            size=int(data.get('size') or 0),
+            content_type=data.get('content_type'),
+            allowed_extensions=ALLOWED_EXTENSIONS,
+        )
+        db.session.commit()
+    except (ChunkError, ValueError) as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), getattr(e, 'status', 400)
+    return jsonify(_chunked_upload_json(upload)), 201
+
+@app.route('/admin/uploads/<upload_id>', methods=['GET', 'PUT'])
+@login_required
+@force_primary  # davom ettirish uchun aniq received kerak (replika kechikishi 409 larga olib keladi)
+def admin_chunked_upload(upload_id):
+    """GET — qayerdan davom etish; PUT — bitta bo'lak (Content-Range: bytes start-end/size) yoki yakunlash (bytes */size)"""
+    upload = db.session.get(ChunkedUpload, upload_id)
+    if upload is None:
+        return jsonify({'success': False, 'message': 'Yuklash topilmadi'}), 404
+    if request.method == 'GET':
+        return jsonify(_chunked_upload_json(upload))
+
+    content_range = request.headers.get('Content-Range', '')
+    # bytes */<size> — barcha bo'laklar kelgan, faqat yakunlash (oldingi urinishda saqlash xato bergan)
+    finalize = re.fullmatch(r'bytes \*/(\d+)', content_range)
+    match = finalize or re.fullmatch(r'bytes (\d+)-(\d+)/(\d+)', content_range)
+    if not match or int(match.group(match.lastindex)) != upload.size:
+        return jsonify({'success': False, 'message': 'Content-Range noto\'g\'ri'}), 400
+    try:
+        if finalize:
+            finish_upload(app, upload)
+        else:
+            start, end = int(match.group(1)), int(match.group(2))
+            write_chunk(app, upload, start, end - start + 1, request.stream)
+    except ChunkError as e:
+        db.session.rollback()
+        payload = _chunked_upload_json(upload)
+        payload.update(success=False, message=str(e))
+        return jsonify(payload), e.status
+    return jsonify(_chunked_upload_json(upload))
+
 @app.route('/admin/settings/home-hero', methods=['GET', 'POST'])
 @login_required
 def admin_home_hero_settings():
@@ -1849,20 +1884,25 @@ def admin_home_hero_settings():
     settings = get_site_settings()
     if request.method == 'POST':
         if request.form.get('action') == 'reset_default':
+            release_uploaded_file(app, settings.hero_background_image)
             settings.hero_background_image = None
             db.session.commit()
             flash('Standart fon rasmi tiklandi.', 'success')
             return redirect(url_for('admin_home_hero_settings'))
 
         file = request.files.get('hero_image')
-        if file and file.filename and allowed_file(file.filename):
-            from datetime import datetime
-            filename = secure_filename(file.filename)
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"hero_{timestamp}_{filename}"
-            filepath = os.path.join('designs', filename)
-            save_uploaded_file(app, file, filepath)
-            settings.hero_background_image = filepath.replace('\\', '/')
+        # Bo'laklab yuklangan fayl (katta rasm) — forma faqat upload ID ni yuboradi
+        uploaded_key = claim_upload(request.form.get('hero_image_upload_id'), 'designs')
+        if uploaded_key or (file and file.filename and allowed_file(file.filename)):
+            if uploaded_key:
+                filepath = uploaded_key
+            else:
+                filepath = content_key('designs', file)
+                save_uploaded_file(app, file, filepath)
+            # designs/ uchun variantlar yo'q — faqat o'lcham va placeholder
+            describe_image(app, filepath)
+            release_uploaded_file(app, settings.hero_background_image)
+            settings.hero_background_image = filepath
             db.session.commit()
             flash('Bosh sahifa Hero fon rasmi yangilandi.', 'success')
         elif file and file.filename:
@@ -1927,14 +1967,6 @@ def admin_product_add():
         material_uz = request.form.get('material_uz')
         warranty_uz = request.form.get('warranty_uz')
         
-        # Auto-translate to Russian and English
-        name_ru = auto_translate(name_uz, 'ru')
-        name_en = auto_translate(name_uz, 'en')
-        description_ru = auto_translate(description_uz, 'ru') if description_uz else None
-        description_en = auto_translate(description_uz, 'en') if description_uz else None
-        material_ru = auto_translate(material_uz, 'ru') if material_uz else None
-        material_en = auto_translate(material_uz, 'en') if material_uz else None
-        
         rate = get_exchange_rate()
         price_som = parse_som_text(request.form.get('price_som'))
         if price_som is not None:
@@ -1948,23 +1980,25 @@ def admin_product_add():
         is_bestseller = request.form.get('is_bestseller') == 'on'
         colors = request.form.get('colors', '').strip()
         
+        # Barcha rasmlar oxirida bitta partiyada parallel yuklanadi
+        uploads = []
+        
         # Validate colors JSON va har bir rang uchun rasm yuklash (IKEA uslubi)
         colors_json = None
         if colors:
             try:
                 colors_data = json.loads(colors)
                 if isinstance(colors_data, list):
+                    color_uploads = []
                     for i in range(len(colors_data)):
                         if 'color_image_' + str(i) in request.files:
                             f = request.files.get('color_image_' + str(i))
                             if f and f.filename and allowed_file(f.filename):
-                                import uuid
-                                filename = secure_filename(f.filename)
-                                unique_filename = f"{uuid.uuid4().hex[:8]}_{filename}"
-                                filepath = os.path.join('products', unique_filename)
-                                save_uploaded_file(app, f, filepath)
+                                filepath = content_key('products', f)
+                                color_uploads.append((f, filepath))
                                 colors_data[i]['image'] = filepath
                     colors_json = json.dumps(colors_data)
+                    uploads.extend(color_uploads)
             except Exception as e:
                 flash('Ranglar formati noto\'g\'ri! JSON formatida kiriting.', 'error')
         
@@ -1990,38 +2024,33 @@ def admin_product_add():
             
             for idx, file in enumerate(files):
                 if file and file.filename and allowed_file(file.filename):
-                    filename = secure_filename(file.filename)
-                    # Unique filename yaratish
-                    import uuid
-                    unique_filename = f"{uuid.uuid4().hex[:8]}_{filename}"
-                    filepath = os.path.join('products', unique_filename)
-                    save_uploaded_file(app, file, filepath)
+                    filepath = content_key('products', file)
+                    uploads.append((file, filepath))
                     images.append(filepath)
-                    print(f"DEBUG: Saved image {idx+1}: {filepath}")
             
             # Asosiy rasmni birinchi o'ringa qo'yish
             if images and main_image_index > 0 and main_image_index < len(images):
                 main_image = images.pop(main_image_index)
                 images.insert(0, main_image)
         
+        try:
+            save_uploaded_files(app, uploads)
+        except Exception as e:
+            print(f"Rasmlarni yuklashda xatolik: {e}")
+            flash('Rasmlarni yuklashda xatolik yuz berdi. Qayta urinib ko\'ring.', 'error')
+            return redirect(url_for('admin_product_add'))
         print(f"DEBUG: Total images saved: {len(images)}")
         
         product = Product(
             name=name_uz,  # Default name
             name_uz=name_uz,
-            name_ru=name_ru,
-            name_en=name_en,
             description=description_uz,
             description_uz=description_uz,
-            description_ru=description_ru,
-            description_en=description_en,
             price=price,
             price_som=price_som,
             size=size,
             material=material_uz,
             material_uz=material_uz,
-            material_ru=material_ru,
-            material_en=material_en,
             category_id=category_id,
             is_bestseller=is_bestseller,
             discount=discount,
@@ -2032,6 +2061,8 @@ def admin_product_add():
         )
         db.session.add(product)
         db.session.commit()
+        # ru/en tarjimalar fon navbatida to'ldiriladi
+        enqueue_translations(app, product)
         flash('Mahsulot qo\'shildi!', 'success')
         return redirect(url_for('admin_products'))
     
@@ -2051,6 +2082,7 @@ def admin_product_edit(product_id):
     product = Product.query.get_or_404(product_id)
     
     if request.method == 'POST':
+        old_upload_keys = Counter(product_upload_keys(product))
         product.name_uz = request.form.get('name_uz')
         product.name = product.name_uz
         product.description_uz = request.form.get('description_uz')
@@ -2060,13 +2092,11 @@ def admin_product_edit(product_id):
         product.warranty_uz = request.form.get('warranty_uz')
         product.warranty = product.warranty_uz
         
-        # Auto-translate to Russian and English
-        product.name_ru = auto_translate(product.name_uz, 'ru')
-        product.name_en = auto_translate(product.name_uz, 'en')
-        product.description_ru = auto_translate(product.description_uz, 'ru') if product.description_uz else None
-        product.description_en = auto_translate(product.description_uz, 'en') if product.description_uz else None
-        product.material_ru = auto_translate(product.material_uz, 'ru') if product.material_uz else None
-        product.material_en = auto_translate(product.material_uz, 'en') if product.material_uz else None
+        # Bo'sh matnlarning eski tarjimalari tozalanadi; qolganlari fon navbatida yangilanadi
+        for field_base in ('description', 'material'):
+            if not getattr(product, f'{field_base}_uz'):
+                setattr(product, f'{field_base}_ru', None)
+                setattr(product, f'{field_base}_en', None)
         
         rate = get_exchange_rate()
         price_som = parse_som_text(request.form.get('price_som'))
@@ -2081,6 +2111,9 @@ def admin_product_edit(product_id):
         product.category_id = int(request.form.get('category_id'))
         product.is_bestseller = request.form.get('is_bestseller') == 'on'
         
+        # Barcha yangi rasmlar oxirida bitta partiyada parallel yuklanadi
+        uploads = []
+        
         # Colors va har bir rang uchun yangi rasm (IKEA uslubi)
         colors = request.form.get('colors', '').strip()
         colors_json = '[]'
@@ -2088,17 +2121,16 @@ def admin_product_edit(product_id):
             try:
                 colors_data = json.loads(colors)
                 if isinstance(colors_data, list):
+                    color_uploads = []
                     for i in range(len(colors_data)):
                         if 'color_image_' + str(i) in request.files:
                             f = request.files.get('color_image_' + str(i))
                             if f and f.filename and allowed_file(f.filename):
-                                import uuid
-                                filename = secure_filename(f.filename)
-                                unique_filename = f"{uuid.uuid4().hex[:8]}_{filename}"
-                                filepath = os.path.join('products', unique_filename)
-                                save_uploaded_file(app, f, filepath)
+                                filepath = content_key('products', f)
+                                color_uploads.append((f, filepath))
                                 colors_data[i]['image'] = filepath
                     colors_json = json.dumps(colors_data)
+                    uploads.extend(color_uploads)
             except Exception as e:
                 flash('Ranglar formati noto\'g\'ri! JSON formatida kiriting.', 'error')
         product.colors = colors_json
@@ -2128,12 +2160,8 @@ def admin_product_edit(product_id):
                 new_images = []
                 for idx, file in enumerate(files):
                     if file and file.filename and allowed_file(file.filename):
-                        filename = secure_filename(file.filename)
-                        # Unique filename yaratish
-                        import uuid
-                        unique_filename = f"{uuid.uuid4().hex[:8]}_{filename}"
-                        filepath = os.path.join('products', unique_filename)
-                        save_uploaded_file(app, file, filepath)
+                        filepath = content_key('products', file)
+                        uploads.append((file, filepath))
                         new_images.append(filepath)
                 
                 # Yangi rasmlarda asosiy rasmni birinchi o'ringa qo'yish
@@ -2149,7 +2177,23 @@ def admin_product_edit(product_id):
                     images = images[:5]
         
         product.images = json.dumps(images)
+        # Faqat mahsulotda qolgan rasmlar yuklanadi (cheklovdan tushganlari havolasiz saqlanmasin)
+        kept_keys = set(product_upload_keys(product))
+        uploads = [(f, key) for f, key in uploads if key in kept_keys]
+        try:
+            save_uploaded_files(app, uploads)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Rasmlarni yuklashda xatolik: {e}")
+            flash('Rasmlarni yuklashda xatolik yuz berdi. Qayta urinib ko\'ring.', 'error')
+            return redirect(url_for('admin_product_edit', product_id=product_id))
+        
+        # Olib tashlangan/almashtirilgan rasmlar havolasi kamayadi (fayllarni GC tozalaydi)
+        for key, count in (old_upload_keys - Counter(product_upload_keys(product))).items():
+            for _ in range(count):
+                release_uploaded_file(app, key)
         db.session.commit()
+        enqueue_translations(app, product)
         flash('Mahsulot yangilandi!', 'success')
         return redirect(url_for('admin_products'))
     
@@ -2168,6 +2212,8 @@ def admin_product_edit(product_id):
 @login_required
 def admin_product_delete(product_id):
     product = Product.query.get_or_404(product_id)
+    for key in product_upload_keys(product):
+        release_uploaded_file(app, key)
     db.session.delete(product)
     db.session.commit()
     flash('Mahsulot o\'chirildi!', 'success')
@@ -2184,40 +2230,28 @@ def admin_main_categories():
 def admin_main_category_add():
     if request.method == 'POST':
         name_uz = request.form.get('name_uz')
-        
-        # Auto-translate to Russian and English
-        name_ru = auto_translate(name_uz, 'ru')
-        name_en = auto_translate(name_uz, 'en')
-        
         slug = request.form.get('slug') or name_uz.lower().replace(' ', '-').replace('&', 'and')
         description_uz = request.form.get('description_uz', '')
-        description_ru = auto_translate(description_uz, 'ru') if description_uz else ''
-        description_en = auto_translate(description_uz, 'en') if description_uz else ''
         order = request.form.get('order', type=int) or 0
         
         image = None
         if 'image' in request.files:
             file = request.files['image']
             if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                filepath = os.path.join('main_categories', filename)
-                os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'main_categories'), exist_ok=True)
+                filepath = content_key('main_categories', file)
                 save_uploaded_file(app, file, filepath)
                 image = filepath
         
         main_category = MainCategory(
             name_uz=name_uz,
-            name_ru=name_ru,
-            name_en=name_en,
             slug=slug,
             description_uz=description_uz,
-            description_ru=description_ru,
-            description_en=description_en,
             image=image,
             order=order
         )
         db.session.add(main_category)
         db.session.commit()
+        enqueue_translations(app, main_category)
         flash('Asosiy kategoriya qo\'shildi!', 'success')
         return redirect(url_for('admin_main_categories'))
     
@@ -2230,43 +2264,34 @@ def admin_main_category_edit(main_category_id):
     
     if request.method == 'POST':
         main_category.name_uz = request.form.get('name_uz')
-        
-        # Auto-translate if fields are empty
-        if not request.form.get('name_ru'):
-            main_category.name_ru = auto_translate(main_category.name_uz, 'ru')
-        else:
-            main_category.name_ru = request.form.get('name_ru')
-            
-        if not request.form.get('name_en'):
-            main_category.name_en = auto_translate(main_category.name_uz, 'en')
-        else:
-            main_category.name_en = request.form.get('name_en')
-        
         main_category.slug = request.form.get('slug') or main_category.name_uz.lower().replace(' ', '-').replace('&', 'and')
         main_category.description_uz = request.form.get('description_uz', '')
         
-        if not request.form.get('description_ru'):
-            main_category.description_ru = auto_translate(main_category.description_uz, 'ru') if main_category.description_uz else ''
-        else:
-            main_category.description_ru = request.form.get('description_ru')
-            
-        if not request.form.get('description_en'):
-            main_category.description_en = auto_translate(main_category.description_uz, 'en') if main_category.description_uz else ''
-        else:
-            main_category.description_en = request.form.get('description_en')
+        # Formada berilgan tarjimalar saqlanadi; bo'sh qolganlari fon navbatida tarjima qilinadi
+        pending_translations = []
+        for field_base in ('name', 'description'):
+            for lang_code in ('ru', 'en'):
+                value = request.form.get(f'{field_base}_{lang_code}')
+                if value:
+                    setattr(main_category, f'{field_base}_{lang_code}', value)
+                elif not getattr(main_category, f'{field_base}_uz'):
+                    setattr(main_category, f'{field_base}_{lang_code}', '')
+                else:
+                    pending_translations.append((field_base, lang_code))
         
         main_category.order = request.form.get('order', type=int) or 0
         
         if 'image' in request.files:
             file = request.files['image']
             if file and file.filename and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                filepath = os.path.join('main_categories', filename)
-                os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'main_categories'), exist_ok=True)
+                filepath = content_key('main_categories', file)
                 save_uploaded_file(app, file, filepath)
+                release_uploaded_file(app, main_category.image)
                 main_category.image = filepath
         
         db.session.commit()
+        for field_base, lang_code in pending_translations:
+            enqueue_translations(app, main_category, fields=(field_base,), targets=(lang_code,))
         flash('Asosiy kategoriya yangilandi!', 'success')
         return redirect(url_for('admin_main_categories'))
     
@@ -2282,6 +2307,7 @@ def admin_main_category_delete(main_category_id):
         flash('Bu asosiy kategoriyada kategoriyalar bor. Avval kategoriyalarni o\'chiring yoki boshqa asosiy kategoriyaga ko\'chiring!', 'error')
         return redirect(url_for('admin_main_categories'))
     
+    release_uploaded_file(app, main_category.image)
     db.session.delete(main_category)
     db.session.commit()
     flash('Asosiy kategoriya o\'chirildi!', 'success')
@@ -2326,12 +2352,7 @@ def admin_brand_add():
             flash('Logo fayl yuklash majburiy!', 'error')
             return redirect(url_for('admin_brand_add'))
 
-        filename = secure_filename(logo_file.filename)
-        from datetime import datetime
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"{timestamp}_{filename}"
-        filepath = os.path.join('brands', filename)
-        os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'brands'), exist_ok=True)
+        filepath = content_key('brands', logo_file)
         save_uploaded_file(app, logo_file, filepath)
 
         brand = Brand(
@@ -2353,6 +2374,8 @@ def admin_brand_add():
         )
         db.session.add(brand)
         db.session.commit()
+        # Bo'sh qoldirilgan ru/en maydonlar fon navbatida tarjima qilinadi
+        enqueue_translations(app, brand, overwrite=False)
         flash('Brend qo\'shildi!', 'success')
         return redirect(url_for('admin_brands'))
 
@@ -2384,16 +2407,13 @@ def admin_brand_edit(brand_id):
         # Logo fayl yangilash
         logo_file = request.files.get('logo')
         if logo_file and logo_file.filename:
-            filename = secure_filename(logo_file.filename)
-            from datetime import datetime
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"{timestamp}_{filename}"
-            filepath = os.path.join('brands', filename)
-            os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'brands'), exist_ok=True)
+            filepath = content_key('brands', logo_file)
             save_uploaded_file(app, logo_file, filepath)
+            release_uploaded_file(app, brand.logo)
             brand.logo = filepath
         
         db.session.commit()
+        enqueue_translations(app, brand, overwrite=False)
         flash('Brend yangilandi!', 'success')
         return redirect(url_for('admin_brands'))
     
@@ -2403,6 +2423,7 @@ def admin_brand_edit(brand_id):
 @login_required
 def admin_brand_delete(brand_id):
     brand = Brand.query.get_or_404(brand_id)
+    release_uploaded_file(app, brand.logo)
     db.session.delete(brand)
     db.session.commit()
     flash('Brend o\'chirildi!', 'success')
@@ -2525,12 +2546,7 @@ def admin_client_add():
         photo_file = request.files.get('photo')
         filepath = None
         if photo_file and photo_file.filename:
-            filename = secure_filename(photo_file.filename)
-            from datetime import datetime
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"{timestamp}_{filename}"
-            filepath = os.path.join('clients', filename)
-            os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'clients'), exist_ok=True)
+            filepath = content_key('clients', photo_file)
             save_uploaded_file(app, photo_file, filepath)
         
         client = Client(
@@ -2570,13 +2586,9 @@ def admin_client_edit(client_id):
         
         photo_file = request.files.get('photo')
         if photo_file and photo_file.filename:
-            filename = secure_filename(photo_file.filename)
-            from datetime import datetime
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"{timestamp}_{filename}"
-            filepath = os.path.join('clients', filename)
-            os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'clients'), exist_ok=True)
+            filepath = content_key('clients', photo_file)
             save_uploaded_file(app, photo_file, filepath)
+            release_uploaded_file(app, client.photo)
             client.photo = filepath
         
         db.session.commit()
@@ -2589,6 +2601,7 @@ def admin_client_edit(client_id):
 @login_required
 def admin_client_delete(client_id):
     client = Client.query.get_or_404(client_id)
+    release_uploaded_file(app, client.photo)
     db.session.delete(client)
     db.session.commit()
     flash('Mijoz o\'chirildi!', 'success')
@@ -2606,16 +2619,95 @@ def admin_first_visits():
     }
     return render_template('admin/first_visits.html', visits=visits, interest_names=interest_names)
 
+def _metrics_authorized() -> bool:
+    """Admin sessiyasi yoki Authorization: Bearer <METRICS_TOKEN> (monitoring uchun)."""
+    if current_user.is_authenticated:
+        return True
+    token = app.config.get('METRICS_TOKEN')
+    return bool(token) and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+
+@app.route('/metrics/db-pool')
+def metrics_db_pool():
+    """Shu worker dagi DB pool statistikasi (har worker o'zinikini ko'rsatadi — pid bor)."""
+    if not _metrics_authorized():
+        return jsonify({'success': False, 'message': 'Ruxsat yo\'q'}), 401
+    response = jsonify(pool_metrics())
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.route('/admin/query-stats', methods=['GET', 'POST'])
+@login_required
+def admin_query_stats():
+    """QUERY_DEBUG: eng ko'p SQL / N+1 bo'lgan endpointlar (shu worker bo'yicha)."""
+    if request.method == 'POST':
+        endpoint_stats.reset()
+        flash('Statistika tozalandi', 'success')
+        return redirect(url_for('admin_query_stats'))
+    return render_template('admin/query_stats.html', enabled=app.config.get('QUERY_DEBUG'),
+                           rows=endpoint_stats.top(), threshold=app.config.get('QUERY_N1_THRESHOLD', 5),
+                           pid=os.getpid())
+
+@app.route('/metrics/slow-queries')
+def metrics_slow_queries():
+    """Shu worker dagi sekin SQL shakllari (umumiy vaqt bo'yicha)."""
+    if not _metrics_authorized():
+        return jsonify({'success': False, 'message': 'Ruxsat yo\'q'}), 401
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    response = jsonify({'pid': os.getpid(), 'threshold_ms': app.config.get('SLOW_QUERY_MS'),
+                        'queries': slow_queries.top(limit)})
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.route('/admin/slow-queries', methods=['GET', 'POST'])
+@login_required
+def admin_slow_queries():
+    """Sekin SQL lar (shu worker bo'yicha); POST: tozalash yoki eng sekin namunaga EXPLAIN."""
+    if request.method == 'POST':
+        entry_id = request.form.get('explain')
+        if entry_id:
+            entry = slow_queries.get(entry_id)
+            if entry is None:
+                flash('So\'rov topilmadi (worker almashgan yoki tozalangan bo\'lishi mumkin)', 'error')
+            else:
+                try:
+                    explain(entry)
+                except Exception as e:
+                    flash(f'EXPLAIN xatolik: {e}', 'error')
+            # Redirect emas — natija shu worker xotirasida, keyingi GET boshqa worker ga tushishi mumkin
+        else:
+            slow_queries.reset()
+            flash('Sekin so\'rovlar tozalandi', 'success')
+            return redirect(url_for('admin_slow_queries'))
+    return render_template('admin/slow_queries.html', rows=slow_queries.top(),
+                           threshold=app.config.get('SLOW_QUERY_MS', 0), pid=os.getpid())
+
+@app.route('/admin/notifications')
+@login_required
+def admin_notifications():
+    stats = outbox_stats()
+    return render_template('admin/notifications.html', stats=stats)
+
+@app.route('/admin/notification/<int:notification_id>/retry', methods=['POST'])
+@login_required
+def admin_notification_retry(notification_id):
+    from datetime import datetime
+    notification = NotificationOutbox.query.get_or_404(notification_id)
+    notification.status = 'pending'
+    notification.attempts = 0
+    notification.next_attempt_at = datetime.utcnow()
+    notification.claim_token = None
+    notification.locked_until = None
+    db.session.commit()
+    notify_telegram_sender()
+    flash('Xabar qayta yuborish navbatiga qo\'yildi!', 'success')
+    return redirect(url_for('admin_notifications'))
+
 @app.route('/admin/category/add', methods=['GET', 'POST'])
 @login_required
 def admin_category_add():
     if request.method == 'POST':
         name_uz = request.form.get('name_uz') or request.form.get('name')
         
-        # Auto-translate to Russian and English
-        name_ru = auto_translate(name_uz, 'ru')
-        name_en = auto_translate(name_uz, 'en')
-        
         slug = request.form.get('slug') or name_uz.lower().replace(' ', '-')
         # Slug takrorlanmasligini ta'minlash
         base_slug = slug
@@ -2628,18 +2720,17 @@ def admin_category_add():
         if 'image' in request.files:
             file = request.files['image']
             if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                filepath = os.path.join('categories', filename)
-                os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'categories'), exist_ok=True)
+                filepath = content_key('categories', file)
                 save_uploaded_file(app, file, filepath)
                 image = filepath
         
         main_category_id = request.form.get('main_category_id', type=int) or None
         
         try:
-            category = Category(name=name_uz, name_uz=name_uz, name_ru=name_ru, name_en=name_en, slug=slug, image=image, main_category_id=main_category_id)
+            category = Category(name=name_uz, name_uz=name_uz, slug=slug, image=image, main_category_id=main_category_id)
             db.session.add(category)
             db.session.commit()
+            enqueue_translations(app, category)
             flash('Kategoriya qo\'shildi!', 'success')
             return redirect(url_for('admin_categories'))
         except Exception as e:
@@ -2660,16 +2751,13 @@ def admin_category_edit(category_id):
         category.name_uz = request.form.get('name_uz') or request.form.get('name')
         category.name = category.name_uz
         
-        # Auto-translate if fields are empty
-        if not request.form.get('name_ru'):
-            category.name_ru = auto_translate(category.name_uz, 'ru')
-        else:
-            category.name_ru = request.form.get('name_ru')
-            
-        if not request.form.get('name_en'):
-            category.name_en = auto_translate(category.name_uz, 'en')
-        else:
-            category.name_en = request.form.get('name_en')
+        # Formada berilgan tarjimalar saqlanadi; bo'sh qolganlari fon navbatida tarjima qilinadi
+        pending_langs = []
+        for lang_code in ('ru', 'en'):
+            if request.form.get(f'name_{lang_code}'):
+                setattr(category, f'name_{lang_code}', request.form.get(f'name_{lang_code}'))
+            else:
+                pending_langs.append(lang_code)
         
         new_slug = request.form.get('slug') or category.name_uz.lower().replace(' ', '-')
         # Slug takrorlanmasligini ta'minlash (faqat boshqa kategoriyalar bilan)
@@ -2685,14 +2773,15 @@ def admin_category_edit(category_id):
         if 'image' in request.files:
             file = request.files['image']
             if file and file.filename and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                filepath = os.path.join('categories', filename)
-                os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'categories'), exist_ok=True)
+                filepath = content_key('categories', file)
                 save_uploaded_file(app, file, filepath)
+                release_uploaded_file(app, category.image)
                 category.image = filepath
         
         try:
             db.session.commit()
+            if pending_langs:
+                enqueue_translations(app, category, targets=tuple(pending_langs))
             flash('Kategoriya yangilandi!', 'success')
             return redirect(url_for('admin_categories'))
         except Exception as e:
@@ -2712,6 +2801,7 @@ def admin_category_delete(category_id):
         flash('Bu kategoriyada mahsulotlar bor. Avval mahsulotlarni o\'chiring!', 'error')
         return redirect(url_for('admin_categories'))
     
+    release_uploaded_file(app, category.image)
     db.session.delete(category)
     db.session.commit()
     flash('Kategoriya o\'chirildi!', 'success')
@@ -2746,28 +2836,21 @@ def admin_portfolio_add():
         description_uz = request.form.get('description_uz')
         room_type_uz = request.form.get('room_type_uz')
         
-        # Auto-translate to Russian and English
-        title_ru = auto_translate(title_uz, 'ru')
-        title_en = auto_translate(title_uz, 'en')
-        description_ru = auto_translate(description_uz, 'ru') if description_uz else None
-        description_en = auto_translate(description_uz, 'en') if description_uz else None
-        
-        before_image = None
-        after_image = None
+        # Bo'laklab yuklangan rasmlar (upload ID) yoki oddiy fayl maydoni
+        before_image = claim_upload(request.form.get('before_image_upload_id'), 'portfolio')
+        after_image = claim_upload(request.form.get('after_image_upload_id'), 'portfolio')
         
-        if 'before_image' in request.files:
+        if not before_image and 'before_image' in request.files:
             file = request.files['before_image']
             if file and file.filename and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                filepath = os.path.join('portfolio', filename)
+                filepath = content_key('portfolio', file)
                 save_uploaded_file(app, file, filepath)
                 before_image = filepath
         
-        if 'after_image' in request.files:
+        if not after_image and 'after_image' in request.files:
             file = request.files['after_image']
             if file and file.filename and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                filepath = os.path.join('portfolio', filename)
+                filepath = content_key('portfolio', file)
                 save_uploaded_file(app, file, filepath)
                 after_image = filepath
         
@@ -2783,6 +2866,8 @@ def admin_portfolio_add():
         )
         db.session.add(portfolio)
         db.session.commit()
+        # ru/en tarjimalar fon navbatida to'ldiriladi
+        enqueue_translations(app, portfolio)
         flash('Portfolio qo\'shildi!', 'success')
         return redirect(url_for('admin_portfolios'))
     
@@ -2801,29 +2886,37 @@ def admin_portfolio_edit(portfolio_id):
         portfolio.room_type_uz = request.form.get('room_type_uz')
         portfolio.room_type = portfolio.room_type_uz
         
-        # Auto-translate to Russian and English
-        portfolio.title_ru = auto_translate(portfolio.title_uz, 'ru')
-        portfolio.title_en = auto_translate(portfolio.title_uz, 'en')
-        portfolio.description_ru = auto_translate(portfolio.description_uz, 'ru') if portfolio.description_uz else None
-        portfolio.description_en = auto_translate(portfolio.description_uz, 'en') if portfolio.description_uz else None
+        # Bo'sh tavsifning eski tarjimalari tozalanadi; qolganlari fon navbatida yangilanadi
+        if not portfolio.description_uz:
+            portfolio.description_ru = None
+            portfolio.description_en = None
         
-        if 'before_image' in request.files:
+        uploaded_key = claim_upload(request.form.get('before_image_upload_id'), 'portfolio')
+        if uploaded_key:
+            release_uploaded_file(app, portfolio.before_image)
+            portfolio.before_image = uploaded_key
+        elif 'before_image' in request.files:
             file = request.files['before_image']
             if file and file.filename and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                filepath = os.path.join('portfolio', filename)
+                filepath = content_key('portfolio', file)
                 save_uploaded_file(app, file, filepath)
+                release_uploaded_file(app, portfolio.before_image)
                 portfolio.before_image = filepath
         
-        if 'after_image' in request.files:
+        uploaded_key = claim_upload(request.form.get('after_image_upload_id'), 'portfolio')
+        if uploaded_key:
+            release_uploaded_file(app, portfolio.after_image)
+            portfolio.after_image = uploaded_key
+        elif 'after_image' in request.files:
             file = request.files['after_image']
             if file and file.filename and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                filepath = os.path.join('portfolio', filename)
+                filepath = content_key('portfolio', file)
                 save_uploaded_file(app, file, filepath)
+                release_uploaded_file(app, portfolio.after_image)
                 portfolio.after_image = filepath
         
         db.session.commit()
+        enqueue_translations(app, portfolio)
         flash('Portfolio yangilandi!', 'success')
         return redirect(url_for('admin_portfolios'))
     
@@ -2834,9 +2927,9 @@ def admin_portfolio_edit(portfolio_id):
 def admin_portfolio_delete(portfolio_id):
     portfolio = Portfolio.query.get_or_404(portfolio_id)
     if portfolio.after_image:
-        delete_uploaded_file(app, portfolio.after_image)
+        release_uploaded_file(app, portfolio.after_image)
     if portfolio.before_image:
-        delete_uploaded_file(app, portfolio.before_image)
+        release_uploaded_file(app, portfolio.before_image)
     db.session.delete(portfolio)
     db.session.commit()
     flash('Portfolio o\'chirildi!', 'success')
@@ -2846,14 +2939,14 @@ def admin_portfolio_delete(portfolio_id):
 @app.route('/stores')
 def stores():
     """Stores page with map"""
-    lang = session.get('language', 'uz')
+    lang = get_locale()
     stores_list = Store.query.all()
     return render_template('stores.html', stores=stores_list, lang=lang)
 
 @app.route('/api/stores')
 def api_stores():
     """API endpoint for stores - returns JSON"""
-    lang = session.get('language', 'uz')
+    lang = get_locale()
     stores = Store.query.all()
     
     stores_data = []
@@ -2936,6 +3029,8 @@ def api_main_category_products(slug):
             'material': product.get_material(lang),
             'size': product.size,
             'images': images,
+            'image_urls': [upload_url(app, image) for image in images],
+            'image_placeholder': image_placeholder(images[0]) if images else None,
             'category_id': product.category_id,
             'category_name': product.category.get_name(lang) if product.category else '',
             'is_bestseller': product.is_bestseller,
@@ -2948,7 +3043,8 @@ def api_main_category_products(slug):
         categories_data.append({
             'id': cat.id,
             'name': cat.get_name(lang),
-            'image': cat.image
+            'image': cat.image,
+            'image_url': upload_url(app, cat.image)
         })
     
     return jsonify({
@@ -3203,19 +3299,113 @@ def admin_user_activity():
 
 @app.route('/uploads/<path:filename>')
 def uploaded_file(filename):
-    # Mahalliy fayl bo'lsa diskdan; aks holda Supabase public URLga
+    # Mahalliy fayl bo'lsa diskdan (stat keshi, ETag, Range); aks holda Supabase public URLga
     norm = filename.replace('\\', '/')
-    local_path = os.path.join(app.config['UPLOAD_FOLDER'], norm)
-    if os.path.isfile(local_path):
-        return send_from_directory(app.config['UPLOAD_FOLDER'], norm)
+    fingerprint = request.args.get('v')
+    if request.args:
+        try:
+            params = parse_resize_params(app, norm, request.args)
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        if params:
+            return resized_uploaded_file(norm, fingerprint, *params)
+    response = serve_upload(app, norm, fingerprint)
+    if response is not None:
+        return response
     if app.config.get('USE_SUPABASE_STORAGE'):
         return redirect(public_storage_url(app, filename), code=302)
-    return send_from_directory(app.config['UPLOAD_FOLDER'], norm)
+    abort(404)
+
+def resized_uploaded_file(key, fingerprint, width, fmt, quality):
+    """?w=640&fm=webp — nusxa keshdan (birinchi so'rovda process pool da yaratiladi)."""
+    if key.startswith(DERIVATIVE_PREFIX + '/') or not pillow_available():
+        response = serve_upload(app, key, fingerprint)
+        return response if response is not None else abort(404)
+    try:
+        dkey = derivative_cache.get(app, key, width, fmt, quality)
+    except FileNotFoundError:
+        abort(404)
+    except UnsupportedImage:
+        abort(415)
+    except ResizeBusy:
+        return 'Busy', 503, {'Retry-After': '2'}
+    if app.config.get('USE_SUPABASE_STORAGE'):
+        return redirect(public_storage_url(app, dkey), code=302)
+    # Nusxa URL i manba bilan bir xil barmoq izini oladi (?v= manba xeshiga mos bo'lsa — immutable)
+    source = upload_info(app, key)
+    immutable = source is not None and is_fingerprinted(key, fingerprint, source)
+    response = serve_upload(app, dkey, immutable=immutable)
+    return response if response is not None else abort(404)
+
+@app.cli.command('db-migrate')
+@click.option('--status', is_flag=True, help="Faqat joriy va oxirgi versiyani ko'rsatish")
+def db_migrate_command(status):
+    """Qo'llanmagan migratsiyalar (release bosqichida): flask --app app db-migrate"""
+    if status:
+        current, latest = schema_status()
+        label = current if current is not None else "jurnal yo'q"
+        click.echo(f"Sxema versiyasi: {label}, oxirgi: {latest}")
+        return
+    applied = migrate(app, log=click.echo)
+    click.echo(f"Qo'llandi: {len(applied)} ta migratsiya" if applied else "Sxema yangi — migratsiya kerak emas")
+
+@app.cli.command('translate-backfill')
+@click.option('--limit', type=int, default=None, help="Har bir model uchun maksimal qatorlar soni")
+@click.option('--dry-run', is_flag=True, help="Faqat hisobot — tarjima qilmaydi")
+def translate_backfill_command(limit, dry_run):
+    """ru/en tarjimasi bo'sh qatorlarni to'ldirish: flask --app app translate-backfill"""
+    report = backfill_translations(app, [Product, Category, MainCategory, Brand, Portfolio], limit=limit, dry_run=dry_run)
+    for model_name, count in report.items():
+        click.echo(f"{model_name}: {count} ta tarjima {'kerak' if dry_run else 'bajarildi'}")
+
+@app.cli.command('images-backfill')
+@click.option('--workers', type=int, default=None, help="Jarayonlar soni (standart: CPU yadrolari)")
+@click.option('--limit', type=int, default=None, help="Maksimal rasmlar soni")
+@click.option('--force', is_flag=True, help="Varianti bor rasmlarni ham qayta ishlash")
+@click.option('--dry-run', is_flag=True, help="Faqat hisobot")
+def images_backfill_command(workers, limit, force, dry_run):
+    """Mavjud rasmlar uchun 320/640/1280 va WebP variantlar: flask --app app images-backfill"""
+    report = backfill_variants(app, workers=workers, force=force, dry_run=dry_run, limit=limit)
+    hero_key = get_hero_background_key()
+    if not dry_run and (force or not image_placeholder(hero_key)) and describe_image(app, hero_key):
+        db.session.commit()
+        click.echo(f"Hero fon rasmi: {hero_key}")
+    click.echo(f"Topildi: {report['found']}, navbatda: {report['todo']}, "
+               f"tayyor: {report['processed']}, xato: {report['failed']}")
+
+@app.cli.command('uploads-gc')
+@click.option('--dry-run', is_flag=True, help="Faqat hisobot, hech narsa o'chirilmaydi")
+@click.option('--grace-hours', type=float, default=None, help="Shundan yangi fayllarga tegilmaydi")
+@click.option('--batch-size', type=int, default=None, help="Bir partiyada o'chiriladigan fayllar")
+@click.option('--cache-days', type=float, default=None, help="_cache/ hosilalari uchun yosh chegarasi (kun)")
+def uploads_gc_command(dry_run, grace_hours, batch_size, cache_days):
+    """Hech bir yozuv ishlatmaydigan yuklangan fayllarni o'chirish: flask --app app uploads-gc --dry-run"""
+    options = gc_settings(app)
+    for name, value in (('grace_hours', grace_hours), ('batch_size', batch_size), ('cache_days', cache_days)):
+        if value is not None:
+            options[name] = value
+    report = collect_garbage_exclusive(app, dry_run=dry_run, **options)
+    if report is None:
+        click.echo("GC boshqa jarayonda ishlayapti — keyinroq urinib ko'ring")
+        return
+    for key in report['sample']:
+        click.echo(f"  {key}")
+    click.echo(f"Tekshirildi: {report['scanned']}, ishlatilmayotgan: {report['orphaned']}, "
+               f"yangi (tegilmadi): {report['recent']}, o'chirildi: {report['deleted']}, "
+               f"tuzatilgan ref_count: {report['refcounts_fixed']}")
+
+
+# /ru/... va /en/... qoidalari — barcha route lar e'lon qilingandan keyin
+startup_profiler.mark("route lar")
+register_language_routes()
+startup_profiler.mark("til route lari")
+# STARTUP_PROFILE=1: shablonlarni ham yuklab, bosqichlar hisobotini chiqaradi
+startup_profiler.report(app)
 
 if __name__ == '__main__':
     with app.app_context():
         ensure_upload_dirs()
-        apply_db_migrations()
+        migrate(app)
 
         # Create default admin user if not exists
         try:
@@ -0,0 +1,175 @@
+"""
+Bo'laklab, davom ettirsa bo'ladigan yuklash (admin uchun katta rasmlar).
+Brauzer faylni ``CHUNKED_UPLOAD_CHUNK_MB`` lik bo'laklarda PUT qiladi; har bo'lak to'g'ridan-to'g'ri
+vaqtinchalik faylga yoziladi (xotiraga yig'ilmaydi). Aloqa uzilsa ``received`` dan davom etadi.
+Oxirgi bo'lakdan keyin fayl odatdagi yo'l bilan saqlanadi (kontent kaliti, variantlar) va
+forma faqat upload ID ni yuboradi. Saqlash xato bersa sessiya ochiq qoladi — mijoz
+``Content-Range: bytes */<size>`` bilan faqat yakunlashni qayta so'raydi.
+"""
+from __future__ import annotations
+
+import fcntl
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import IO, TYPE_CHECKING, Optional
+
+from werkzeug.datastructures import FileStorage
+
+from db import db
+from models import ChunkedUpload
+from storage_utils import content_key, save_uploaded_file
+
+if TYPE_CHECKING:
+    from flask import Flask
+
+CHUNKED_UPLOAD_FOLDERS = ("designs", "portfolio", "products", "categories", "main_categories", "brands", "clients")
+COPY_BUFFER_SIZE = 64 * 1024
+
+
+class ChunkError(Exception):
+    """Bo'lakni qabul qilib bo'lmaydi; ``status`` — HTTP kod (400/409/413/423)."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def _upload_dir(app: "Flask") -> str:
+    path = app.config.get("CHUNKED_UPLOAD_DIR") or os.path.join(app.instance_path, "chunked_uploads")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _part_path(app: "Flask", upload: ChunkedUpload) -> str:
+    return os.path.join(_upload_dir(app), f"{upload.id}.part")
+
+
+def chunk_size(app: "Flask") -> int:
+    return int(app.config.get("CHUNKED_UPLOAD_CHUNK_MB", 4)) * 1024 * 1024
+
+
+def start_upload(app: "Flask", folder: str, filename: str, size: int,
+                 content_type: Optional[str], allowed_extensions) -> ChunkedUpload:
+    """Yangi sessiya (commit chaqiruvchida)."""
+    if folder not in CHUNKED_UPLOAD_FOLDERS:
+        raise ChunkError("Noto'g'ri papka")
+    ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    if ext not in allowed_extensions:
+        raise ChunkError("Faqat rasm fayli yuklang (PNG, JPG, JPEG, GIF, WEBP).")
+    max_size = int(app.config.get("CHUNKED_UPLOAD_MAX_MB", 200)) * 1024 * 1024
+    if size <= 0 or size > max_size:
+        raise ChunkError(f"Fayl hajmi 1 bayt — {max_size // (1024 * 1024)} MB oralig'ida bo'lishi kerak", 413)
+
+    upload = ChunkedUpload(
+        id=uuid.uuid4().hex,
+        folder=folder,
+        filename=filename[:255],
+        content_type=(content_type or "application/octet-stream")[:100],
+        size=size,
+        received=0,
+    )
+    db.session.add(upload)
+    open(_part_path(app, upload), "wb").close()
+    return upload
+
+
+def write_chunk(app: "Flask", upload: ChunkedUpload, start: int, length: int, stream: IO[bytes]) -> ChunkedUpload:
+    """
+    ``start`` dan boshlab ``length`` bayt yozadi. ``start`` serverdagi ``received`` ga teng
+    bo'lishi shart (aks holda 409 — mijoz GET bilan joriy holatni olib davom ettiradi).
+    Aloqa uzilsa yozilgan qism saqlanib qoladi. Oxirgi bo'lakdan keyin fayl saqlanadi (``finish_upload``).
+    """
+    if upload.status != "uploading":
+        raise ChunkError("Yuklash allaqachon tugagan", 409)
+    if start != upload.received:
+        raise ChunkError("Bo'lak tartibi buzilgan", 409)
+    if length <= 0 or start + length > upload.size or length > chunk_size(app):
+        raise ChunkError("Noto'g'ri bo'lak hajmi")
+
+    path = _part_path(app, upload)
+    if not os.path.exists(path):
+        raise ChunkError("Sessiya muddati tugagan", 409)
+    with open(path, "r+b") as f:
+        # Bir vaqtda ikkita so'rov (boshqa worker ham) bitta faylga yozmasin
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise ChunkError("Bu yuklashga boshqa bo'lak yozilmoqda", 423)
+        f.seek(start)
+        remaining = length
+        try:
+            while remaining > 0:
+                data = stream.read(min(COPY_BUFFER_SIZE, remaining))
+                if not data:
+                    break
+                f.write(data)
+                remaining -= len(data)
+        finally:
+            f.truncate()
+            upload.received = start + length - remaining
+            db.session.commit()
+
+    if upload.received >= upload.size:
+        finish_upload(app, upload)
+    return upload
+
+
+def finish_upload(app: "Flask", upload: ChunkedUpload) -> ChunkedUpload:
+    """
+    Barcha bo'laklar kelgan sessiyani yakunlaydi (oxirgi bo'lakdan keyin yoki qayta urinishda).
+    Saqlash xato bersa sessiya ``uploading`` holatida qoladi va 503 — qayta urinsa bo'ladi.
+    """
+    if upload.status != "uploading":
+        raise ChunkError("Yuklash allaqachon tugagan", 409)
+    if upload.received < upload.size:
+        raise ChunkError("Hali barcha bo'laklar kelmagan", 409)
+    path = _part_path(app, upload)
+    if not os.path.exists(path):
+        raise ChunkError("Sessiya muddati tugagan", 409)
+    try:
+        _finish(app, upload, path)
+    except Exception as e:
+        db.session.rollback()
+        print(f"Chunked upload {upload.id} saqlash xatolik: {e}")
+        raise ChunkError("Faylni saqlab bo'lmadi — qayta urinib ko'ring", 503)
+    return upload
+
+
+def _finish(app: "Flask", upload: ChunkedUpload, path: str) -> None:
+    with open(path, "rb") as f:
+        file_storage = FileStorage(stream=f, filename=upload.filename, content_type=upload.content_type)
+        key = content_key(upload.folder, file_storage)
+        save_uploaded_file(app, file_storage, key)
+    upload.key = key
+    upload.status = "complete"
+    db.session.commit()
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def claim_upload(upload_id: Optional[str], folder: str) -> Optional[str]:
+    """Forma yuborgan upload ID -> tayyor fayl kaliti (bir marta ishlatiladi). Yaroqsiz bo'lsa None."""
+    if not upload_id:
+        return None
+    upload = db.session.get(ChunkedUpload, upload_id)
+    if upload is None or upload.status != "complete" or upload.folder != folder:
+        return None
+    upload.status = "used"
+    return upload.key
+
+
+def cleanup_stale_uploads(app: "Flask", max_age_hours: float) -> int:
+    """Tugatilmagan/ishlatilmagan eski sessiyalar va ularning vaqtinchalik fayllari."""
+    cutoff = datetime.utcnow() - timedelta(hours=max_age_hours)
+    stale = ChunkedUpload.query.filter(ChunkedUpload.updated_at < cutoff).all()
+    for upload in stale:
+        try:
+            os.remove(_part_path(app, upload))
+        except OSError:
+            pass
+        db.session.delete(upload)
+    db.session.commit()
+    return len(stale)
@@ -36,6 +36,15 @@ def _postgres_host_valid(url: str) -> bool:
         return False
 
 
+def _sqlalchemy_postgres_url(url: str) -> str:
+    """postgres:// -> postgresql+psycopg:// (SQLAlchemy: psycopg v3 drayver — Python 3.13 / Render muvofiqligi)."""
+    if url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql://", 1)
+    if url.startswith("postgresql://"):
+        url = url.replace("postgresql://", "postgresql+psycopg://", 1)
+    return url
+
+
 class Config:
     # SECRET_KEY: productionda .env orqali majburiy qoldiring
     SECRET_KEY = os.environ.get("SECRET_KEY") or "furniglass-dev-only-sqlite"
@@ -52,21 +61,22 @@ class Config:
             ".env fayliga Render → PostgreSQL → External Database URL ni qo'ying."
         )
     SQLALCHEMY_ENGINE_OPTIONS = {}
+    SQLALCHEMY_BINDS = {}
     if database_url:
-        if database_url.startswith("postgres://"):
-            database_url = database_url.replace("postgres://", "postgresql://", 1)
+        database_url = _sqlalchemy_postgres_url(database_url)
         if database_url.startswith("postgresql") and not _postgres_host_valid(database_url):
             raise ValueError(
                 "DATABASE_URL hostname noto'liq yoki lokal muhitda ichki URL ishlatilmoqda. "
                 "Lokal: External Database URL (hostname ...postgres.render.com) yoki USE_SQLITE=1. "
                 "Render serverda: Internal yoki External URL to'liq bo'lishi kerak."
             )
-        # SQLAlchemy: psycopg (v3) drayver — Python 3.13 / Render muvofiqligi
-        if database_url.startswith("postgresql://"):
-            database_url = database_url.replace(
-                "postgresql://", "postgresql+psycopg://", 1
-            )
         SQLALCHEMY_DATABASE_URI = database_url
+        # Ixtiyoriy o'qish replikasi: GET sahifalar, analitika va sitemap undan o'qiydi (db.RoutingSession)
+        _replica_url = (os.environ.get("DATABASE_REPLICA_URL") or "").strip()
+        if _replica_url:
+            if not _postgres_host_valid(_replica_url):
+                raise ValueError("DATABASE_REPLICA_URL hostname noto'liq (DATABASE_URL dagi kabi to'liq bo'lishi kerak).")
+            SQLALCHEMY_BINDS = {"read": _sqlalchemy_postgres_url(_replica_url)}
         # PostgreSQL: ulanish havzasi — uzoq masofali PG uchun sekinlikni kamaytiradi
         if database_url.startswith("postgresql"):
             SQLALCHEMY_ENGINE_OPTIONS = {
@@ -77,9 +87,37 @@ class Config:
             }
     else:
         basedir = os.path.abspath(os.path.dirname(__file__))
-        SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(basedir, 'instance', 'furniglass.db')}"
+        # SQLITE_PATH — boshqa fayl (testlar vaqtinchalik bazada ishlaydi)
+        _sqlite_path = os.environ.get("SQLITE_PATH") or os.path.join(basedir, "instance", "furniglass.db")
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{_sqlite_path}"
+        # O'qish so'rovlari alohida (query_only) ulanishlarda — activity/admin yozuvlari ortida qolmaydi
+        if os.environ.get("SQLITE_SPLIT_READS", "1").strip().lower() not in ("0", "false", "no"):
+            SQLALCHEMY_BINDS = {"read": SQLALCHEMY_DATABASE_URI}
+    # "always" — read bind o'sha baza (SQLite): barcha o'qishlar; "request" — replika (kechikishi bor):
+    # faqat GET/HEAD so'rovlarda, yozuvdan keyin DATABASE_REPLICA_STICKY_SECONDS davomida asosiy baza
+    DB_READ_ROUTING = "always" if _use_sqlite or not database_url else "request"
+    DATABASE_REPLICA_STICKY_SECONDS = float(os.environ.get("DATABASE_REPLICA_STICKY_SECONDS", "5"))
+
+    # SQLite ulanish pragmalari (WAL doim yoqiladi): kutish, sinxronlash, kesh va mmap
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    SQLITE_SYNCHRONOUS = (os.environ.get("SQLITE_SYNCHRONOUS") or "NORMAL").strip().upper()
+    SQLITE_CACHE_SIZE_MB = int(os.environ.get("SQLITE_CACHE_SIZE_MB", "32"))
+    SQLITE_MMAP_MB = int(os.environ.get("SQLITE_MMAP_MB", "256"))
 
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # So'rov DB ulanishini shundan uzoq kutsa log ga ogohlantirish (ms); /metrics/db-pool — statistika
+    DB_POOL_WAIT_WARN_MS = float(os.environ.get("DB_POOL_WAIT_WARN_MS", "200"))
+    # Debug/staging: har so'rovdagi SQL soni va vaqti (X-DB-* sarlavhalari, /admin/query-stats), N+1 aniqlash
+    QUERY_DEBUG = os.environ.get("QUERY_DEBUG", "").strip().lower() in ("1", "true", "yes")
+    QUERY_N1_THRESHOLD = int(os.environ.get("QUERY_N1_THRESHOLD", "5"))
+    # Production da ham: shundan uzoq SQL log ga va /admin/slow-queries ga (ms, 0 — o'chiq); eng og'ir N shakl saqlanadi
+    SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "500"))
+    SLOW_QUERY_TOP = int(os.environ.get("SLOW_QUERY_TOP", "100"))
+    # /metrics/* ni admin sessiyasisiz o'qish uchun: Authorization: Bearer <METRICS_TOKEN>
+    METRICS_TOKEN = (os.environ.get("METRICS_TOKEN") or "").strip() or None
+    # Migratsiyalar: release da `flask --app app db-migrate`. AUTO_MIGRATE=1 — worker ishga tushganda
+    # o'zi qo'llaydi (lokal SQLite da standart; release bosqichi yo'q tarifda PostgreSQL uchun ham)
+    AUTO_MIGRATE = os.environ.get("AUTO_MIGRATE", "1" if _use_sqlite or not database_url else "0").strip().lower() in ("1", "true", "yes")
     UPLOAD_FOLDER = "static/uploads"
     _max_upload_mb = int(os.environ.get("MAX_UPLOAD_MB", "32"))
     MAX_CONTENT_LENGTH = max(1, _max_upload_mb) * 1024 * 1024
@@ -98,3 +136,42 @@ class Config:
     SUPABASE_STORAGE_BUCKET = (os.environ.get("SUPABASE_STORAGE_BUCKET") or "media").strip() or "media"
     _sb_off = os.environ.get("USE_SUPABASE_STORAGE", "").strip().lower() in ("0", "false", "no")
     USE_SUPABASE_STORAGE = bool(SUPABASE_URL and SUPABASE_KEY) and not _sb_off
+    # Bucketga yuklash uchun HTTP timeout (soniya)
+    SUPABASE_TIMEOUT = float(os.environ.get("SUPABASE_TIMEOUT", "60"))
+    # Admin formadagi bir nechta rasm bir vaqtda yuklanadi (thread pool hajmi)
+    UPLOAD_CONCURRENCY = int(os.environ.get("UPLOAD_CONCURRENCY", "4"))
+    # Admin: katta rasmlar bo'laklab yuklanadi (uzilsa davom etadi); bo'laklar vaqtinchalik papkada
+    CHUNKED_UPLOAD_CHUNK_MB = int(os.environ.get("CHUNKED_UPLOAD_CHUNK_MB", "4"))
+    CHUNKED_UPLOAD_MAX_MB = int(os.environ.get("CHUNKED_UPLOAD_MAX_MB", "200"))
+    CHUNKED_UPLOAD_DIR = os.environ.get("CHUNKED_UPLOAD_DIR") or None
+
+    # Tarjimalar: admin saqlaganda fon navbatida (TRANSLATION_ASYNC=0 — sinxron, testlar uchun)
+    # Provayder: TRANSLATION_PROVIDER=google | stub (oflayn)
+    TRANSLATION_ASYNC = os.environ.get("TRANSLATION_ASYNC", "1").strip().lower() not in ("0", "false", "no")
+
+    # Rasm variantlari (srcset): kengliklar va JPEG/WebP sifati — Pillow kerak
+    IMAGE_VARIANT_WIDTHS = tuple(
+        int(w) for w in (os.environ.get("IMAGE_VARIANT_WIDTHS") or "320,640,1280").split(",") if w.strip()
+    )
+    IMAGE_QUALITY = int(os.environ.get("IMAGE_QUALITY", "80"))
+
+    # /uploads/<path>?w=&fm=&q= — faqat shu qiymatlar ruxsat etiladi (CPU ni band qilishdan himoya)
+    IMAGE_RESIZE_WIDTHS = tuple(
+        int(w) for w in (
+            os.environ.get("IMAGE_RESIZE_WIDTHS") or "96,128,160,240,320,480,640,960,1280,1600,1920"
+        ).split(",") if w.strip()
+    )
+    IMAGE_RESIZE_QUALITIES = (50, 60, 70, 75, 80, 85, 90)
+
+    # /uploads: oddiy URL lar uchun brauzer keshi (soniya); ?v=<xesh> li URL lar — 1 yil, immutable
+    UPLOADS_MAX_AGE = int(os.environ.get("UPLOADS_MAX_AGE", "86400"))
+    # Oldida nginx bo'lsa: UPLOADS_OFFLOAD=nginx (X-Accel-Redirect), Apache: sendfile (X-Sendfile)
+    UPLOADS_OFFLOAD = (os.environ.get("UPLOADS_OFFLOAD") or "").strip().lower()
+    UPLOADS_ACCEL_PREFIX = os.environ.get("UPLOADS_ACCEL_PREFIX", "/_uploads/")
+
+    # Ishlatilmayotgan fayllarni tozalash (flask uploads-gc yoki fon thread; 0 — fon thread yo'q)
+    UPLOADS_GC_INTERVAL_HOURS = float(os.environ.get("UPLOADS_GC_INTERVAL_HOURS", "0"))
+    UPLOADS_GC_GRACE_HOURS = float(os.environ.get("UPLOADS_GC_GRACE_HOURS", "24"))
+    UPLOADS_GC_BATCH_SIZE = int(os.environ.get("UPLOADS_GC_BATCH_SIZE", "100"))
+    # _cache/ dagi o'lcham hosilalari shuncha kundan eski bo'lsa o'chiriladi (0 — tegilmaydi)
+    UPLOADS_GC_CACHE_DAYS = float(os.environ.get("UPLOADS_GC_CACHE_DAYS", "0"))
@@ -1,4 +1,152 @@
+import fcntl
+import os
+from contextlib import contextmanager
+from functools import partial, wraps
+
+import sqlalchemy as sa
+from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+
+from db_metrics import InstrumentedQueuePool
+
+# SQLALCHEMY_BINDS dagi o'qish uchun ulanishlar (SQLite: alohida havza, PostgreSQL: replika)
+READ_BIND = "read"
+SQLITE_SYNC_MODES = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+
+def _is_read(clause) -> bool:
+    if isinstance(clause, sa.Select):
+        return getattr(clause, "_for_update_arg", None) is None
+    if isinstance(clause, sa.TextClause):
+        return clause.text.lstrip().upper().startswith("SELECT")
+    return False
+
+
+class RoutingSession(Session):
+    """
+    O'qish so'rovlari ``read`` bind ga (sozlangan bo'lsa), qolgani — asosiy bazaga.
+    Tranzaksiyada biror narsa yozilgach, u tugaguncha hamma so'rov asosiy bazada
+    (o'z yozuvini ko'rish uchun). Replika (DB_READ_ROUTING="request") faqat
+    ``replica_reads`` yoqilganda ishlatiladi — uni so'rov boshida app.py belgilaydi.
+    ``committed_write`` — sessiyada yozuvli tranzaksiya commit bo'lgan (replikadan o'qishni to'xtatish uchun).
+    """
+
+    def __init__(self, db, **kwargs):
+        super().__init__(db, **kwargs)
+        self._wrote = False
+        self.replica_reads = False
+        self.committed_write = False
+
+    def _read_bind_allowed(self) -> bool:
+        if READ_BIND not in self._db.engines:
+            return False
+        return self.replica_reads or current_app.config.get("DB_READ_ROUTING") == "always"
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            if self._flushing or isinstance(clause, sa.UpdateBase):
+                self._wrote = True
+            elif not self._wrote and _is_read(clause) and self._read_bind_allowed():
+                table = sa.inspect(mapper).local_table if mapper is not None else None
+                # Flask-SQLAlchemy standart metadata da ham bind_key bor (None)
+                if table is None or table.metadata.info.get("bind_key") is None:
+                    return self._db.engines[READ_BIND]
+            elif not _is_read(clause):
+                self._wrote = True  # ALTER/UPDATE matni yoki to'g'ridan-to'g'ri connection()
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@sa.event.listens_for(RoutingSession, "after_commit")
+def _remember_committed_write(session):
+    # after_transaction_end (_wrote ni tozalaydi) dan oldin chaqiriladi
+    if session._wrote:
+        session.committed_write = True
+
+
+@sa.event.listens_for(RoutingSession, "after_transaction_end")
+def _reset_routing(session, transaction):
+    if transaction.parent is None:
+        session._wrote = False
+
+
+# Pool — ulanish kutish statistikasi bilan (db_metrics); SQLite :memory: uchun Flask-SQLAlchemy StaticPool qo'yadi
+db = SQLAlchemy(session_options={"class_": RoutingSession}, engine_options={"poolclass": InstrumentedQueuePool})
+
+
+def set_replica_reads(enabled: bool) -> None:
+    """Joriy so'rov (app context) dagi o'qishlar replikaga boradimi."""
+    db.session().replica_reads = enabled
+
+
+def force_primary(view):
+    """View dagi barcha o'qishlar asosiy bazadan (yangi yozilgan ma'lumot darhol kerak bo'lsa)."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        set_replica_reads(False)
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def _sqlite_pragmas(config, read_only, dbapi_connection, _record):
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA busy_timeout = {int(config.get('SQLITE_BUSY_TIMEOUT_MS', 5000))}")
+        # WAL: o'quvchilar yozuvchini kutmaydi (bazada saqlanadi, har ulanishda arzon). O'qish ulanishida
+        # ham — u birinchi ochilsa bazani o'zi WAL ga o'tkazadi (query_only dan oldin)
+        mode = cursor.execute("PRAGMA journal_mode = WAL").fetchone()
+        if not mode or str(mode[0]).lower() != "wal":
+            print(f"SQLite: WAL yoqilmadi (journal_mode={mode[0] if mode else None}) — o'qishlar yozuvni kutadi")
+        synchronous = config.get("SQLITE_SYNCHRONOUS", "NORMAL")
+        cursor.execute(f"PRAGMA synchronous = {synchronous if synchronous in SQLITE_SYNC_MODES else 'NORMAL'}")
+        cursor.execute(f"PRAGMA cache_size = -{int(config.get('SQLITE_CACHE_SIZE_MB', 32)) * 1024}")
+        cursor.execute(f"PRAGMA mmap_size = {int(config.get('SQLITE_MMAP_MB', 256)) * 1024 * 1024}")
+        cursor.execute("PRAGMA temp_store = MEMORY")
+        if read_only:
+            cursor.execute("PRAGMA query_only = ON")
+    finally:
+        cursor.close()
+
+
+def configure_engines(app) -> None:
+    """SQLite fayl bazalari uchun ulanish pragmalari (db.init_app dan keyin, ulanishlar ochilishidan oldin)."""
+    with app.app_context():
+        for key, engine in db.engines.items():
+            if engine.dialect.name != "sqlite" or engine.url.database in (None, "", ":memory:"):
+                continue
+            sa.event.listen(engine, "connect", partial(_sqlite_pragmas, app.config, key == READ_BIND))
 
-db = SQLAlchemy()
 
+@contextmanager
+def worker_lock(app, lock_id: int, name: str, blocking: bool = False):
+    """
+    Jarayonlararo qulf: ``True`` — shu worker oldi, ``False`` — boshqasida. ``blocking=True`` —
+    bo'shashini kutadi (har doim ``True``).
+    PostgreSQL: pg_(try_)advisory_lock (ulanish qulf davomida band), SQLite: instance/<name>.lock.
+    """
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name == "postgresql":
+        with engine.connect() as conn:
+            if blocking:
+                conn.execute(sa.text("SELECT pg_advisory_lock(:id)"), {"id": lock_id})
+                acquired = True
+            else:
+                acquired = bool(conn.execute(sa.text("SELECT pg_try_advisory_lock(:id)"), {"id": lock_id}).scalar())
+            try:
+                yield acquired
+            finally:
+                if acquired:
+                    conn.execute(sa.text("SELECT pg_advisory_unlock(:id)"), {"id": lock_id})
+        return
+    os.makedirs(app.instance_path, exist_ok=True)
+    with open(os.path.join(app.instance_path, f"{name}.lock"), "w") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
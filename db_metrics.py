@@ -0,0 +1,158 @@
+"""
+DB ulanish havzasi (pool) statistikasi — har worker jarayoni uchun alohida.
+Ulanish olishni kutish vaqti, band/overflow ulanishlar, timeout va pre-ping/uzilish sabab
+bekor qilingan ulanishlar yig'iladi. So'rov thread i havzani ``DB_POOL_WAIT_WARN_MS`` dan
+uzoq kutsa ogohlantirish chiqadi (log ni to'ldirmasligi uchun siyraklashtirilgan).
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Optional
+
+from sqlalchemy import event
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.pool import QueuePool
+
+if TYPE_CHECKING:
+    from flask import Flask
+
+WAIT_SAMPLE_SIZE = 1000
+WARNING_INTERVAL = 10  # soniya — shu oraliqda bitta ogohlantirish, qolganlari sanaladi
+
+
+class PoolStats:
+    def __init__(self, name: str, warn_after: float):
+        self.name = name
+        self.warn_after = warn_after
+        self._lock = threading.Lock()
+        self._waits: deque = deque(maxlen=WAIT_SAMPLE_SIZE)
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.slow_waits = 0
+        self.timeouts = 0
+        self.invalidated = 0
+        self.peak_in_use = 0
+        self.peak_overflow = 0
+        self._last_warning = 0.0
+        self._suppressed = 0
+
+    def record_checkout(self, pool: QueuePool, wait: float) -> None:
+        in_use, overflow = pool.checkedout(), max(0, pool.overflow())
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+            self._waits.append(wait)
+            self.peak_in_use = max(self.peak_in_use, in_use)
+            self.peak_overflow = max(self.peak_overflow, overflow)
+            slow = wait >= self.warn_after
+            if slow:
+                self.slow_waits += 1
+        if slow:
+            self._warn(pool, wait, "kutdi")
+
+    def record_timeout(self, pool: QueuePool, wait: float) -> None:
+        with self._lock:
+            self.timeouts += 1
+        self._warn(pool, wait, "timeout")
+
+    def record_invalidate(self, *_args) -> None:
+        with self._lock:
+            self.invalidated += 1
+
+    def _warn(self, pool: QueuePool, wait: float, what: str) -> None:
+        from flask import has_request_context, request
+
+        if not has_request_context():
+            return  # fon thread lar kutishi so'rovni sekinlashtirmaydi — faqat statistika
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_warning < WARNING_INTERVAL:
+                self._suppressed += 1
+                return
+            suppressed, self._suppressed = self._suppressed, 0
+            self._last_warning = now
+        print(
+            f"DB pool [{self.name}] {what}: {request.method} {request.path} {wait * 1000:.0f} ms "
+            f"(band {pool.checkedout()}/{pool.size()}, overflow {max(0, pool.overflow())}, pid {os.getpid()})"
+            + (f" — yana {suppressed} ta shunday holat" if suppressed else "")
+        )
+
+    def snapshot(self, pool) -> dict:
+        with self._lock:
+            waits = sorted(self._waits)
+            data = {
+                "checkouts": self.checkouts,
+                "wait_avg_ms": round(1000 * self.wait_total / self.checkouts, 2) if self.checkouts else 0,
+                "wait_max_ms": round(1000 * self.wait_max, 2),
+                "slow_waits": self.slow_waits,
+                "timeouts": self.timeouts,
+                "invalidated": self.invalidated,
+                "peak_in_use": self.peak_in_use,
+                "peak_overflow": self.peak_overflow,
+            }
+        for label, q in (("wait_p50_ms", 0.5), ("wait_p95_ms", 0.95), ("wait_p99_ms", 0.99)):
+            data[label] = round(1000 * waits[min(len(waits) - 1, int(q * len(waits)))], 2) if waits else 0
+        if isinstance(pool, QueuePool):
+            data.update({
+                "size": pool.size(),
+                "in_use": pool.checkedout(),
+                "idle": pool.checkedin(),
+                "overflow": max(0, pool.overflow()),
+                "max_overflow": pool._max_overflow,
+            })
+        return data
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool + ulanish olish vaqtini o'lchash (``stats`` instrument_pools da beriladi)."""
+
+    stats: Optional[PoolStats] = None
+
+    def _do_get(self):
+        stats = self.stats
+        if stats is None:
+            return super()._do_get()
+        start = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except sa_exc.TimeoutError:
+            stats.record_timeout(self, time.perf_counter() - start)
+            raise
+        stats.record_checkout(self, time.perf_counter() - start)
+        return record
+
+    def recreate(self):
+        # engine.dispose() (masalan gunicorn post_fork) yangi pool yaratadi — statistika saqlanadi
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+def instrument_pools(app: "Flask") -> None:
+    """Har engine pool iga statistika ulaydi (db.init_app dan keyin)."""
+    from db import db
+
+    warn_after = float(app.config.get("DB_POOL_WAIT_WARN_MS", 200)) / 1000
+    with app.app_context():
+        for key, engine in db.engines.items():
+            if isinstance(engine.pool, InstrumentedQueuePool) and engine.pool.stats is None:
+                stats = PoolStats(key or "primary", warn_after)
+                engine.pool.stats = stats
+                event.listen(engine, "invalidate", stats.record_invalidate)
+
+
+def pool_metrics() -> dict:
+    """Joriy worker dagi barcha pool lar holati (app context ichida)."""
+    from db import db
+
+    pools = {}
+    for key, engine in db.engines.items():
+        stats = getattr(engine.pool, "stats", None)
+        if stats is not None:
+            pools[stats.name] = stats.snapshot(engine.pool)
+    return {"pid": os.getpid(), "pools": pools}
@@ -0,0 +1,126 @@
+"""
+Gunicorn sozlamalari (Render / production): gunicorn -c gunicorn.conf.py app:app
+
+- Worker lar soni CPU (cgroup kvotasi) va xotiradan hisoblanadi; WEB_CONCURRENCY bilan almashtiriladi.
+- gthread: har worker da GUNICORN_THREADS ta thread (I/O — DB, Supabase, Telegram kutadi).
+- preload_app: ilova (va sxema versiyasi tekshiruvi) master da bir marta yuklanadi, keyin
+  ``gc.freeze()`` — worker lar xotirani copy-on-write bilan bo'lishadi.
+- post_fork: master dan meros qolgan DB ulanishlari tashlanadi, fon thread lar qayta ishga tushadi.
+- worker_exit: Telegram outbox, tarjima va activity navbatlari yuborib/yozib bo'linadi.
+"""
+import gc
+import math
+import os
+import sys
+import time
+
+# Bitta worker uchun taxminiy xotira (MB) — Flask + SQLAlchemy + Pillow
+WORKER_MEMORY_MB = int(os.environ.get("GUNICORN_WORKER_MEMORY_MB", "160"))
+# worker_exit da navbatlarni kutish (graceful_timeout dan kichik bo'lsin)
+SHUTDOWN_FLUSH_TIMEOUT = float(os.environ.get("SHUTDOWN_FLUSH_TIMEOUT", "10"))
+
+
+def _cpu_count():
+    # cgroup v2 kvotasi (konteynerda os.cpu_count() butun mashinani ko'rsatadi)
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            return max(1, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    return os.cpu_count() or 1
+
+
+def _memory_mb():
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+            if value != "max" and int(value) < 1 << 50:
+                return int(value) // (1024 * 1024)
+        except (OSError, ValueError):
+            pass
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def _default_workers():
+    by_cpu = 2 * _cpu_count() + 1
+    memory = _memory_mb()
+    if memory:
+        # Master va ehtiyot uchun bitta worker hajmini qoldiramiz
+        return max(1, min(by_cpu, memory // WORKER_MEMORY_MB - 1))
+    return by_cpu
+
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '10000')}"
+workers = int(os.environ.get("WEB_CONCURRENCY") or _default_workers())
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+worker_class = "gthread" if threads > 1 else "sync"
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1").strip().lower() not in ("0", "false", "no")
+
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", "5"))
+# Xotira sizib chiqmasligi uchun worker lar vaqti-vaqti bilan almashtiriladi
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", "1000"))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", "100"))
+accesslog = os.environ.get("GUNICORN_ACCESSLOG") or None
+errorlog = "-"
+
+
+def _dispose_engines(close):
+    from app import app
+    from db import db
+
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=close)
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+    # Master hech qanday DB ulanishini ushlab turmasin — worker lar o'zinikini ochadi
+    _dispose_engines(close=True)
+    # Import paytida yaratilgan obyektlar GC tomonidan ko'rilmaydi (sahifalar nusxalanmaydi)
+    gc.collect()
+    gc.freeze()
+    server.log.info("Preload: %d ta obyekt muzlatildi, %d worker x %d thread", gc.get_freeze_count(), workers, threads)
+
+
+def post_fork(server, worker):
+    if not preload_app:
+        return
+    # Ota jarayon ulanishlarini yopmasdan tashlaymiz (ular boshqa jarayonga tegishli)
+    _dispose_engines(close=False)
+
+    from app import app
+    from telegram_utils import telegram_sender
+    from upload_gc import upload_gc
+
+    telegram_sender.ensure_running(app)
+    upload_gc.ensure_running(app)
+
+
+def worker_exit(server, worker):
+    if "app" not in sys.modules:
+        return
+    from app import wait_for_user_activity
+    from telegram_utils import telegram_sender
+    from translation_utils import wait_for_translations
+
+    # Hammasi uchun bitta muddat — graceful_timeout dan oshib SIGKILL olmasligi uchun
+    deadline = time.monotonic() + SHUTDOWN_FLUSH_TIMEOUT
+    try:
+        if not telegram_sender.flush(timeout=SHUTDOWN_FLUSH_TIMEOUT):
+            server.log.warning("Telegram outbox %ss ichida bo'shamadi — qolganlari keyingi worker da", SHUTDOWN_FLUSH_TIMEOUT)
+        if not wait_for_translations(timeout=max(0.0, deadline - time.monotonic())):
+            server.log.warning("Tarjima navbati tugamadi — qolganlari `flask translate-backfill` bilan to'ldiriladi")
+        if not wait_for_user_activity(timeout=max(0.0, deadline - time.monotonic())):
+            server.log.warning("Activity navbati tugamadi — qolgan yozuvlar tashlandi")
+    except Exception as e:
+        server.log.warning("Shutdown flush xatolik: %s", e)
@@ -0,0 +1,574 @@
+"""
+Rasm variantlari: yuklangan rasmdan bir nechta kenglikdagi nusxalar (asl format + WebP).
+Kartochkalar 300 px atrofida ko'rsatiladi — brauzer ``srcset`` orqali mosini tanlaydi.
+Oldindan bilinmaydigan o'lchamlar uchun ``/uploads/<path>?w=..&fm=..&q=..`` — nusxa bir marta yaratilib keshlanadi.
+Pillow ixtiyoriy: o'rnatilmagan bo'lsa variantlar yaratilmaydi, shablonlar asl rasmni ko'rsatadi.
+"""
+from __future__ import annotations
+
+import base64
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import TYPE_CHECKING, List, Optional, Sequence, Tuple
+
+from werkzeug.security import safe_join
+
+from db import db
+from models import ImageAsset
+from storage_utils import list_uploaded_files, public_storage_url, read_uploaded_file, save_file_bytes
+
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+
+    from flask import Flask
+
+# Variantlar faqat shu papkalardagi rasmlar uchun (designs — mijoz eskizlari, icons — kichik)
+VARIANT_FOLDERS = ("products", "categories", "main_categories", "brands", "clients", "portfolio")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+FORMAT_EXTENSIONS = {"jpeg": ".jpg", "png": ".png", "webp": ".webp"}
+CONTENT_TYPES = {"jpeg": "image/jpeg", "png": "image/png", "webp": "image/webp"}
+
+_VARIANT_RE = re.compile(r"\.w\d+\.(jpg|png|webp)$", re.IGNORECASE)
+FORMAT_ALIASES = {"jpg": "jpeg", "jpeg": "jpeg", "png": "png", "webp": "webp"}
+# Talab bo'yicha o'lcham o'zgartirilgan nusxalar shu papkada (disk yoki bucket)
+DERIVATIVE_PREFIX = "_cache"
+# LQIP: eng uzun tomoni 16 px li WebP (~150 bayt, HTML ichida data: URI)
+LQIP_SIZE = 16
+LQIP_QUALITY = 40
+_pillow_warned = False
+
+
+def pillow_available() -> bool:
+    global _pillow_warned
+    try:
+        import PIL  # noqa: F401
+        return True
+    except ImportError:
+        if not _pillow_warned:
+            print("Pillow o'rnatilmagan — rasm variantlari yaratilmaydi (pip install Pillow)")
+            _pillow_warned = True
+        return False
+
+
+def is_variant_source(key: str) -> bool:
+    """Variant tayyorlanadigan asl rasmmi (variantning o'zi emas)."""
+    key = (key or "").replace("\\", "/").lstrip("/")
+    folder = key.split("/", 1)[0]
+    return (
+        folder in VARIANT_FOLDERS
+        and key.lower().endswith(IMAGE_EXTENSIONS)
+        and not _VARIANT_RE.search(key)
+    )
+
+
+def variant_key(key: str, width: int, fmt: str) -> str:
+    """products/abc_stul.jpg -> products/abc_stul.w640.webp"""
+    stem, _ext = os.path.splitext(key.replace("\\", "/").lstrip("/"))
+    return f"{stem}.w{width}{FORMAT_EXTENSIONS[fmt]}"
+
+
+def _placeholder(im, has_alpha: bool) -> Tuple[str, Optional[str]]:
+    """Asosiy rang (#rrggbb) va kichkina LQIP (data: URI). Shaffof rasmda LQIP yo'q."""
+    from PIL import Image
+
+    small = im.convert("RGB")
+    small.thumbnail((64, 64))
+    quantized = small.quantize(colors=4)
+    _count, index = max(quantized.getcolors())
+    r, g, b = quantized.getpalette()[index * 3:index * 3 + 3]
+    color = f"#{r:02x}{g:02x}{b:02x}"
+    if has_alpha:
+        return color, None
+    small.thumbnail((LQIP_SIZE, LQIP_SIZE), Image.BILINEAR)
+    buf = io.BytesIO()
+    small.save(buf, "WEBP", quality=LQIP_QUALITY)
+    return color, "data:image/webp;base64," + base64.b64encode(buf.getvalue()).decode("ascii")
+
+
+def render_variants(source, widths: Sequence[int], quality: int) -> dict:
+    """
+    Rasmni o'qib kichik variantlarini qaytaradi (DB/app ga bog'liq emas — process pool da ishlaydi).
+    ``source`` — fayl yo'li yoki baytlar. Asl rasmdan katta kenglik yaratilmaydi.
+    """
+    from PIL import Image, ImageOps
+
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    resample = getattr(Image, "Resampling", Image).LANCZOS
+
+    with Image.open(source) as im:
+        im = ImageOps.exif_transpose(im)
+        width, height = im.size
+        targets = sorted(w for w in widths if w < width)
+        has_alpha = im.mode in ("RGBA", "LA") or (im.mode == "P" and "transparency" in im.info)
+        fallback = "png" if has_alpha else "jpeg"
+        dominant_color, lqip = _placeholder(im, has_alpha)
+        variants = []
+        if targets:
+            im = im.convert("RGBA" if has_alpha else "RGB")
+            for target in targets:
+                resized = im.resize((target, max(1, round(height * target / width))), resample)
+                for fmt in (fallback, "webp"):
+                    buf = io.BytesIO()
+                    options = {"optimize": True} if fmt == "png" else {"quality": quality}
+                    if fmt == "jpeg":
+                        options.update(optimize=True, progressive=True)
+                    resized.save(buf, fmt.upper(), **options)
+                    variants.append((target, fmt, buf.getvalue()))
+    return {"width": width, "height": height, "variants": variants, "dominant_color": dominant_color, "lqip": lqip}
+
+
+def _process_context():
+    """Thread lar bor jarayondan fork xavfli — forkserver (Linux) yoki spawn."""
+    import multiprocessing
+
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def _settings(app: "Flask"):
+    return tuple(app.config.get("IMAGE_VARIANT_WIDTHS") or (320, 640, 1280)), int(app.config.get("IMAGE_QUALITY", 80))
+
+
+def save_variant_files(app: "Flask", key: str, rendered: dict) -> List[dict]:
+    """Variant fayllarini saqlaydi (DB ga tegmaydi — fon thread da ham chaqirish mumkin)."""
+    variants = []
+    for width, fmt, data in rendered["variants"]:
+        vkey = variant_key(key, width, fmt)
+        save_file_bytes(app, vkey, data, CONTENT_TYPES[fmt])
+        variants.append({"width": width, "format": fmt, "key": vkey})
+    return variants
+
+
+def record_variants(key: str, rendered: dict, variants: List[dict]) -> ImageAsset:
+    """ImageAsset ni sessiyaga qo'shadi/yangilaydi (commit chaqiruvchida)."""
+    with db.session.no_autoflush:
+        asset = ImageAsset.query.filter_by(key=key).first()
+    if asset is None:
+        asset = ImageAsset(key=key)
+        db.session.add(asset)
+    asset.width = rendered["width"]
+    asset.height = rendered["height"]
+    asset.variants = json.dumps(variants)
+    asset.dominant_color = rendered.get("dominant_color")
+    asset.lqip = rendered.get("lqip")
+    image_index.invalidate()
+    return asset
+
+
+def store_variants(app: "Flask", key: str, rendered: dict) -> ImageAsset:
+    """Variantlarni saqlaydi va ImageAsset ni sessiyaga qo'shadi (commit chaqiruvchida)."""
+    return record_variants(key, rendered, save_variant_files(app, key, rendered))
+
+
+def prepare_variants(app: "Flask", key: str, source) -> Optional[Tuple[dict, List[dict]]]:
+    """Variantlarni yaratib saqlaydi, DB yozuvisiz: (rendered, variants). Xato bo'lsa None."""
+    if not pillow_available():
+        return None
+    widths, quality = _settings(app)
+    try:
+        rendered = render_variants(source, widths, quality)
+        return rendered, save_variant_files(app, key, rendered)
+    except Exception as e:
+        print(f"Rasm variantlari xatolik ({key}): {e}")
+        return None
+
+
+def describe_image(app: "Flask", key: str, source=None) -> Optional[ImageAsset]:
+    """Variantsiz: faqat o'lcham va placeholder (masalan, Hero fon rasmi). Xato bo'lsa None."""
+    if not pillow_available():
+        return None
+    try:
+        rendered = render_variants(source if source is not None else read_uploaded_file(app, key), (), 0)
+        return record_variants(key, rendered, [])
+    except Exception as e:
+        print(f"Rasm ma'lumotlari xatolik ({key}): {e}")
+        return None
+
+
+def generate_variants(app: "Flask", key: str, source) -> Optional[ImageAsset]:
+    """Yuklash paytida: variantlarni yaratadi. Xato bo'lsa None — asl rasm baribir saqlangan."""
+    prepared = prepare_variants(app, key, source)
+    if prepared is None:
+        return None
+    try:
+        return record_variants(key, *prepared)
+    except Exception as e:
+        print(f"Rasm variantlari xatolik ({key}): {e}")
+        return None
+
+
+class _ImageIndex:
+    """Jarayon ichidagi key -> ImageAsset ma'lumoti; har ``ttl`` soniyada bitta so'rov bilan yangilanadi."""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._data: dict = {}
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def invalidate(self) -> None:
+        self._loaded_at = 0.0
+
+    def get(self, key: str) -> Optional[dict]:
+        if time.monotonic() - self._loaded_at > self.ttl:
+            self._reload()
+        return self._data.get(key)
+
+    def _reload(self) -> None:
+        with self._lock:
+            if time.monotonic() - self._loaded_at <= self.ttl:
+                return
+            try:
+                rows = db.session.query(
+                    ImageAsset.key, ImageAsset.width, ImageAsset.height, ImageAsset.variants,
+                    ImageAsset.dominant_color, ImageAsset.lqip,
+                ).all()
+            except Exception as e:
+                print(f"Rasm indeksini yuklashda xatolik: {e}")
+                db.session.rollback()
+                rows = []
+            data = {}
+            for key, width, height, variants, color, lqip in rows:
+                try:
+                    variants = json.loads(variants) if variants else []
+                except ValueError:
+                    variants = []
+                data[key] = {"width": width, "height": height, "variants": variants, "color": color, "lqip": lqip}
+            self._data = data
+            self._loaded_at = time.monotonic()
+
+
+image_index = _ImageIndex(ttl=float(os.environ.get("IMAGE_INDEX_TTL", "60")))
+
+
+def image_srcset(app: "Flask", key: str, fmt: str = "webp") -> str:
+    """``srcset`` qiymati: variantlar + asl rasm; variant bo'lmasa bo'sh satr."""
+    if not key:
+        return ""
+    key = key.replace("\\", "/").lstrip("/")
+    info = image_index.get(key)
+    if not info:
+        return ""
+    from upload_serving import upload_url
+
+    parts = [
+        f"{upload_url(app, v['key'])} {v['width']}w"
+        for v in info["variants"]
+        if v.get("format") == fmt
+    ]
+    if not parts:
+        return ""
+    if info.get("width"):
+        parts.append(f"{upload_url(app, key)} {info['width']}w")
+    return ", ".join(parts)
+
+
+def image_placeholder(key: str) -> Optional[dict]:
+    """O'lcham va placeholder: {"width", "height", "color", "lqip"}; rasm ma'lumoti yo'q bo'lsa None."""
+    if not key:
+        return None
+    info = image_index.get(key.replace("\\", "/").lstrip("/"))
+    if not info or not info.get("width"):
+        return None
+    return {"width": info["width"], "height": info["height"], "color": info.get("color"), "lqip": info.get("lqip")}
+
+
+def backfill_variants(app: "Flask", workers: Optional[int] = None, force: bool = False,
+                      dry_run: bool = False, limit: Optional[int] = None) -> dict:
+    """
+    Mavjud rasmlar uchun variantlar: Pillow ishi CPU yadrolari bo'ylab process pool da,
+    saqlash va DB yozuvi asosiy jarayonda. App context ichida chaqiriladi.
+    """
+    keys = [key for folder in VARIANT_FOLDERS for key in list_uploaded_files(app, folder) if is_variant_source(key)]
+    # Placeholder (asosiy rang) hisoblanmagan eski yozuvlar ham qayta ishlanadi
+    done = set() if force else {
+        key for (key,) in db.session.query(ImageAsset.key).filter(ImageAsset.dominant_color.isnot(None))
+    }
+    todo = [key for key in keys if key not in done]
+    if limit is not None:
+        todo = todo[:limit]
+    report = {"found": len(keys), "todo": len(todo), "processed": 0, "failed": 0}
+    if dry_run or not todo:
+        return report
+    if not pillow_available():
+        raise RuntimeError("Pillow o'rnatilmagan")
+
+    widths, quality = _settings(app)
+    workers = workers or os.cpu_count() or 1
+    local_root = None if app.config.get("USE_SUPABASE_STORAGE") else os.path.abspath(app.config["UPLOAD_FOLDER"])
+    queue = iter(todo)
+    pending = {}
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=_process_context()) as pool:
+        def submit_next() -> None:
+            key = next(queue, None)
+            if key is None:
+                return
+            source = os.path.join(local_root, key) if local_root else read_uploaded_file(app, key)
+            pending[pool.submit(render_variants, source, widths, quality)] = key
+
+        # Navbatda bir vaqtda ko'pi bilan 2 x workers ta rasm — xotira cheklangan
+        for _ in range(workers * 2):
+            submit_next()
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                key = pending.pop(future)
+                try:
+                    store_variants(app, key, future.result())
+                    db.session.commit()
+                    report["processed"] += 1
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Rasm variantlari xatolik ({key}): {e}")
+                    report["failed"] += 1
+                submit_next()
+    return report
+
+
+def resize_image(source, width: Optional[int], fmt: str, quality: int) -> bytes:
+    """Bitta nusxa: kenglik (kichraytirish), format va sifat. Process pool da ishlaydi."""
+    from PIL import Image, ImageOps
+
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    resample = getattr(Image, "Resampling", Image).LANCZOS
+
+    with Image.open(source) as im:
+        if width and im.format == "JPEG":
+            # JPEG ni kichik masshtabda dekodlash — katta fotosuratlarda bir necha barobar tez
+            im.draft("RGB", (width, width))
+        im = ImageOps.exif_transpose(im)
+        if width and width < im.width:
+            im = im.resize((width, max(1, round(im.height * width / im.width))), resample)
+        has_alpha = im.mode in ("RGBA", "LA") or (im.mode == "P" and "transparency" in im.info)
+        if fmt == "jpeg" or not has_alpha:
+            im = im.convert("RGB")
+        elif im.mode != "RGBA":
+            im = im.convert("RGBA")
+        buf = io.BytesIO()
+        if fmt == "png":
+            im.save(buf, "PNG", optimize=True)
+        elif fmt == "jpeg":
+            im.save(buf, "JPEG", quality=quality, optimize=True, progressive=True)
+        else:
+            im.save(buf, "WEBP", quality=quality)
+        return buf.getvalue()
+
+
+class ResizeBusy(Exception):
+    """Navbat to'la, vaqt tugadi yoki pool ishdan chiqdi — mijozga 503 (Retry-After) qaytariladi."""
+
+
+class UnsupportedImage(Exception):
+    """Manba faylni rasm sifatida o'qib bo'lmadi (buzuq yoki juda katta) — 415."""
+
+
+def parse_resize_params(app: "Flask", key: str, args) -> Optional[tuple]:
+    """
+    ``?w=640&fm=webp&q=70`` -> (width, fmt, quality). Parametr yo'q bo'lsa None.
+    Faqat ruxsat etilgan qiymatlar (CPU ni band qilib qo'yish mumkin bo'lmasin) — aks holda ValueError.
+    """
+    if not any(name in args for name in ("w", "fm", "q")):
+        return None
+    ext = os.path.splitext(key)[1].lower().lstrip(".")
+    if ext not in FORMAT_ALIASES:
+        return None  # gif, svg va h.k. — asl fayl beriladi
+    width = None
+    if args.get("w"):
+        try:
+            width = int(args["w"])
+        except ValueError:
+            raise ValueError("w noto'g'ri")
+        if width not in app.config.get("IMAGE_RESIZE_WIDTHS", ()):
+            raise ValueError("w ruxsat etilmagan")
+    fmt = FORMAT_ALIASES.get((args.get("fm") or ext).lower())
+    if fmt is None:
+        raise ValueError("fm ruxsat etilmagan")
+    quality = int(app.config.get("IMAGE_QUALITY", 80))
+    if args.get("q"):
+        try:
+            quality = int(args["q"])
+        except ValueError:
+            raise ValueError("q noto'g'ri")
+        if quality not in app.config.get("IMAGE_RESIZE_QUALITIES", ()):
+            raise ValueError("q ruxsat etilmagan")
+    return width, fmt, quality
+
+
+def _upload_path(app: "Flask", key: str) -> str:
+    """Uploads papkasi ichidagi yo'l; ``..`` yoki absolyut kalit — FileNotFoundError (404)."""
+    path = safe_join(os.path.abspath(app.config["UPLOAD_FOLDER"]), key)
+    if path is None:
+        raise FileNotFoundError(key)
+    return path
+
+
+class DerivativeCache:
+    """
+    Talab bo'yicha o'lcham: har nusxa bir marta process pool da yaratiladi va
+    ``_cache/ab/<sha256>.<ext>`` kaliti bilan disk yoki bucketda saqlanadi.
+    Kalit manba kaliti, uning versiyasi (mahalliy diskda mtime/hajm) va parametrlardan hisoblanadi.
+    """
+
+    def __init__(self, processes: int = 2, max_pending: int = 8, timeout: float = 30, known_size: int = 4096):
+        self.processes = processes
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.known_size = known_size
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._inflight: "dict[str, Future]" = {}
+        self._known: "OrderedDict[str, bool]" = OrderedDict()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        # fork dan keyin (gunicorn worker) ota jarayonning pool i yaroqsiz; buzilgan pool None qilinadi
+        if self._pool is None or self._pool_pid != os.getpid():
+            with self._lock:
+                if self._pool is None or self._pool_pid != os.getpid():
+                    from concurrent.futures import ProcessPoolExecutor
+
+                    self._pool = ProcessPoolExecutor(max_workers=self.processes, mp_context=_process_context())
+                    self._pool_pid = os.getpid()
+        return self._pool
+
+    def derivative_key(self, app: "Flask", key: str, width: Optional[int], fmt: str, quality: int) -> str:
+        version = ""
+        path = _upload_path(app, key)  # bucketda ham — kalit papkadan chiqmasin
+        if not app.config.get("USE_SUPABASE_STORAGE"):
+            st = os.stat(path)
+            version = f"{st.st_mtime_ns}:{st.st_size}"
+        digest = hashlib.sha256(f"{key}|{version}|{width or 0}|{fmt}|{quality}".encode("utf-8")).hexdigest()
+        return f"{DERIVATIVE_PREFIX}/{digest[:2]}/{digest}{FORMAT_EXTENSIONS[fmt]}"
+
+    def known_key(self, app: "Flask", key: str, width: Optional[int], fmt: str, quality: int) -> Optional[str]:
+        """Nusxa shu jarayonda yaratilgan yoki tekshirilgan bo'lsa uning kaliti (tarmoq so'rovisiz), aks holda None."""
+        try:
+            dkey = self.derivative_key(app, key, width, fmt, quality)
+        except OSError:
+            return None
+        return dkey if dkey in self._known else None
+
+    def _discard_pool(self, pool: ProcessPoolExecutor) -> None:
+        """Bola jarayon o'lgan (masalan OOM) — keyingi so'rov yangi pool yaratadi."""
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _release(self, dkey: str) -> None:
+        with self._lock:
+            self._inflight.pop(dkey, None)
+
+    def _remember(self, dkey: str) -> None:
+        with self._lock:
+            self._known[dkey] = True
+            self._known.move_to_end(dkey)
+            while len(self._known) > self.known_size:
+                self._known.popitem(last=False)
+
+    def _exists(self, app: "Flask", dkey: str) -> bool:
+        if dkey in self._known:
+            return True
+        if app.config.get("USE_SUPABASE_STORAGE"):
+            import requests
+
+            try:
+                found = requests.head(public_storage_url(app, dkey), timeout=5).status_code == 200
+            except Exception:
+                found = False
+        else:
+            found = os.path.isfile(_upload_path(app, dkey))
+        if found:
+            self._remember(dkey)
+        return found
+
+    def get(self, app: "Flask", key: str, width: Optional[int], fmt: str, quality: int) -> str:
+        """
+        Tayyor nusxa kaliti. Manba yo'q yoki yo'l xavfli — FileNotFoundError, rasm buzuq —
+        UnsupportedImage, navbat to'la / vaqt tugadi / pool buzildi — ResizeBusy.
+        """
+        from concurrent.futures.process import BrokenProcessPool  # multiprocessing — kerak bo'lganda
+
+        dkey = self.derivative_key(app, key, width, fmt, quality)
+        if self._exists(app, dkey):
+            return dkey
+
+        with self._lock:
+            waiter = self._inflight.get(dkey)
+            owner = waiter is None
+            if owner:
+                if len(self._inflight) >= self.max_pending:
+                    raise ResizeBusy()
+                waiter = Future()
+                self._inflight[dkey] = waiter
+        if not owner:
+            # Xuddi shu nusxani boshqa so'rov yaratmoqda — natijasini kutamiz
+            try:
+                return waiter.result(self.timeout)
+            except TimeoutError:
+                raise ResizeBusy() from None
+
+        try:
+            if app.config.get("USE_SUPABASE_STORAGE"):
+                try:
+                    source = read_uploaded_file(app, key)
+                except Exception as e:
+                    raise FileNotFoundError(key) from e
+            else:
+                source = _upload_path(app, key)
+            pool = self._get_pool()
+            try:
+                job = pool.submit(resize_image, source, width, fmt, quality)
+            except BrokenProcessPool:
+                self._discard_pool(pool)
+                raise ResizeBusy() from None
+        except BaseException as e:
+            self._release(dkey)
+            waiter.set_exception(e)
+            raise
+        # Slot pool dagi ish tugagandagina bo'shaydi (so'rov kutmay qo'ysa ham) — max_pending CPU ni cheklaydi
+        job.add_done_callback(lambda _job: self._release(dkey))
+
+        try:
+            try:
+                data = job.result(self.timeout)
+            except TimeoutError:
+                raise ResizeBusy() from None
+            except BrokenProcessPool:
+                self._discard_pool(pool)
+                raise ResizeBusy() from None
+            except FileNotFoundError:
+                raise
+            except OSError as e:  # PIL.UnidentifiedImageError ham
+                raise UnsupportedImage(str(e)) from e
+            except Exception as e:
+                from PIL import Image
+
+                if isinstance(e, Image.DecompressionBombError):
+                    raise UnsupportedImage(str(e)) from e
+                raise
+            save_file_bytes(app, dkey, data, CONTENT_TYPES[fmt])
+            self._remember(dkey)
+            waiter.set_result(dkey)
+            return dkey
+        except BaseException as e:
+            waiter.set_exception(e)
+            raise
+
+
+derivative_cache = DerivativeCache(
+    processes=int(os.environ.get("IMAGE_RESIZE_PROCESSES", "2")),
+    max_pending=int(os.environ.get("IMAGE_RESIZE_MAX_PENDING", "8")),
+)
@@ -0,0 +1,265 @@
+"""
+Raqamlangan, bir martalik migratsiyalar.
+Har migratsiya ``schema_migration`` jurnaliga yoziladi va qayta ishlamaydi. Ularni release
+bosqichida ``flask --app app db-migrate`` qo'llaydi (advisory lock ostida — bir vaqtda faqat
+bitta jarayon). Worker lar ishga tushganda faqat bitta arzon so'rov: ``MAX(version)``.
+
+Yangi migratsiya: keyingi raqam bilan ``@migration(N, "...")``. Eski bazalar sxemasi
+``apply_db_migrations`` davridan turlicha bo'lishi mumkin — shuning uchun qadamlar
+idempotent yoziladi (``add_column`` mavjud ustunni o'tkazib yuboradi).
+"""
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import inspect, text
+
+from db import db, worker_lock
+from models import Brand, SchemaMigration, Service, slugify_brand_slug, unique_brand_slug
+
+if TYPE_CHECKING:
+    from flask import Flask
+
+# pg_advisory_lock kaliti (ixtiyoriy butun son; "FGMI")
+MIGRATION_LOCK_ID = 0x46474D49
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    func: Callable[[], None]
+
+
+MIGRATIONS: Dict[int, Migration] = {}
+
+
+def migration(version: int, name: str):
+    """Migratsiyani ro'yxatga qo'shadi (raqam takrorlanmasligi kerak)."""
+    def decorator(func: Callable[[], None]) -> Callable[[], None]:
+        if version in MIGRATIONS:
+            raise ValueError(f"Migratsiya {version} ikki marta e'lon qilingan")
+        MIGRATIONS[version] = Migration(version, name, func)
+        return func
+    return decorator
+
+
+def latest_version() -> int:
+    return max(MIGRATIONS) if MIGRATIONS else 0
+
+
+def _column_names(table: str) -> Optional[List[str]]:
+    try:
+        return [c["name"] for c in inspect(db.engine).get_columns(table)]
+    except Exception:
+        return None
+
+
+def add_column(table: str, column: str, coltype: str) -> None:
+    """Ustun yo'q bo'lsa qo'shadi (jadval yo'q bo'lsa — hech narsa)."""
+    cols = _column_names(table)
+    if cols is None or column in cols:
+        return
+    db.session.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {coltype}"))
+
+
+@migration(1, "order jadvali -> orders")
+def _rename_order_table():
+    # PostgreSQL: `order` rezerv so'z
+    tables = set(inspect(db.engine).get_table_names())
+    if "order" in tables and "orders" not in tables:
+        db.session.execute(text('ALTER TABLE "order" RENAME TO orders'))
+
+
+@migration(2, "jadvallarni yaratish")
+def _create_tables():
+    db.create_all()
+
+
+@migration(3, "ko'p tilli va qo'shimcha ustunlar")
+def _legacy_columns():
+    for table, columns in (
+        ("category", (("name_ru", "VARCHAR(100)"), ("name_en", "VARCHAR(100)"), ("main_category_id", "INTEGER"))),
+        ("product", (
+            ("name_ru", "VARCHAR(200)"),
+            ("name_en", "VARCHAR(200)"),
+            ("description_ru", "TEXT"),
+            ("description_en", "TEXT"),
+            ("colors", "TEXT"),
+            ("price_som", "INTEGER"),
+            ("discount", "INTEGER DEFAULT 0"),
+            ("material_ru", "VARCHAR(100)"),
+            ("material_en", "VARCHAR(100)"),
+            ("material_uz", "VARCHAR(100)"),
+            ("warranty_uz", "VARCHAR(50)"),
+        )),
+        ("portfolio", (
+            ("title_ru", "VARCHAR(200)"),
+            ("title_en", "VARCHAR(200)"),
+            ("description_ru", "TEXT"),
+            ("description_en", "TEXT"),
+            ("room_type_uz", "VARCHAR(50)"),
+        )),
+        ("review", (("main_category_id", "INTEGER"), ("text_ru", "TEXT"), ("text_en", "TEXT"))),
+        ("brand", (
+            ("slug", "VARCHAR(120)"),
+            ("tagline_uz", "VARCHAR(500)"),
+            ("tagline_ru", "VARCHAR(500)"),
+            ("tagline_en", "VARCHAR(500)"),
+            ("description_uz", "TEXT"),
+            ("description_ru", "TEXT"),
+            ("description_en", "TEXT"),
+        )),
+    ):
+        for column, coltype in columns:
+            add_column(table, column, coltype)
+
+
+@migration(4, "portfolio.room_type -> room_type_uz")
+def _portfolio_room_type():
+    if "room_type" in (_column_names("portfolio") or []):
+        db.session.execute(text(
+            "UPDATE portfolio SET room_type_uz = room_type "
+            "WHERE (room_type_uz IS NULL OR room_type_uz = '') AND room_type IS NOT NULL"
+        ))
+
+
+@migration(5, "image_asset placeholder (rang + LQIP)")
+def _image_asset_placeholder():
+    add_column("image_asset", "dominant_color", "VARCHAR(7)")
+    add_column("image_asset", "lqip", "TEXT")
+
+
+def seed_default_services():
+    """Birinchi marta — standart 6 ta xizmat."""
+    if Service.query.first():
+        return
+    defaults = [
+        {
+            'title_uz': '3D Dizayn Xizmati', 'title_ru': '3D Дизайн', 'title_en': '3D Design',
+            'description_uz': 'Professional dizaynerlarimiz sizning uyingiz uchun fotorealistik 3D loyiha tayyorlaydi.',
+            'description_ru': 'Профессиональные дизайнеры создадут фотореалистичный 3D проект вашей мебели.',
+            'description_en': 'Professional designers will create a photorealistic 3D project of your furniture.',
+            'features_uz': "3D vizualizatsiya\nCheksiz tahrirlash\nMaterial va rang tanlash",
+            'features_ru': "3D визуализация\nБезлимитные правки\nВыбор материалов",
+            'features_en': "3D visualization\nUnlimited revisions\nMaterial selection",
+            'price_label_uz': 'BEPUL', 'price_label_ru': 'БЕСПЛАТНО', 'price_label_en': 'FREE',
+            'cta_text_uz': 'Buyurtma', 'cta_text_ru': 'Заказать', 'cta_text_en': 'Order',
+            'cta_url': '/contact', 'icon': 'design', 'icon_theme': 'dark', 'order': 1,
+        },
+        {
+            'title_uz': "O'lchov Xizmati", 'title_ru': 'Замер', 'title_en': 'Measurement',
+            'description_uz': "Mutaxassisimiz uyingizga kelib, lazer o'lchagich yordamida millimetrgacha aniq o'lchov oladi.",
+            'description_ru': 'Специалист приедет к вам домой и сделает точные замеры лазерным инструментом.',
+            'description_en': 'A specialist will come to your home and take precise measurements with a laser tool.',
+            'features_uz': "Uyga chiqish\nLazer o'lchov\nTexnik maslahat",
+            'features_ru': "Выезд на дом\nЛазерный замер\nКонсультация",
+            'features_en': "Home visit\nLaser measurement\nConsultation",
+            'price_label_uz': 'BEPUL', 'price_label_ru': 'БЕСПЛАТНО', 'price_label_en': 'FREE',
+            'cta_text_uz': 'Raqam qoldirish', 'cta_text_ru': 'Оставить номер', 'cta_text_en': 'Leave number',
+            'cta_url': '/contact', 'icon': 'measure', 'icon_theme': 'accent', 'order': 2,
+        },
+        {
+            'title_uz': 'Ishlab Chiqarish', 'title_ru': 'Производство', 'title_en': 'Production',
+            'description_uz': '5000 m² zamonaviy fabrikamizda CNC dastgohlarida yuqori aniqlikda ishlab chiqaramiz.',
+            'description_ru': 'Современная фабрика 5000 м² с CNC станками для высокоточного производства.',
+            'description_en': 'Modern 5000 m² factory with CNC machines for high-precision manufacturing.',
+            'features_uz': "CNC texnologiyasi\nImport materiallar\n7-21 kun muddat",
+            'features_ru': "CNC технология\nИмпортные материалы\n7-21 день",
+            'features_en': "CNC technology\nImport materials\n7-21 days",
+            'price_label_uz': "Loyihaga bog'liq", 'price_label_ru': 'Цена по проекту', 'price_label_en': 'Price by project',
+            'cta_text_uz': "Ko'rish", 'cta_text_ru': 'Смотреть', 'cta_text_en': 'View',
+            'cta_url': '/products', 'icon': 'production', 'icon_theme': 'dark', 'order': 3,
+        },
+        {
+            'title_uz': 'Yetkazib Berish', 'title_ru': 'Доставка', 'title_en': 'Delivery',
+            'description_uz': "O'z transportimiz orqali O'zbekiston bo'ylab xavfsiz qadoqlash bilan yetkazamiz.",
+            'description_ru': 'Собственный транспорт для безопасной доставки по всему Узбекистану.',
+            'description_en': 'Own transport for safe delivery throughout Uzbekistan.',
+            'features_uz': "Toshkent - BEPUL\nViloyatlarga yetkazish\nXavfsiz qadoqlash",
+            'features_ru': "Ташкент - бесплатно\nДоставка в регионы\nБезопасная упаковка",
+            'features_en': "Tashkent - free\nRegional delivery\nSafe packaging",
+            'price_label_uz': 'BEPUL*', 'price_label_ru': 'БЕСПЛАТНО*', 'price_label_en': 'FREE*',
+            'price_note_uz': "*Toshkent bo'ylab", 'price_note_ru': '*По Ташкенту', 'price_note_en': '*In Tashkent',
+            'cta_url': '/contact', 'icon': 'delivery', 'icon_theme': 'accent', 'order': 4,
+        },
+        {
+            'title_uz': "O'rnatish Xizmati", 'title_ru': 'Установка', 'title_en': 'Installation',
+            'description_uz': "Tajribali ustalarimiz mebelni professional tarzda o'rnatib, sozlab berishadi.",
+            'description_ru': 'Опытные мастера профессионально установят и настроят вашу мебель.',
+            'description_en': 'Experienced craftsmen will professionally install and adjust your furniture.',
+            'features_uz': "Professional o'rnatish\nChiqindilarni olib ketish\nSozlash va tekshirish",
+            'features_ru': "Профессиональная установка\nВывоз мусора\nНастройка",
+            'features_en': "Professional installation\nWaste removal\nAdjustment",
+            'price_label_uz': "Ko'pincha bepul", 'price_label_ru': 'Часто бесплатно', 'price_label_en': 'Often free',
+            'cta_text_uz': "So'rash", 'cta_text_ru': 'Спросить', 'cta_text_en': 'Ask',
+            'cta_url': '/contact', 'icon': 'installation', 'icon_theme': 'dark', 'order': 5,
+        },
+        {
+            'title_uz': 'Kafolat Xizmati', 'title_ru': 'Гарантия', 'title_en': 'Warranty',
+            'description_uz': "25 yilgacha kafolat. Muammo bo'lsa bepul ta'mirlaymiz yoki almashtiramiz.",
+            'description_ru': 'До 25 лет гарантии. При проблемах бесплатно отремонтируем или заменим.',
+            'description_en': "Up to 25 years warranty. We'll repair or replace for free if there are issues.",
+            'features_uz': "25 yil kafolat\nBepul ta'mirlash\n24/7 qo'llab-quvvatlash",
+            'features_ru': "25 лет гарантии\nБесплатный ремонт\n24/7 поддержка",
+            'features_en': "25 year warranty\nFree repair\n24/7 support",
+            'price_label_uz': '25 YIL', 'price_label_ru': '25 ЛЕТ', 'price_label_en': '25 YEARS',
+            'price_note_uz': 'maksimal kafolat', 'price_note_ru': 'максимум', 'price_note_en': 'maximum',
+            'cta_url': '/contact', 'icon': 'warranty', 'icon_theme': 'accent', 'order': 6,
+        },
+    ]
+    for d in defaults:
+        db.session.add(Service(**d, is_active=True))
+    db.session.commit()
+    print('Created default services')
+
+
+@migration(6, "standart xizmatlar")
+def _seed_services_migration():
+    seed_default_services()
+
+
+@migration(7, "brend sluglari")
+def _brand_slugs_migration():
+    for b in Brand.query.order_by(Brand.id).all():
+        if not getattr(b, "slug", None) or not str(b.slug).strip():
+            base = slugify_brand_slug(b.name_uz or b.name or f"brend-{b.id}")
+            b.slug = unique_brand_slug(base, exclude_brand_id=b.id)
+
+
+def schema_version() -> Optional[int]:
+    """Bazadagi oxirgi qo'llangan migratsiya (jurnal yo'q bo'lsa None)."""
+    try:
+        return db.session.execute(text("SELECT MAX(version) FROM schema_migration")).scalar() or 0
+    except Exception:
+        return None
+    finally:
+        db.session.rollback()
+
+
+def schema_status() -> Tuple[Optional[int], int]:
+    return schema_version(), latest_version()
+
+
+def migrate(app: "Flask", log: Callable[[str], None] = print) -> List[Migration]:
+    """Qo'llanmagan migratsiyalarni tartib bilan qo'llaydi (app context ichida). Qo'llanganlarini qaytaradi."""
+    applied: List[Migration] = []
+    # Bir vaqtda faqat bitta jarayon; qolganlari kutadi (keyin jurnalda hammasi qo'llangan bo'ladi)
+    with worker_lock(app, MIGRATION_LOCK_ID, "migrate", blocking=True):
+        SchemaMigration.__table__.create(db.engine, checkfirst=True)
+        # Lock kutilayotganda boshqa jarayon qo'llagan bo'lishi mumkin — ro'yxat lock ichida o'qiladi
+        done = {version for (version,) in db.session.query(SchemaMigration.version)}
+        for version in sorted(MIGRATIONS):
+            if version in done:
+                continue
+            step = MIGRATIONS[version]
+            try:
+                step.func()
+                db.session.add(SchemaMigration(version=step.version, name=step.name))
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                log(f"Migratsiya {step.version} ({step.name}) xatolik bilan to'xtadi")
+                raise
+            log(f"Migratsiya {step.version}: {step.name}")
+            applied.append(step)
+    return applied
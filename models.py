@@ -1,3 +1,5 @@
+import re
+
 from db import db
 from flask_login import UserMixin
 from datetime import datetime
@@ -399,6 +401,31 @@ class Brand(db.Model):
         return self.description_uz or ''
 
 
+def slugify_brand_slug(text: str) -> str:
+    """URL uchun xavfsiz slug (brend nomidan)."""
+    if not (text or "").strip():
+        return "brend"
+    s = text.strip().lower()
+    s = re.sub(r"[^\w\s-]", "", s, flags=re.UNICODE)
+    s = re.sub(r"[-\s]+", "-", s).strip("-")
+    return (s[:100] or "brend").lower()
+
+
+def unique_brand_slug(base: str, exclude_brand_id=None) -> str:
+    """Brend jadvalida noyob slug."""
+    slug = base or "brend"
+    original = slug
+    n = 2
+    while True:
+        q = Brand.query.filter_by(slug=slug)
+        if exclude_brand_id is not None:
+            q = q.filter(Brand.id != exclude_brand_id)
+        if q.first() is None:
+            return slug
+        slug = f"{original}-{n}"
+        n += 1
+
+
 class Service(db.Model):
     """Bizning xizmatlar — /services sahifasi kartochkalari"""
     id = db.Column(db.Integer, primary_key=True)
@@ -509,4 +536,97 @@ class FirstVisit(db.Model):
     name = db.Column(db.String(200))
     phone = db.Column(db.String(20), nullable=False)
     interest = db.Column(db.String(50))  # clinic, restaurant, home
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class TranslationMemory(db.Model):
+    """Avtomatik tarjimalar xotirasi — bir xil matn tashqi xizmatga qayta yuborilmaydi."""
+    __table_args__ = (
+        db.UniqueConstraint('source_hash', 'source_lang', 'target_lang', name='uq_translation_memory_key'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    source_hash = db.Column(db.String(64), nullable=False)  # sha256(source_text)
+    source_lang = db.Column(db.String(5), nullable=False)
+    target_lang = db.Column(db.String(5), nullable=False)
+    source_text = db.Column(db.Text, nullable=False)
+    translated_text = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class NotificationOutbox(db.Model):
+    """Yuborilishi kerak bo'lgan xabarnomalar — buyurtma bilan bitta tranzaksiyada yoziladi."""
+    __tablename__ = 'notification_outbox'
+    __table_args__ = (
+        db.Index('ix_notification_outbox_due', 'status', 'next_attempt_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    channel = db.Column(db.String(20), nullable=False, default='telegram')
+    kind = db.Column(db.String(30), nullable=False, default='general')  # order, contact, custom_order, first_visit
+    message = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    claim_token = db.Column(db.String(32))  # qaysi worker olgan
+    locked_until = db.Column(db.DateTime)  # claim muddati (worker o'lsa qayta olinadi)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+
+class ImageAsset(db.Model):
+    """Yuklangan rasm haqida: o'lchamlari va tayyorlangan kichik variantlari (srcset uchun)."""
+    __tablename__ = 'image_asset'
+
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(500), unique=True, nullable=False)  # products/abc_stul.jpg
+    width = db.Column(db.Integer)
+    height = db.Column(db.Integer)
+    variants = db.Column(db.Text)  # JSON: [{"width": 320, "format": "webp", "key": "..."}]
+    dominant_color = db.Column(db.String(7))  # #a0b1c2
+    lqip = db.Column(db.Text)  # ~16px WebP data: URI (shaffof rasmlar uchun yo'q)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def get_variants(self):
+        import json
+        try:
+            return json.loads(self.variants) if self.variants else []
+        except (TypeError, ValueError):
+            return []
+
+
+class UploadObject(db.Model):
+    """Kontent xeshi bo'yicha saqlangan fayl va undan foydalanayotgan yozuvlar soni."""
+    __tablename__ = 'upload_object'
+
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(500), unique=True, nullable=False)  # products/<sha256[:32]>.jpg
+    size = db.Column(db.Integer)
+    content_type = db.Column(db.String(100))
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class ChunkedUpload(db.Model):
+    """Bo'laklab (davom ettirsa bo'ladigan) yuklash sessiyasi — admin katta rasmlari uchun."""
+    __tablename__ = 'chunked_upload'
+
+    id = db.Column(db.String(32), primary_key=True)  # upload ID (uuid4 hex)
+    folder = db.Column(db.String(50), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    content_type = db.Column(db.String(100))
+    size = db.Column(db.BigInteger, nullable=False)
+    received = db.Column(db.BigInteger, nullable=False, default=0)
+    status = db.Column(db.String(20), nullable=False, default='uploading')  # uploading, complete, used
+    key = db.Column(db.String(500))  # tayyor fayl kaliti (complete bo'lgach)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class SchemaMigration(db.Model):
+    """Qo'llangan migratsiyalar jurnali (migrations.py dagi raqamlar)."""
+    __tablename__ = 'schema_migration'
+
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    name = db.Column(db.String(200), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
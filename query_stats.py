@@ -0,0 +1,258 @@
+"""
+SQL so'rovlar statistikasi (cursor hodisalari orqali).
+``QUERY_DEBUG=1`` (debug/staging): har HTTP so'rov uchun SQL soni va DB vaqti yig'iladi; bir xil
+shakldagi (literallarsiz) so'rov ``QUERY_N1_THRESHOLD`` va undan ko'p marta takrorlansa — N+1
+(masalan, shablonda ``product.category`` lazy load). Natija javob sarlavhalarida
+(X-DB-Queries, X-DB-Time-Ms, X-DB-N-Plus-One) va /admin/query-stats da — eng yomon endpointlar
+(har worker o'zinikini ko'rsatadi).
+
+Sekin so'rovlar jurnali doim yoqiq (``SLOW_QUERY_MS`` dan uzoq, 0 — o'chiq): shakl bo'yicha
+yig'indi (soni, vaqt, endpoint, qatorlar) xotirada, eng og'ir ``SLOW_QUERY_TOP`` tasi saqlanadi.
+Ko'rish: /admin/slow-queries (EXPLAIN bilan) yoki /metrics/slow-queries.
+"""
+from __future__ import annotations
+
+import hashlib
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from functools import lru_cache
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+if TYPE_CHECKING:
+    from flask import Flask, Response
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_PARAM_RE = re.compile(r"%\(\w+\)s|%s")
+_NUMBER_RE = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_VALUES_RE = re.compile(r"\bVALUES\s*(\(\s*\?(?:\s*,\s*\?)*\s*\))(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))+", re.IGNORECASE)
+_SPACE_RE = re.compile(r"\s+")
+
+SAMPLE_LENGTH = 300
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(statement: str) -> str:
+    """So'rov shakli: literallar va parametrlar ``?``, IN (...) ro'yxatlari bitta ``?`` ga."""
+    text = _STRING_RE.sub("?", statement)
+    text = _PARAM_RE.sub("?", text)
+    text = _NUMBER_RE.sub("?", text)
+    text = _IN_LIST_RE.sub("IN (?)", text)
+    text = _VALUES_RE.sub(r"VALUES \1", text)
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+class RequestQueries:
+    """Bitta HTTP so'rov davomidagi SQL lar."""
+
+    __slots__ = ("count", "seconds", "shapes")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes: Counter = Counter()
+
+    def add(self, shape: str, seconds: float) -> None:
+        self.count += 1
+        self.seconds += seconds
+        self.shapes[shape] += 1
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+
+class EndpointStats:
+    """Endpoint bo'yicha yig'indi (jarayon ichida, thread-safe)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints: dict = {}
+
+    def record(self, endpoint: str, queries: RequestQueries, repeated: List[Tuple[str, int]]) -> None:
+        with self._lock:
+            row = self._endpoints.get(endpoint)
+            if row is None:
+                row = self._endpoints[endpoint] = {
+                    "endpoint": endpoint, "requests": 0, "queries": 0, "queries_max": 0,
+                    "db_seconds": 0.0, "db_seconds_max": 0.0, "n_plus_one": 0, "worst_shape": None, "worst_count": 0,
+                }
+            row["requests"] += 1
+            row["queries"] += queries.count
+            row["queries_max"] = max(row["queries_max"], queries.count)
+            row["db_seconds"] += queries.seconds
+            row["db_seconds_max"] = max(row["db_seconds_max"], queries.seconds)
+            if repeated:
+                row["n_plus_one"] += 1
+                shape, count = repeated[0]
+                if count > row["worst_count"]:
+                    row["worst_shape"], row["worst_count"] = shape[:SAMPLE_LENGTH], count
+
+    def top(self, limit: int = 50) -> List[dict]:
+        with self._lock:
+            rows = [dict(row) for row in self._endpoints.values()]
+        for row in rows:
+            row["queries_avg"] = round(row["queries"] / row["requests"], 1)
+            row["db_ms_avg"] = round(1000 * row["db_seconds"] / row["requests"], 1)
+            row["db_ms_max"] = round(1000 * row["db_seconds_max"], 1)
+        # Avval N+1 lar, keyin o'rtacha so'rovlar soni bo'yicha
+        rows.sort(key=lambda row: (row["n_plus_one"] > 0, row["queries_avg"], row["db_ms_avg"]), reverse=True)
+        return rows[:limit]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._endpoints.clear()
+
+
+endpoint_stats = EndpointStats()
+
+
+class SlowQueryLog:
+    """Sekin so'rovlar shakl bo'yicha (jarayon ichida). ``threshold`` — soniya, 0 — o'chiq."""
+
+    def __init__(self):
+        self.threshold = 0.0
+        self.keep = 100
+        self._lock = threading.Lock()
+        self._shapes: dict = {}
+
+    def record(self, statement: str, parameters, seconds: float, rows: Optional[int], executemany: bool) -> None:
+        shape = fingerprint(statement)
+        if has_request_context():
+            source = request.endpoint or request.path
+        else:
+            source = f"thread:{threading.current_thread().name}"
+        print(f"Sekin SQL {seconds * 1000:.0f} ms [{source}]{f' qatorlar={rows}' if rows is not None else ''}: {shape[:SAMPLE_LENGTH]}")
+        with self._lock:
+            entry = self._shapes.get(shape)
+            if entry is None:
+                entry = self._shapes[shape] = {
+                    "id": hashlib.md5(shape.encode()).hexdigest()[:12], "shape": shape, "count": 0,
+                    "seconds": 0.0, "seconds_max": 0.0, "rows_max": None, "sources": Counter(),
+                    "sample": None, "parameters": None, "explain": None, "last_seen": None,
+                }
+            entry["count"] += 1
+            entry["seconds"] += seconds
+            entry["sources"][source] += 1
+            entry["last_seen"] = datetime.utcnow()
+            if rows is not None:
+                entry["rows_max"] = max(entry["rows_max"] or 0, rows)
+            if seconds >= entry["seconds_max"]:
+                # Eng sekin namunasi — EXPLAIN uchun (executemany — yo'q)
+                entry["seconds_max"] = seconds
+                entry["sample"], entry["parameters"] = (None, None) if executemany else (statement, parameters)
+            if len(self._shapes) > 2 * self.keep:
+                self._prune()
+
+    def _prune(self) -> None:
+        ranked = sorted(self._shapes.values(), key=lambda e: e["seconds"], reverse=True)
+        self._shapes = {e["shape"]: e for e in ranked[:self.keep]}
+
+    def top(self, limit: int = 50) -> List[dict]:
+        with self._lock:
+            entries = sorted(self._shapes.values(), key=lambda e: e["seconds"], reverse=True)[:limit]
+            rows = []
+            for e in entries:
+                rows.append({
+                    "id": e["id"], "shape": e["shape"], "count": e["count"], "rows_max": e["rows_max"],
+                    "ms_total": round(1000 * e["seconds"], 1),
+                    "ms_avg": round(1000 * e["seconds"] / e["count"], 1),
+                    "ms_max": round(1000 * e["seconds_max"], 1),
+                    "sources": e["sources"].most_common(3),
+                    "explainable": e["sample"] is not None, "explain": e["explain"],
+                    "last_seen": e["last_seen"].isoformat(timespec="seconds") + "Z",
+                })
+        return rows
+
+    def get(self, entry_id: str) -> Optional[dict]:
+        with self._lock:
+            return next((e for e in self._shapes.values() if e["id"] == entry_id), None)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._shapes.clear()
+
+
+slow_queries = SlowQueryLog()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start")
+    if not starts:
+        return
+    seconds = time.perf_counter() - starts.pop()
+    if has_request_context():
+        queries: Optional[RequestQueries] = g.get("_query_log")
+        if queries is not None:
+            queries.add(fingerprint(statement), seconds)
+    if slow_queries.threshold and seconds >= slow_queries.threshold:
+        rows = cursor.rowcount if cursor is not None and cursor.rowcount >= 0 else None
+        slow_queries.record(statement, parameters, seconds, rows, executemany)
+
+
+def _handle_error(context):
+    # Xato bilan tugagan so'rovning boshlanish vaqti stekda qolmasin
+    conn = context.connection
+    starts = conn.info.get("query_start") if conn is not None else None
+    if starts:
+        starts.pop()
+
+
+def install_query_hooks(app: "Flask") -> None:
+    """Barcha engine larga vaqt o'lchash hodisalarini ulaydi (QUERY_DEBUG yoki sekin so'rovlar jurnali)."""
+    from db import db
+
+    slow_queries.threshold = float(app.config.get("SLOW_QUERY_MS", 0)) / 1000
+    slow_queries.keep = int(app.config.get("SLOW_QUERY_TOP", 100))
+    if not app.config.get("QUERY_DEBUG") and not slow_queries.threshold:
+        return
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+            event.listen(engine, "handle_error", _handle_error)
+
+
+def begin_request_queries() -> None:
+    g._query_log = RequestQueries()
+
+
+def finish_request_queries(app: "Flask", response: "Response") -> "Response":
+    """Sarlavhalar, N+1 ogohlantirishi va endpoint statistikasi."""
+    queries: Optional[RequestQueries] = g.pop("_query_log", None)
+    if queries is None:
+        return response
+    repeated = queries.repeated(int(app.config.get("QUERY_N1_THRESHOLD", 5)))
+    response.headers["X-DB-Queries"] = str(queries.count)
+    response.headers["X-DB-Time-Ms"] = f"{queries.seconds * 1000:.1f}"
+    if repeated:
+        response.headers["X-DB-N-Plus-One"] = str(len(repeated))
+        shape, count = repeated[0]
+        print(f"N+1: {request.method} {request.path} — {count} marta: {shape[:SAMPLE_LENGTH]}")
+    endpoint_stats.record(request.endpoint or request.path, queries, repeated)
+    return response
+
+
+def explain(entry: dict) -> str:
+    """Eng sekin namunaning rejasi (faqat SELECT; EXPLAIN ANALYZE emas — so'rov bajarilmaydi)."""
+    from db import READ_BIND, db
+
+    statement, parameters = entry.get("sample"), entry.get("parameters")
+    if not statement or not statement.lstrip().upper().startswith(("SELECT", "WITH")):
+        return "EXPLAIN faqat SELECT so'rovlari uchun"
+    engine = db.engines.get(READ_BIND) or db.engine
+    prefix = "EXPLAIN QUERY PLAN " if engine.dialect.name == "sqlite" else "EXPLAIN "
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(prefix + statement, parameters or ()).fetchall()
+    plan = "\n".join(" | ".join(str(col) for col in row) for row in rows)
+    entry["explain"] = plan
+    return plan
@@ -0,0 +1,81 @@
+"""
+Ishga tushish vaqtini o'lchash (Render cold start).
+``STARTUP_PROFILE=1`` bo'lsa app.py bosqichlari (importlar, config, DB ulanish, migratsiyalar,
+route lar, shablonlar) vaqti yoziladi va import oxirida hisobot chiqariladi. O'chiq bo'lsa
+deyarli hech narsa qilmaydi. Modullar bo'yicha batafsil: ``python -X importtime -c "import app"``.
+"""
+from __future__ import annotations
+
+import os
+import sys
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from flask import Flask
+
+
+class StartupProfiler:
+    """Bosqichlar: ``mark(name)`` — oldingi belgidan beri o'tgan vaqt, ``phase(name)`` — blok vaqti."""
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.started = time.perf_counter()
+        self._last = self.started
+        self._phases: List[Tuple[str, float]] = []
+        self._modules_before = set(sys.modules) if enabled else set()
+
+    def mark(self, name: str) -> None:
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self._phases.append((name, now - self._last))
+        self._last = now
+
+    @contextmanager
+    def phase(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        self.mark("(boshqa)")  # oldingi belgidan beri hisoblanmagan vaqt
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            self._phases.append((name, now - start))
+            self._last = now
+
+    def load_templates(self, app: "Flask") -> None:
+        """Barcha shablonlarni kompilyatsiya qiladi (odatda birinchi so'rovda bo'ladi)."""
+        if not self.enabled:
+            return
+        with self.phase("shablonlar"):
+            env = app.jinja_env
+            for name in env.list_templates(extensions=("html",)):
+                try:
+                    env.get_template(name)
+                except Exception as e:
+                    print(f"Shablon {name}: {e}")
+
+    def report(self, app: Optional["Flask"] = None) -> None:
+        if not self.enabled:
+            return
+        if app is not None:
+            self.load_templates(app)
+        total = time.perf_counter() - self.started
+        phases = [(name, seconds) for name, seconds in self._phases if seconds >= 0.0005]
+        print(f"=== Ishga tushish profili (pid {os.getpid()}): {total * 1000:.0f} ms ===")
+        for name, seconds in phases:
+            share = 100 * seconds / total if total else 0
+            print(f"  {name:<28} {seconds * 1000:8.1f} ms  {share:5.1f}%")
+        loaded = len(set(sys.modules) - self._modules_before)
+        print(f"  yangi yuklangan modullar: {loaded} (batafsil: python -X importtime -c \"import app\")")
+
+
+def _enabled() -> bool:
+    return os.environ.get("STARTUP_PROFILE", "").strip().lower() in ("1", "true", "yes")
+
+
+startup_profiler = StartupProfiler(_enabled())
@@ -3,13 +3,29 @@ Fayl yuklash: mahalliy disk yoki Supabase Storage (S3-ga o'xshash bucket).
 """
 from __future__ import annotations
 
+import hashlib
 import os
-from typing import TYPE_CHECKING
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from typing import IO, TYPE_CHECKING, Iterator, List, Optional, Tuple, Union
+from urllib.parse import quote
+
+from db import db
+from models import UploadObject
 
 if TYPE_CHECKING:
     from flask import Flask
     from werkzeug.datastructures import FileStorage
 
+CONTENT_HASH_LENGTH = 32
+HASH_CHUNK_SIZE = 1024 * 1024
+# <xesh>.jpg yoki variant: <xesh>.w640.webp
+CONTENT_KEY_RE = re.compile(r"^[0-9a-f]{32}(\.w\d+)?\.[a-z0-9]+$")
+# Kontent kaliti hech qachon o'zgarmaydi — bucketda ham uzoq keshlanadi
+IMMUTABLE_CACHE_CONTROL = "max-age=31536000"
+
 
 def _normalize_key(relative_path: str) -> str:
     return relative_path.replace("\\", "/").lstrip("/")
@@ -30,21 +46,73 @@ def public_storage_url(app: "Flask", relative_path: str) -> str:
     return f"/uploads/{key}"
 
 
-def save_uploaded_file(app: "Flask", file_storage: "FileStorage", relative_path: str) -> None:
-    """Werkzeug FileStorage ni disk yoki Supabase ga yozadi."""
-    key = _normalize_key(relative_path)
+def content_key(folder: str, file_storage: "FileStorage") -> str:
+    """
+    Kontentga bog'liq kalit: ``<folder>/<sha256[:32]>.<ext>``. Bir xil fayl doim bitta
+    obyektga tushadi; kalitning o'zi nazorat summasi (o'zgarmas — uzoq keshlash mumkin).
+    """
+    stream = file_storage.stream
+    stream.seek(0)
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(HASH_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    stream.seek(0)
+    ext = os.path.splitext(file_storage.filename or "")[1].lower().lstrip(".")
+    if not re.fullmatch(r"[a-z0-9]{1,8}", ext):
+        ext = "bin"
+    return f"{_normalize_key(folder).rstrip('/')}/{digest.hexdigest()[:CONTENT_HASH_LENGTH]}.{ext}"
 
-    if app.config.get("USE_SUPABASE_STORAGE"):
-        data = file_storage.read()
-        content_type = file_storage.mimetype or "application/octet-stream"
-        supabase = _get_supabase(app)
-        bucket = app.config["SUPABASE_STORAGE_BUCKET"]
-        supabase.storage.from_(bucket).upload(
-            key,
-            data,
-            file_options={"content-type": content_type, "upsert": "true"},
+
+def is_content_key(key: str) -> bool:
+    """Kontent xeshi bo'yicha kalit (yoki uning o'lchamli varianti)mi."""
+    return bool(CONTENT_KEY_RE.match(os.path.basename(key or "")))
+
+
+def _stream_size(stream) -> int:
+    position = stream.tell()
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(position)
+    return size
+
+
+def _find_upload_object(key: str) -> Optional[UploadObject]:
+    # Shu so'rovda qo'shilgan (hali flush qilinmagan) yozuvlar ham hisobga olinadi
+    for obj in db.session.new:
+        if isinstance(obj, UploadObject) and obj.key == key:
+            return obj
+    with db.session.no_autoflush:
+        return UploadObject.query.filter_by(key=key).first()
+
+
+def _add_reference(key: str, file_storage: "FileStorage") -> UploadObject:
+    """UploadObject.ref_count ni oshiradi (commit chaqiruvchida — asosiy yozuv bilan birga)."""
+    obj = _find_upload_object(key)
+    if obj is None:
+        obj = UploadObject(
+            key=key,
+            size=_stream_size(file_storage.stream),
+            content_type=file_storage.mimetype or "application/octet-stream",
+            ref_count=0,
         )
-        return
+        db.session.add(obj)
+    obj.ref_count = (obj.ref_count or 0) + 1
+    return obj
+
+
+def _already_stored(key: str) -> bool:
+    return is_content_key(key) and _find_upload_object(key) is not None
+
+
+def _write_uploaded_file(app: "Flask", file_storage: "FileStorage", key: str):
+    """Faylni yozadi; variantlar uchun manba (oqim yoki to'liq yo'l) qaytaradi."""
+    if app.config.get("USE_SUPABASE_STORAGE"):
+        # Spooled temp fayldan bo'laklab yuboriladi — butun fayl xotiraga o'qilmaydi
+        stream = file_storage.stream
+        stream.seek(0)
+        _upload_object(app, key, stream, file_storage.mimetype or "application/octet-stream")
+        stream.seek(0)
+        return stream
 
     full = os.path.join(app.config["UPLOAD_FOLDER"], key)
     os.makedirs(os.path.dirname(full), exist_ok=True)
@@ -56,36 +124,298 @@ def save_uploaded_file(app: "Flask", file_storage: "FileStorage", relative_path:
         except Exception:
             pass
     file_storage.save(full)
+    return full
+
+
+def save_uploaded_file(app: "Flask", file_storage: "FileStorage", relative_path: str) -> None:
+    """
+    Werkzeug FileStorage ni disk yoki Supabase ga yozadi. Kontent kaliti (``content_key``)
+    allaqachon saqlangan bo'lsa qayta yuklanmaydi — faqat havolalar soni oshadi.
+    """
+    key = _normalize_key(relative_path)
+    if not _already_stored(key):
+        source = _write_uploaded_file(app, file_storage, key)
+        _after_save(app, key, source)
+    if is_content_key(key):
+        _add_reference(key, file_storage)
+
+
+def _after_save(app: "Flask", key: str, source) -> None:
+    """Rasm bo'lsa — o'lchamli/WebP variantlarini tayyorlash (xato yuklashni buzmaydi)."""
+    from image_utils import generate_variants, is_variant_source
+
+    if is_variant_source(key):
+        generate_variants(app, key, source)
+
+
+_upload_executor = None
+_upload_executor_pid = None
+_upload_executor_lock = threading.Lock()
+
+
+def _get_upload_executor(app: "Flask") -> ThreadPoolExecutor:
+    global _upload_executor, _upload_executor_pid
+    with _upload_executor_lock:
+        if _upload_executor is None or _upload_executor_pid != os.getpid():
+            _upload_executor = ThreadPoolExecutor(
+                max_workers=max(1, int(app.config.get("UPLOAD_CONCURRENCY", 4))),
+                thread_name_prefix="upload",
+            )
+            _upload_executor_pid = os.getpid()
+        return _upload_executor
+
+
+def _save_in_batch(app: "Flask", file_storage: "FileStorage", key: str):
+    """Fon thread: fayl + variant fayllari; ImageAsset yozuvi asosiy thread da qilinadi."""
+    from image_utils import is_variant_source, prepare_variants
+
+    source = _write_uploaded_file(app, file_storage, key)
+    return prepare_variants(app, key, source) if is_variant_source(key) else None
+
+
+def save_uploaded_files(app: "Flask", items: List[Tuple["FileStorage", str]]) -> List[str]:
+    """
+    Bir nechta faylni parallel yuklaydi (cheklangan thread pool). Hammasi saqlansa kalitlar
+    ro'yxati qaytadi; birortasi xato bo'lsa shu partiyada yozilganlari (variantlari bilan)
+    o'chiriladi va birinchi xato qayta ko'tariladi.
+    """
+    from image_utils import record_variants
+
+    keys = [_normalize_key(path) for _, path in items]
+    # Bir xil fayl (masalan, rang va asosiy rasm) bir marta yoziladi; saqlanganlari umuman yozilmaydi
+    pending = {}
+    for (file_storage, _), key in zip(items, keys):
+        if key not in pending and not _already_stored(key):
+            pending[key] = file_storage
+
+    if len(pending) <= 1:
+        for key, file_storage in pending.items():
+            _after_save(app, key, _write_uploaded_file(app, file_storage, key))
+    else:
+        executor = _get_upload_executor(app)
+        futures = {key: executor.submit(_save_in_batch, app, file_storage, key) for key, file_storage in pending.items()}
+        wait(futures.values())
+
+        error = next((f.exception() for f in futures.values() if f.exception() is not None), None)
+        if error is not None:
+            for key, future in futures.items():
+                if future.exception() is not None:
+                    continue
+                prepared = future.result()
+                for variant in (prepared[1] if prepared else []):
+                    delete_uploaded_file(app, variant["key"])
+                delete_uploaded_file(app, key)
+            raise error
+
+        for key, future in futures.items():
+            prepared = future.result()
+            if prepared is not None:
+                try:
+                    record_variants(key, *prepared)
+                except Exception as e:
+                    print(f"Rasm variantlari xatolik ({key}): {e}")
+
+    for (file_storage, _), key in zip(items, keys):
+        if is_content_key(key):
+            _add_reference(key, file_storage)
+    return keys
+
+
+def release_uploaded_file(app: "Flask", relative_path: str) -> None:
+    """
+    Yozuv faylni ishlatmay qo'ydi: havolalar soni kamayadi (commit chaqiruvchida).
+    Faylning o'zini keyin GC o'chiradi (``upload_gc``) — commit bo'lmasa ham fayl yo'qolmaydi.
+    """
+    if not relative_path or relative_path.startswith(("http://", "https://")):
+        return
+    obj = _find_upload_object(_normalize_key(relative_path))
+    if obj is not None:
+        obj.ref_count = max(0, (obj.ref_count or 0) - 1)
+
+
+def save_file_bytes(app: "Flask", relative_path: str, data: bytes, content_type: str) -> None:
+    """Tayyor baytlarni (masalan, rasm varianti) disk yoki Supabase ga yozadi."""
+    key = _normalize_key(relative_path)
+
+    if app.config.get("USE_SUPABASE_STORAGE"):
+        _upload_object(app, key, data, content_type)
+        return
+
+    full = os.path.join(app.config["UPLOAD_FOLDER"], key)
+    os.makedirs(os.path.dirname(full), exist_ok=True)
+    with open(full, "wb") as f:
+        f.write(data)
+
+
+def read_uploaded_file(app: "Flask", relative_path: str) -> bytes:
+    """Fayl mazmuni (backfill va qayta ishlash uchun)."""
+    key = _normalize_key(relative_path)
+
+    if app.config.get("USE_SUPABASE_STORAGE"):
+        supabase = _get_supabase(app)
+        return supabase.storage.from_(app.config["SUPABASE_STORAGE_BUCKET"]).download(key)
+
+    with open(os.path.join(app.config["UPLOAD_FOLDER"], key), "rb") as f:
+        return f.read()
+
+
+def _parse_storage_time(value) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def list_uploaded_objects(app: "Flask", prefix: str = "") -> Iterator[Tuple[str, Optional[datetime]]]:
+    """(kalit, oxirgi o'zgarish vaqti UTC) juftlarini birma-bir qaytaradi (butun ro'yxat xotiraga yig'ilmaydi)."""
+    prefix = _normalize_key(prefix).rstrip("/")
+
+    if app.config.get("USE_SUPABASE_STORAGE"):
+        storage = _get_supabase(app).storage.from_(app.config["SUPABASE_STORAGE_BUCKET"])
+        folders = [prefix]
+        while folders:
+            folder = folders.pop()
+            offset = 0
+            while True:
+                entries = storage.list(folder, {"limit": 1000, "offset": offset}) or []
+                for entry in entries:
+                    name = f"{folder}/{entry['name']}" if folder else entry["name"]
+                    if entry.get("id") is None:
+                        folders.append(name)  # papka
+                    else:
+                        yield name, _parse_storage_time(entry.get("updated_at") or entry.get("created_at"))
+                if len(entries) < 1000:
+                    break
+                offset += len(entries)
+        return
+
+    root = os.path.join(app.config["UPLOAD_FOLDER"], prefix)
+    base = app.config["UPLOAD_FOLDER"]
+    for dirpath, _dirnames, filenames in os.walk(root):
+        for filename in filenames:
+            full = os.path.join(dirpath, filename)
+            try:
+                modified = datetime.utcfromtimestamp(os.path.getmtime(full))
+            except OSError:
+                continue
+            yield _normalize_key(os.path.relpath(full, base)), modified
+
+
+def list_uploaded_files(app: "Flask", prefix: str = "") -> Iterator[str]:
+    """Saqlangan fayl kalitlarini birma-bir qaytaradi (butun ro'yxat xotiraga yig'ilmaydi)."""
+    for key, _modified in list_uploaded_objects(app, prefix):
+        yield key
 
 
 def delete_uploaded_file(app: "Flask", relative_path: str) -> None:
     """Faylni disk yoki bucketdan o'chiradi."""
     if not relative_path:
         return
-    key = _normalize_key(relative_path)
+    delete_uploaded_files(app, [relative_path])
+
+
+def delete_uploaded_files(app: "Flask", relative_paths: List[str]) -> None:
+    """Bir nechta faylni o'chiradi (Supabase da bitta so'rov bilan)."""
+    keys = [_normalize_key(path) for path in relative_paths if path]
+    if not keys:
+        return
 
     if app.config.get("USE_SUPABASE_STORAGE"):
         try:
             supabase = _get_supabase(app)
             bucket = app.config["SUPABASE_STORAGE_BUCKET"]
-            supabase.storage.from_(bucket).remove([key])
+            supabase.storage.from_(bucket).remove(keys)
         except Exception:
             pass
         return
 
-    full = os.path.join(app.config["UPLOAD_FOLDER"], key)
-    try:
-        if os.path.isfile(full):
-            os.remove(full)
-    except OSError:
-        pass
+    for key in keys:
+        full = os.path.join(app.config["UPLOAD_FOLDER"], key)
+        try:
+            if os.path.isfile(full):
+                os.remove(full)
+        except OSError:
+            pass
+
+
+_client_lock = threading.Lock()
+_supabase_client = None
+_http_session = None
+_client_pid = None
+
+
+def _reset_clients_after_fork() -> None:
+    # Ota jarayondan meros ulanishlar (TLS soketlar) bolada ishlatilmaydi
+    global _supabase_client, _http_session, _client_pid
+    if _client_pid != os.getpid():
+        _supabase_client = None
+        _http_session = None
+        _client_pid = os.getpid()
 
 
 def _get_supabase(app: "Flask"):
-    from supabase import create_client
+    """Jarayon bo'yicha bitta Supabase klienti (birinchi chaqiruvda yaratiladi)."""
+    global _supabase_client
+    client = _supabase_client
+    if client is not None and _client_pid == os.getpid():
+        return client
+    with _client_lock:
+        _reset_clients_after_fork()
+        if _supabase_client is None:
+            from supabase import create_client
+
+            url = app.config["SUPABASE_URL"]
+            key = app.config["SUPABASE_KEY"]
+            if not url or not key:
+                raise RuntimeError("SUPABASE_URL va SUPABASE_KEY sozlanmagan")
+            _supabase_client = create_client(url, key)
+        return _supabase_client
+
+
+def _get_http_session():
+    """Storage REST API uchun umumiy requests.Session (keep-alive, thread-safe pool)."""
+    global _http_session
+    session = _http_session
+    if session is not None and _client_pid == os.getpid():
+        return session
+    with _client_lock:
+        _reset_clients_after_fork()
+        if _http_session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=8))
+            _http_session = session
+        return _http_session
+
 
-    url = app.config["SUPABASE_URL"]
-    key = app.config["SUPABASE_KEY"]
-    if not url or not key:
+def _upload_object(app: "Flask", key: str, body: Union[bytes, IO[bytes]], content_type: str) -> None:
+    """
+    Obyektni bucketga yozadi (upsert). ``body`` fayl obyekti bo'lsa requests uni
+    bo'laklab o'qiydi va Content-Length ni seek/tell orqali aniqlaydi.
+    """
+    base = (app.config.get("SUPABASE_URL") or "").rstrip("/")
+    api_key = app.config.get("SUPABASE_KEY")
+    if not base or not api_key:
         raise RuntimeError("SUPABASE_URL va SUPABASE_KEY sozlanmagan")
-    return create_client(url, key)
+    bucket = app.config["SUPABASE_STORAGE_BUCKET"]
+    response = _get_http_session().post(
+        f"{base}/storage/v1/object/{quote(bucket)}/{quote(key, safe='/')}",
+        data=body,
+        headers={
+            "Authorization": f"Bearer {api_key}",
+            "apikey": api_key,
+            "Content-Type": content_type,
+            "x-upsert": "true",
+            **({"cache-control": IMMUTABLE_CACHE_CONTROL} if is_content_key(key) else {}),
+        },
+        timeout=float(app.config.get("SUPABASE_TIMEOUT", 60)),
+    )
+    if response.status_code >= 300:
+        raise RuntimeError(f"Supabase upload xatolik ({key}): HTTP {response.status_code} {response.text[:300]}")
@@ -0,0 +1,326 @@
+"""
+Telegram xabarnomalari: outbox jadvali orqali.
+Xabar buyurtma bilan bitta tranzaksiyada ``notification_outbox`` ga yoziladi, fon thread
+uni navbatma-navbat yuboradi: exponential backoff, chat bo'yicha tezlik cheklovi va
+ko'p xabar yig'ilib qolganda bitta digest xabar. Bir vaqtda faqat bitta worker yuboradi
+(``worker_lock``) — tezlik cheklovi worker lar soniga ko'paymaydi.
+"""
+from __future__ import annotations
+
+import os
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, or_
+
+from db import db, worker_lock
+from models import NotificationOutbox
+
+if TYPE_CHECKING:
+    from flask import Flask
+
+TELEGRAM_API_URL = "https://api.telegram.org/bot{token}/sendMessage"
+TELEGRAM_MESSAGE_LIMIT = 4096
+# pg_try_advisory_lock kaliti (migrations.MIGRATION_LOCK_ID dan farqli)
+SENDER_LOCK_ID = 0x46475447
+
+DIGEST_TITLES = {
+    "order": "🛒 Yangi buyurtmalar",
+    "contact": "📧 Yangi aloqa so'rovlari",
+    "custom_order": "🪑 Yangi individual buyurtmalar",
+    "first_visit": "👋 Yangi sayt tashrifchilari",
+}
+DIGEST_SEPARATOR = "\n➖➖➖➖➖\n"
+
+
+def queue_notification(message: str, kind: str = "general") -> NotificationOutbox:
+    """Xabarni outbox ga qo'shadi (commit chaqiruvchida — asosiy yozuv bilan birga)."""
+    row = NotificationOutbox(channel="telegram", kind=kind, message=message)
+    db.session.add(row)
+    return row
+
+
+def _digest_header(title: str, count: int) -> str:
+    return f"<b>{title}: {count} ta</b>\n\n"
+
+
+def build_batches(rows: List[NotificationOutbox], digest_threshold: int) -> List[Tuple[str, List[NotificationOutbox]]]:
+    """
+    Olingan qatorlarni yuboriladigan xabarlarga ajratadi: bir turdagi xabarlar soni
+    ``digest_threshold`` dan kam bo'lsa alohida, aks holda limitga sig'adigan digest bo'laklari.
+    """
+    groups: Dict[str, List[NotificationOutbox]] = {}
+    for row in rows:
+        groups.setdefault(row.kind, []).append(row)
+
+    batches = []
+    for kind, group in groups.items():
+        if digest_threshold <= 0 or len(group) < digest_threshold:
+            batches.extend((row.message, [row]) for row in group)
+            continue
+        title = DIGEST_TITLES.get(kind, "🔔 Yangi xabarlar")
+        chunk: List[NotificationOutbox] = []
+        body = ""
+        for row in group:
+            text = row.message.strip()
+            candidate = f"{body}{DIGEST_SEPARATOR}{text}" if chunk else text
+            if chunk and len(_digest_header(title, len(chunk) + 1)) + len(candidate) > TELEGRAM_MESSAGE_LIMIT:
+                batches.append((_digest_header(title, len(chunk)) + body, chunk))
+                chunk, candidate = [], text
+            chunk.append(row)
+            body = candidate
+        if chunk:
+            batches.append((_digest_header(title, len(chunk)) + body, chunk))
+    batches.sort(key=lambda batch: batch[1][0].id)
+    return batches
+
+
+class TelegramSender:
+    """
+    Outbox ni bo'shatuvchi fon thread (har worker da, lekin yuborish navbati ``worker_lock``
+    bilan — bir vaqtda bitta worker). Qatorlar ``claim_token``/``locked_until`` bilan olinadi —
+    xabar ikki marta yuborilmaydi, worker o'lib qolsa muddat tugagach boshqasi oladi.
+    """
+
+    def __init__(
+        self,
+        timeout: float = 10,
+        poll_interval: float = 30,
+        min_interval: float = 3,
+        batch_size: int = 50,
+        digest_threshold: int = 5,
+        max_attempts: int = 8,
+        backoff_base: float = 30,
+        backoff_max: float = 3600,
+        lease: float = 300,
+    ):
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.min_interval = min_interval
+        self.batch_size = batch_size
+        self.digest_threshold = digest_threshold
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.lease = lease
+        self._app: Optional["Flask"] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._idle = threading.Event()
+        self._next_slot: Dict[str, float] = {}
+        self._session = None
+
+    def _get_session(self):
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+            self._session = session
+        return self._session
+
+    def ensure_running(self, app: "Flask") -> None:
+        """Fon thread ni ishga tushiradi (fork dan keyin ham qayta ko'tariladi)."""
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            return
+        with self._lock:
+            self._app = app
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="telegram-sender", daemon=True)
+                self._thread.start()
+
+    def wake(self, app: "Flask") -> None:
+        """Commit dan keyin chaqiriladi — yangi xabar poll kutmasdan yuboriladi."""
+        self.ensure_running(app)
+        self._wakeup.set()
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            try:
+                self.drain_exclusive()
+            except Exception as e:
+                print(f"Telegram outbox xatolik: {e}")
+            self._idle.set()
+
+    def send(self, token: str, chat_id: str, message: str) -> Tuple[bool, Optional[float], Optional[str], bool]:
+        """Sinxron yuborish: (ok, retry_after, xato, qayta urinish befoyda)."""
+        try:
+            response = self._get_session().post(
+                TELEGRAM_API_URL.format(token=token),
+                data={"chat_id": chat_id, "text": message, "parse_mode": "HTML"},
+                timeout=self.timeout,
+            )
+        except Exception as e:
+            return False, None, str(e), False
+        if response.status_code == 200:
+            return True, None, None, False
+        retry_after = None
+        description = response.text[:500]
+        try:
+            payload = response.json()
+            description = payload.get("description") or description
+            retry_after = (payload.get("parameters") or {}).get("retry_after")
+        except ValueError:
+            pass
+        # 400 — xabarning o'zi noto'g'ri (HTML va h.k.), qayta yuborish foyda bermaydi
+        permanent = response.status_code == 400
+        return False, retry_after, f"HTTP {response.status_code}: {description}", permanent
+
+    def _wait_for_slot(self, chat_id: str) -> None:
+        delay = self._next_slot.get(chat_id, 0) - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _backoff(self, attempts: int, retry_after: Optional[float]) -> float:
+        delay = min(self.backoff_max, self.backoff_base * (2 ** (attempts - 1)))
+        delay += random.uniform(0, delay * 0.1)
+        return max(delay, retry_after or 0)
+
+    def _claim(self) -> List[NotificationOutbox]:
+        now = datetime.utcnow()
+        claimable = (
+            NotificationOutbox.status == "pending",
+            NotificationOutbox.next_attempt_at <= now,
+            or_(NotificationOutbox.locked_until.is_(None), NotificationOutbox.locked_until < now),
+        )
+        ids = [
+            row_id for (row_id,) in db.session.query(NotificationOutbox.id)
+            .filter(*claimable)
+            .order_by(NotificationOutbox.id)
+            .limit(self.batch_size)
+        ]
+        if not ids:
+            db.session.rollback()
+            return []
+        token = uuid.uuid4().hex
+        NotificationOutbox.query.filter(NotificationOutbox.id.in_(ids), *claimable).update(
+            {"claim_token": token, "locked_until": now + timedelta(seconds=self.lease)},
+            synchronize_session=False,
+        )
+        db.session.commit()
+        return NotificationOutbox.query.filter_by(claim_token=token).order_by(NotificationOutbox.id).all()
+
+    def _finish(self, rows: List[NotificationOutbox], ok: bool, retry_after: Optional[float],
+                error: Optional[str], permanent: bool) -> None:
+        now = datetime.utcnow()
+        for row in rows:
+            row.claim_token = None
+            row.locked_until = None
+            if ok:
+                row.status = "sent"
+                row.sent_at = now
+                continue
+            row.attempts = (row.attempts or 0) + 1
+            row.last_error = (error or "")[:1000]
+            if permanent or row.attempts >= self.max_attempts:
+                row.status = "failed"
+            else:
+                row.next_attempt_at = now + timedelta(seconds=self._backoff(row.attempts, retry_after))
+        db.session.commit()
+
+    def _release(self, rows: List[NotificationOutbox]) -> None:
+        for row in rows:
+            row.claim_token = None
+            row.locked_until = None
+        db.session.commit()
+
+    def drain_exclusive(self) -> int:
+        """Qulfni olgan worker outbox ni bo'shatadi; qulf boshqada bo'lsa 0."""
+        with worker_lock(self._app, SENDER_LOCK_ID, "telegram-sender") as acquired:
+            if not acquired:
+                return 0
+            try:
+                with self._app.app_context():
+                    return self.drain()
+            finally:
+                # Qulf oxirgi xabardan keyingi interval (yoki retry_after) o'tguncha ushlanadi —
+                # keyingi worker chat limitini buzmaydi
+                delay = max(self._next_slot.values(), default=0) - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+    def drain(self) -> int:
+        """Muddati kelgan xabarlarni yuboradi (app context ichida). Yuborilgan xabarlar soni."""
+        token = self._app.config.get("TELEGRAM_BOT_TOKEN")
+        chat_id = self._app.config.get("TELEGRAM_CHAT_ID")
+        if not token or not chat_id:
+            return 0
+        chat_id = str(chat_id)
+        sent = 0
+        while True:
+            # Slot kutilayotganda kelgan xabarlar ham shu claim ga tushadi -> digest
+            self._wait_for_slot(chat_id)
+            rows = self._claim()
+            if not rows:
+                return sent
+            batches = build_batches(rows, self.digest_threshold)
+            for index, (text, batch_rows) in enumerate(batches):
+                self._wait_for_slot(chat_id)
+                ok, retry_after, error, permanent = self.send(token, chat_id, text)
+                self._next_slot[chat_id] = time.monotonic() + max(self.min_interval, retry_after or 0)
+                self._finish(batch_rows, ok, retry_after, error, permanent)
+                if ok:
+                    sent += 1
+                    continue
+                print(f"Telegram xabar yuborishda xatolik: {error}")
+                # Telegram yoki tarmoq ishlamayapti — qolganlarini keyingi urinishga qoldiramiz
+                self._release([row for _, rest in batches[index + 1:] for row in rest])
+                return sent
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Outbox dagi muddati kelgan xabarlar yuborilishini kutadi (graceful shutdown)."""
+        if self._app is None or self._thread is None or not self._thread.is_alive():
+            return True
+        self._idle.clear()
+        self._wakeup.set()
+        return self._idle.wait(timeout)
+
+
+def outbox_stats(limit: int = 50) -> dict:
+    """Admin uchun: navbat uzunligi, kechikish va xatolar."""
+    now = datetime.utcnow()
+    pending, oldest = db.session.query(
+        func.count(NotificationOutbox.id), func.min(NotificationOutbox.created_at)
+    ).filter(NotificationOutbox.status == "pending").one()
+    retrying = NotificationOutbox.query.filter(
+        NotificationOutbox.status == "pending", NotificationOutbox.attempts > 0
+    ).count()
+    failed = NotificationOutbox.query.filter_by(status="failed").count()
+    sent_24h = NotificationOutbox.query.filter(
+        NotificationOutbox.status == "sent", NotificationOutbox.sent_at >= now - timedelta(days=1)
+    ).count()
+    problems = (
+        NotificationOutbox.query
+        .filter(or_(NotificationOutbox.status == "failed", NotificationOutbox.attempts > 0))
+        .filter(NotificationOutbox.status != "sent")
+        .order_by(NotificationOutbox.id.desc())
+        .limit(limit)
+        .all()
+    )
+    return {
+        "pending": pending,
+        "retrying": retrying,
+        "failed": failed,
+        "sent_24h": sent_24h,
+        "lag_seconds": int((now - oldest).total_seconds()) if oldest else 0,
+        "problems": problems,
+    }
+
+
+telegram_sender = TelegramSender(
+    timeout=float(os.environ.get("TELEGRAM_TIMEOUT", "10")),
+    poll_interval=float(os.environ.get("TELEGRAM_POLL_INTERVAL", "30")),
+    # Telegram: guruh chatiga daqiqasiga ~20 ta xabar
+    min_interval=float(os.environ.get("TELEGRAM_MIN_INTERVAL", "3")),
+    digest_threshold=int(os.environ.get("TELEGRAM_DIGEST_THRESHOLD", "5")),
+    max_attempts=int(os.environ.get("TELEGRAM_MAX_ATTEMPTS", "8")),
+)
@@ -0,0 +1,130 @@
+"""
+Shablon tarjimalari kompilyatsiya vaqtida: ``{{ T.nav.home[lang] }}`` va ``{{ t('nav.home') }}``
+kabi o'zgarmas kalitli chaqiruvlar har til uchun alohida kompilyatsiya qilingan shablonda
+tayyor matnga (string konstantaga) aylantiriladi — so'rov vaqtida lug'at bo'ylab yurish yo'q.
+"""
+from __future__ import annotations
+
+from typing import Callable, Iterable, Optional
+
+from flask.templating import Environment
+from jinja2.ext import Extension
+from jinja2.lexer import (
+    TOKEN_DOT,
+    TOKEN_LBRACKET,
+    TOKEN_LPAREN,
+    TOKEN_NAME,
+    TOKEN_RBRACKET,
+    TOKEN_RPAREN,
+    TOKEN_STRING,
+    Token,
+)
+
+from translations import CATALOGS
+
+class TranslationExtension(Extension):
+    """O'zgarmas tarjima kalitlarini kompilyatsiya vaqtida joriy til matniga almashtiradi."""
+
+    def filter_stream(self, stream) -> Iterable[Token]:
+        lang = getattr(self.environment, "compile_language", None)
+        catalog = CATALOGS.get(lang) if lang else None
+        if catalog is None:
+            return stream
+        return _rewrite_tokens(list(stream), catalog)
+
+
+def _rewrite_tokens(tokens: list, catalog: dict) -> Iterable[Token]:
+    i = 0
+    n = len(tokens)
+    while i < n:
+        tok = tokens[i]
+        after_dot = i > 0 and tokens[i - 1].type == TOKEN_DOT
+        if tok.type == TOKEN_NAME and not after_dot:
+            matched = None
+            if tok.value == "t":
+                matched = _match_t_call(tokens, i)
+            elif tok.value == "T":
+                matched = _match_t_chain(tokens, i)
+            if matched is not None:
+                key, end = matched
+                if key in catalog:
+                    yield Token(tok.lineno, TOKEN_STRING, catalog[key])
+                    i = end
+                    continue
+        yield tok
+        i += 1
+
+
+def _match_t_call(tokens: list, i: int):
+    """t('nav.home') -> ('nav.home', keyingi token indeksi)."""
+    window = tokens[i + 1:i + 4]
+    if [t.type for t in window] == [TOKEN_LPAREN, TOKEN_STRING, TOKEN_RPAREN]:
+        return window[1].value, i + 4
+    return None
+
+
+def _match_t_chain(tokens: list, i: int):
+    """T.nav.home[lang] -> ('nav.home', keyingi token indeksi)."""
+    parts = []
+    j = i + 1
+    while j + 1 < len(tokens) and tokens[j].type == TOKEN_DOT and tokens[j + 1].type == TOKEN_NAME:
+        parts.append(tokens[j + 1].value)
+        j += 2
+    tail = tokens[j:j + 3]
+    if (
+        parts
+        and [t.type for t in tail] == [TOKEN_LBRACKET, TOKEN_NAME, TOKEN_RBRACKET]
+        and tail[1].value == "lang"
+    ):
+        return ".".join(parts), j + 3
+    return None
+
+
+class TranslatingEnvironment(Environment):
+    """
+    Flask Environment: har til uchun ``overlay()`` — alohida kesh va kompilyatsiya
+    (Jinja ning ichki metodlariga tegmasdan). ``language_getter`` so'rov tilini qaytaradi
+    (so'rov konteksti bo'lmasa None).
+    """
+
+    language_getter: Optional[Callable[[], Optional[str]]] = None
+    # Overlay tili (asosiy muhitda None — tarjimalar runtime da qoladi)
+    compile_language: Optional[str] = None
+
+    def _current_language(self) -> Optional[str]:
+        if self.language_getter is None:
+            return None
+        try:
+            return self.language_getter()
+        except RuntimeError:
+            # So'rov konteksti yo'q (CLI, fon vazifalari)
+            return None
+
+    def _language_environment(self) -> Environment:
+        if self.compile_language is not None:
+            return self  # overlay ichida extends/include ham shu tilda
+        lang = self._current_language()
+        if lang is None or lang not in CATALOGS:
+            return self
+        overlays = self.__dict__.setdefault("_language_overlays", {})
+        env = overlays.get(lang)
+        if env is None:
+            # copy_cache emas — asosiy keshdagi tilsiz kompilyatsiyalar overlay ga o'tmasin
+            capacity = getattr(self.cache, "capacity", 0) if self.cache is not None else 0
+            env = self.overlay(cache_size=capacity)
+            env.compile_language = lang
+            env._language_overlays = None
+            env = overlays.setdefault(lang, env)
+        return env
+
+    def get_template(self, name, parent=None, globals=None):
+        env = self._language_environment()
+        if env is not self:
+            return env.get_template(name, parent, globals)
+        return super().get_template(name, parent, globals)
+
+    def select_template(self, names, parent=None, globals=None):
+        env = self._language_environment()
+        if env is not self:
+            return env.select_template(names, parent, globals)
+        return super().select_template(names, parent, globals)
@@ -0,0 +1,54 @@
+import os
+import sys
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import configure_engines, db  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path):
+    """Vaqtinchalik SQLite bazali minimal ilova (app.py import qilinmaydi — u instance bazaga ulanadi)."""
+    uri = f"sqlite:///{tmp_path / 'test.db'}"
+    app = Flask(__name__, instance_path=str(tmp_path / "instance"))
+    app.config.update(
+        TESTING=True,
+        SECRET_KEY="test",
+        SQLALCHEMY_DATABASE_URI=uri,
+        SQLALCHEMY_BINDS={"read": uri},
+        DB_READ_ROUTING="always",
+        UPLOAD_FOLDER=str(tmp_path / "uploads"),
+    )
+    os.makedirs(app.config["UPLOAD_FOLDER"])
+    db.init_app(app)
+    configure_engines(app)
+    with app.app_context():
+        import models  # noqa: F401 — jadvallar metadata ga
+
+        db.create_all()
+        yield app
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+@pytest.fixture(scope="session")
+def site(tmp_path_factory):
+    """
+    To'liq ilova (app.py) vaqtinchalik SQLite bazada. Config import paytida o'qiladi, shuning uchun
+    muhit o'zgaruvchilari birinchi importdan oldin; import migratsiyalarni shu bazaga qo'llaydi.
+    """
+    root = tmp_path_factory.mktemp("site")
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("USE_SQLITE", "1")
+        mp.setenv("SQLITE_PATH", str(root / "site.db"))
+        mp.setenv("AUTO_MIGRATE", "1")
+        mp.setenv("USE_SUPABASE_STORAGE", "0")
+        mp.setenv("TRANSLATION_PROVIDER", "stub")
+        mp.delenv("TELEGRAM_BOT_TOKEN", raising=False)
+        import app as site_module
+    site_module.app.config.update(TESTING=True)
+    return site_module
@@ -0,0 +1,70 @@
+import io
+import os
+
+import pytest
+
+import chunked_uploads
+from chunked_uploads import ChunkError, claim_upload, finish_upload, start_upload, write_chunk
+from db import db
+from models import ChunkedUpload
+
+DATA = b"\x89PNG" + bytes(range(256)) * 4
+
+
+@pytest.fixture
+def upload(app):
+    app.config["CHUNKED_UPLOAD_CHUNK_MB"] = 1
+    upload = start_upload(app, "portfolio", "rasm.png", len(DATA), "image/png", {"png"})
+    db.session.commit()
+    return upload
+
+
+def _write(app, upload, start, end):
+    return write_chunk(app, upload, start, end - start, io.BytesIO(DATA[start:end]))
+
+
+def test_rejects_bad_session_parameters(app):
+    with pytest.raises(ChunkError):
+        start_upload(app, "../etc", "rasm.png", 10, None, {"png"})
+    with pytest.raises(ChunkError) as e:
+        start_upload(app, "portfolio", "rasm.png", 0, None, {"png"})
+    assert e.value.status == 413
+
+
+def test_out_of_order_chunk_is_409(app, upload):
+    _write(app, upload, 0, 100)
+    with pytest.raises(ChunkError) as e:
+        _write(app, upload, 200, 300)
+    assert e.value.status == 409
+    assert upload.received == 100
+
+
+def test_last_chunk_finishes_and_claims_once(app, upload):
+    _write(app, upload, 0, 500)
+    _write(app, upload, 500, len(DATA))
+    assert upload.status == "complete"
+    with open(os.path.join(app.config["UPLOAD_FOLDER"], upload.key), "rb") as f:
+        assert f.read() == DATA
+    assert not os.path.exists(chunked_uploads._part_path(app, upload))
+    with pytest.raises(ChunkError) as e:
+        _write(app, upload, 0, 10)
+    assert e.value.status == 409
+    assert claim_upload(upload.id, "portfolio") == upload.key
+    assert claim_upload(upload.id, "portfolio") is None
+
+
+def test_failed_save_can_be_finalized_again(app, upload, monkeypatch):
+    def broken(*args):
+        raise OSError("disk to'la")
+
+    real_finish = chunked_uploads._finish
+    monkeypatch.setattr(chunked_uploads, "_finish", broken)
+    with pytest.raises(ChunkError) as e:
+        _write(app, upload, 0, len(DATA))
+    assert e.value.status == 503
+    stored = db.session.get(ChunkedUpload, upload.id)
+    assert stored.status == "uploading" and stored.received == len(DATA)
+
+    monkeypatch.setattr(chunked_uploads, "_finish", real_finish)
+    finish_upload(app, stored)
+    assert stored.status == "complete" and stored.key
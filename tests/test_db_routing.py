@@ -0,0 +1,55 @@
+import sqlalchemy as sa
+
+from db import READ_BIND, db, force_primary, set_replica_reads
+from models import Category
+
+
+def _bind(clause):
+    return db.session().get_bind(mapper=sa.inspect(Category), clause=clause)
+
+
+def test_reads_go_to_read_bind(app):
+    assert _bind(sa.select(Category)) is db.engines[READ_BIND]
+    assert _bind(sa.text("SELECT 1")) is db.engines[READ_BIND]
+
+
+def test_writes_and_locking_reads_go_to_primary(app):
+    assert _bind(sa.update(Category).values(name="x")) is db.engine
+    db.session.rollback()
+    assert _bind(sa.select(Category).with_for_update()) is db.engine
+
+
+def test_primary_after_write_until_transaction_ends(app):
+    db.session.add(Category(name="Stol", name_uz="Stol", slug="stol"))
+    db.session.flush()
+    assert _bind(sa.select(Category)) is db.engine
+    db.session.commit()
+    assert _bind(sa.select(Category)) is db.engines[READ_BIND]
+
+
+def test_request_mode_needs_replica_reads(app):
+    app.config["DB_READ_ROUTING"] = "request"
+    assert _bind(sa.select(Category)) is db.engine
+    set_replica_reads(True)
+    assert _bind(sa.select(Category)) is db.engines[READ_BIND]
+    force_primary(lambda: None)()
+    assert _bind(sa.select(Category)) is db.engine
+
+
+def test_sqlite_connections_use_wal(app):
+    for key, engine in db.engines.items():
+        with engine.connect() as conn:
+            assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+            assert conn.exec_driver_sql("PRAGMA query_only").scalar() == (1 if key == READ_BIND else 0)
+
+
+def test_committed_write_only_after_a_write(app):
+    Category.query.all()
+    db.session.commit()
+    assert db.session().committed_write is False
+    db.session.add(Category(name="Stul", name_uz="Stul", slug="stul"))
+    db.session.rollback()
+    assert db.session().committed_write is False
+    db.session.add(Category(name="Stul", name_uz="Stul", slug="stul"))
+    db.session.commit()
+    assert db.session().committed_write is True
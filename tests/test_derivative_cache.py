@@ -0,0 +1,106 @@
+import os
+import signal
+import time
+
+import pytest
+
+from image_utils import DerivativeCache, ResizeBusy, UnsupportedImage, derivative_cache
+from upload_serving import upload_url
+
+PIL = pytest.importorskip("PIL.Image")
+
+KEY = "products/" + "a" * 32 + ".jpg"
+
+
+def _image(app, key=KEY, size=(800, 600)):
+    path = os.path.join(app.config["UPLOAD_FOLDER"], key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    PIL.new("RGB", size, (200, 120, 40)).save(path, "JPEG")
+    return path
+
+
+@pytest.fixture
+def cache():
+    cache = DerivativeCache(processes=1, max_pending=2, timeout=30)
+    yield cache
+    if cache._pool is not None:
+        cache._pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _wait(predicate, timeout=30):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+
+
+def test_resize_saves_derivative(app, cache):
+    _image(app)
+    dkey = cache.get(app, KEY, 320, "webp", 80)
+    with PIL.open(os.path.join(app.config["UPLOAD_FOLDER"], dkey)) as im:
+        assert im.format == "WEBP" and im.width == 320
+    assert cache.get(app, KEY, 320, "webp", 80) == dkey
+    assert cache._inflight == {}
+
+
+def test_corrupt_source_is_unsupported(app, cache):
+    path = os.path.join(app.config["UPLOAD_FOLDER"], KEY)
+    os.makedirs(os.path.dirname(path))
+    with open(path, "wb") as f:
+        f.write(b"not an image")
+    with pytest.raises(UnsupportedImage):
+        cache.get(app, KEY, 320, "webp", 80)
+    _wait(lambda: cache._inflight == {})
+
+
+def test_missing_source_is_not_found(app, cache):
+    with pytest.raises(FileNotFoundError):
+        cache.get(app, KEY, 320, "webp", 80)
+    assert cache._inflight == {}
+
+
+def test_broken_pool_is_replaced(app, cache):
+    _image(app)
+    cache.get(app, KEY, 320, "webp", 80)
+    pool = cache._pool
+    for pid in list(pool._processes):
+        os.kill(pid, signal.SIGKILL)
+    _wait(lambda: pool._broken)
+
+    with pytest.raises(ResizeBusy):
+        cache.get(app, KEY, 640, "webp", 80)
+    assert cache._pool is None
+    _wait(lambda: cache._inflight == {})
+
+    # Keyingi so'rov yangi pool yaratadi
+    dkey = cache.get(app, KEY, 640, "webp", 80)
+    assert cache._pool is not None and cache._pool is not pool
+    assert os.path.isfile(os.path.join(app.config["UPLOAD_FOLDER"], dkey))
+
+
+def test_timeout_keeps_slot_until_job_finishes(app, cache):
+    _image(app, size=(3000, 2000))
+    cache.timeout = 0.001  # pool ishga tushishining o'zi shundan uzoqroq
+    with pytest.raises(ResizeBusy):
+        cache.get(app, KEY, 320, "png", 80)
+    dkey = cache.derivative_key(app, KEY, 320, "png", 80)
+    assert dkey in cache._inflight
+    _wait(lambda: dkey not in cache._inflight)
+
+
+def test_upload_url_uses_known_derivative_in_bucket(app):
+    app.config.update(
+        USE_SUPABASE_STORAGE=True, SUPABASE_URL="https://sb.test", SUPABASE_STORAGE_BUCKET="media",
+        IMAGE_RESIZE_WIDTHS=(320, 1920),
+    )
+    key = "designs/hero.jpg"
+    assert upload_url(app, key) == "https://sb.test/storage/v1/object/public/media/designs/hero.jpg"
+    # Hali yaratilmagan — /uploads endpointi yaratib, bucketga yo'naltiradi
+    assert upload_url(app, key, w=1920) == "/uploads/designs/hero.jpg?w=1920"
+
+    dkey = derivative_cache.derivative_key(app, key, 1920, "jpeg", 80)
+    derivative_cache._remember(dkey)
+    try:
+        assert upload_url(app, key, w=1920) == f"https://sb.test/storage/v1/object/public/media/{dkey}"
+    finally:
+        derivative_cache._known.pop(dkey, None)
@@ -0,0 +1,57 @@
+import pytest
+from flask import request, url_for
+
+from translations import CATALOGS
+
+
+@pytest.fixture
+def client(site):
+    return site.app.test_client()
+
+
+@pytest.mark.parametrize("prefix, lang", [("", "uz"), ("/ru", "ru"), ("/en", "en")])
+def test_prefix_renders_its_catalog(client, prefix, lang):
+    body = client.get(f"{prefix}/about").get_data(as_text=True)
+    assert f'<html lang="{lang}">' in body
+    assert CATALOGS[lang]["nav.about"] in body
+    for other in {"uz", "ru", "en"} - {lang}:
+        assert CATALOGS[other]["nav.about"] not in body
+
+
+def test_url_for_keeps_prefix(site):
+    with site.app.test_request_context("/ru/about"):
+        site.pull_lang_code(request.url_rule.endpoint, dict(request.view_args))
+        assert url_for("about") == "/ru/about"
+        assert url_for("about", lang_code="en") == "/en/about"
+        assert url_for("about", lang_code="uz") == "/about"
+        # Til neytral yo'llar prefikssiz
+        assert url_for("admin_login") == "/admin/login"
+
+    with site.app.test_request_context("/about"):
+        site.pull_lang_code(request.url_rule.endpoint, dict(request.view_args))
+        assert url_for("about") == "/about"
+
+
+def test_neutral_paths_are_not_prefixed(site, client):
+    prefixed = [rule.rule for rule in site.app.url_map.iter_rules() if rule.rule.startswith("/<lang:lang_code>")]
+    assert "/<lang:lang_code>/about" in prefixed
+    assert not [rule for rule in prefixed if rule.startswith(tuple(f"/<lang:lang_code>{p}" for p in site.LANGUAGE_NEUTRAL_PATHS))]
+
+    assert client.get("/ru/admin/login").status_code == 404
+    assert client.get("/en/uploads/designs/logo.png").status_code == 404
+    assert client.get("/de/about").status_code == 404
+
+
+def test_set_language_follows_local_referer(client):
+    resp = client.get("/set-language/ru", headers={"Referer": "http://localhost/en/about?x=1"})
+    assert resp.status_code == 302
+    assert resp.headers["Location"] == "/ru/about?x=1"
+
+    resp = client.get("/set-language/uz", headers={"Referer": "http://localhost/ru/about"})
+    assert resp.headers["Location"] == "/about"
+
+
+def test_set_language_ignores_foreign_referer(client):
+    resp = client.get("/set-language/en", headers={"Referer": "https://evil.example/phish"})
+    assert resp.status_code == 302
+    assert resp.headers["Location"] == "/en/"
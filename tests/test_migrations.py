@@ -0,0 +1,49 @@
+from db import db
+from migrations import MIGRATIONS, latest_version, migrate, schema_status, schema_version
+from models import Brand, SchemaMigration, Service
+
+
+def _quiet(_message):
+    pass
+
+
+def test_fresh_database_records_every_version(app):
+    db.drop_all()
+    assert schema_version() is None
+
+    applied = migrate(app, log=_quiet)
+    assert [step.version for step in applied] == sorted(MIGRATIONS)
+    assert schema_status() == (latest_version(), latest_version())
+    assert Service.query.count() == 6
+
+
+def test_second_run_is_noop(app):
+    migrate(app, log=_quiet)
+    rows = SchemaMigration.query.count()
+    services = Service.query.count()
+
+    assert migrate(app, log=_quiet) == []
+    assert SchemaMigration.query.count() == rows == len(MIGRATIONS)
+    assert Service.query.count() == services
+
+
+def test_brand_slug_migration_fills_empty_slugs(app):
+    migrate(app, log=_quiet)
+    db.session.add_all([
+        Brand(name="Ikea", name_uz="Ikea", slug="ikea", logo="brands/a.png"),
+        Brand(name="Ikea", name_uz="Ikea", slug=" ", logo="brands/b.png"),
+    ])
+    db.session.commit()
+
+    MIGRATIONS[7].func()
+    db.session.commit()
+    assert sorted(b.slug for b in Brand.query) == ["ikea", "ikea-2"]
+
+
+def test_app_import_migrates_and_startup_check_is_noop(site):
+    with site.app.app_context():
+        assert schema_status() == (latest_version(), latest_version())
+        rows = SchemaMigration.query.count()
+    site.ensure_schema()
+    with site.app.app_context():
+        assert SchemaMigration.query.count() == rows == len(MIGRATIONS)
@@ -0,0 +1,59 @@
+import pytest
+
+from db import db
+from models import Category
+from query_stats import begin_request_queries, endpoint_stats, fingerprint, finish_request_queries, install_query_hooks
+
+
+def test_fingerprint_strips_literals_and_params():
+    assert fingerprint("SELECT a FROM t WHERE name = 'x''y' AND n > 10 AND id = %(pk_1)s AND m = %s") == (
+        "SELECT a FROM t WHERE name = ? AND n > ? AND id = ? AND m = ?"
+    )
+    # Identifikator ichidagi raqamlarga tegilmaydi
+    assert fingerprint("SELECT col1 FROM t2 LIMIT 5") == "SELECT col1 FROM t2 LIMIT ?"
+
+
+def test_fingerprint_collapses_in_lists_and_values():
+    assert fingerprint("SELECT * FROM t WHERE id IN (?, ?, ?)") == fingerprint("SELECT * FROM t WHERE id IN (1)")
+    assert fingerprint("SELECT * FROM t WHERE id IN (%(p_1)s, %(p_2)s)") == "SELECT * FROM t WHERE id IN (?)"
+    assert fingerprint("INSERT INTO t (a, b) VALUES (?, ?), (?, ?), (?, ?)") == "INSERT INTO t (a, b) VALUES (?, ?)"
+    assert fingerprint("SELECT  a\n  FROM t") == "SELECT a FROM t"
+
+
+@pytest.fixture
+def debug_app(app):
+    app.config.update(QUERY_DEBUG=True, QUERY_N1_THRESHOLD=3)
+    install_query_hooks(app)
+    app.before_request(begin_request_queries)
+    app.after_request(lambda response: finish_request_queries(app, response))
+    endpoint_stats.reset()
+
+    @app.route("/one")
+    def one():
+        Category.query.all()
+        return "ok"
+
+    @app.route("/n-plus-one")
+    def n_plus_one():
+        for category_id in range(1, 5):
+            db.session.get(Category, category_id)
+        return "ok"
+
+    yield app
+    endpoint_stats.reset()
+
+
+def test_query_headers_without_n_plus_one(debug_app):
+    response = debug_app.test_client().get("/one")
+    assert response.headers["X-DB-Queries"] == "1"
+    assert float(response.headers["X-DB-Time-Ms"]) >= 0
+    assert "X-DB-N-Plus-One" not in response.headers
+
+
+def test_repeated_shape_flags_n_plus_one(debug_app, capsys):
+    response = debug_app.test_client().get("/n-plus-one")
+    assert response.headers["X-DB-Queries"] == "4"
+    assert response.headers["X-DB-N-Plus-One"] == "1"
+    assert "N+1: GET /n-plus-one — 4 marta" in capsys.readouterr().out
+    row = next(row for row in endpoint_stats.top() if row["endpoint"] == "n_plus_one")
+    assert row["n_plus_one"] == 1 and row["worst_count"] == 4
@@ -0,0 +1,51 @@
+import pytest
+
+from models import Category
+from query_stats import explain, install_query_hooks, slow_queries
+
+
+@pytest.fixture
+def slow_log(app):
+    app.config.update(SLOW_QUERY_MS=0.000001, SLOW_QUERY_TOP=2)
+    install_query_hooks(app)
+    slow_queries.reset()
+
+    @app.route("/categories/<int:category_id>")
+    def category(category_id):
+        Category.query.filter_by(id=category_id).all()
+        return "ok"
+
+    yield app
+    slow_queries.threshold = 0
+    slow_queries.reset()
+
+
+def test_slow_queries_grouped_by_shape_and_endpoint(slow_log):
+    client = slow_log.test_client()
+    client.get("/categories/1")
+    client.get("/categories/2")
+    row = next(row for row in slow_queries.top() if "FROM category" in row["shape"])
+    assert row["count"] == 2
+    assert row["sources"] == [("category", 2)]
+    assert row["ms_max"] >= row["ms_avg"] > 0
+    assert row["explainable"] and row["explain"] is None
+
+
+def test_background_source_and_explain(slow_log):
+    Category.query.filter(Category.slug == "stol").all()
+    row = next(row for row in slow_queries.top() if "FROM category" in row["shape"])
+    assert row["sources"][0][0].startswith("thread:")
+    plan = explain(slow_queries.get(row["id"]))
+    assert "category" in plan.lower()
+    assert slow_queries.get(row["id"])["explain"] == plan
+
+
+def test_explain_refuses_writes(slow_log):
+    assert explain({"sample": "DELETE FROM category", "parameters": ()}).startswith("EXPLAIN faqat SELECT")
+
+
+def test_keeps_only_heaviest_shapes(slow_log):
+    for n in range(10):
+        slow_queries.record(f"SELECT * FROM t{'x' * n}", (), 0.001 * (n + 1), None, False)
+    assert len(slow_queries._shapes) <= 2 * slow_queries.keep
+    assert slow_queries.top(1)[0]["shape"] == "SELECT * FROM t" + "x" * 9
@@ -0,0 +1,81 @@
+import threading
+
+import pytest
+
+import translation_utils
+from db import db
+from models import TranslationMemory
+from translation_utils import (
+    StubTranslationProvider,
+    TranslationProvider,
+    lookup_translation,
+    remember_translation,
+    set_provider,
+    translate_texts,
+)
+
+
+class CountingProvider(StubTranslationProvider):
+    def __init__(self):
+        self.calls = []
+
+    def translate_batch(self, texts, target_lang, source_lang="uz"):
+        self.calls.append(list(texts))
+        return super().translate_batch(texts, target_lang, source_lang)
+
+
+class _NoQuery:
+    def __getattr__(self, name):
+        pytest.fail("DB so'ralmasligi kerak")
+
+
+@pytest.fixture
+def provider(app):
+    translation_utils._memory_cache.clear()
+    provider = CountingProvider()
+    set_provider(provider)
+    yield provider
+    set_provider(None)
+    translation_utils._memory_cache.clear()
+
+
+def test_provider_interface_is_abstract():
+    with pytest.raises(TypeError):
+        TranslationProvider()
+
+
+def test_stub_fills_missing_and_remembers(provider):
+    assert translate_texts(["Stol", "", "Stul", "Stol"], "ru") == ["[ru] Stol", "", "[ru] Stul", "[ru] Stol"]
+    # Takrorlangan matn provayderga bir marta boradi
+    assert provider.calls == [["Stol", "Stul"]]
+    db.session.commit()
+    assert TranslationMemory.query.filter_by(target_lang="ru").count() == 2
+
+
+def test_lru_hit_skips_db_and_provider(provider, monkeypatch):
+    remember_translation("Divan", "uz", "en", "Sofa")
+    monkeypatch.setattr(TranslationMemory, "query", _NoQuery())
+    assert translate_texts(["Divan"], "en") == ["Sofa"]
+    assert provider.calls == []
+
+
+def test_db_memory_hit_after_cache_cleared(provider):
+    remember_translation("Kreslo", "uz", "ru", "Кресло")
+    db.session.commit()
+    translation_utils._memory_cache.clear()
+    assert lookup_translation("Kreslo", "uz", "ru") == "Кресло"
+    assert translate_texts(["Kreslo"], "ru") == ["Кресло"]
+    assert provider.calls == []
+
+
+def test_wait_for_translations_honours_timeout(app, monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(translation_utils, "_run_translation_task", lambda *task: release.wait(5))
+    future = translation_utils._submit_task((app, None, 1, {}, "ru", False))
+    try:
+        assert translation_utils.wait_for_translations(timeout=0.05) is False
+        assert not future.done()
+    finally:
+        release.set()
+    future.result(timeout=5)
+    assert translation_utils._pending == set()
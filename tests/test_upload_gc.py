@@ -0,0 +1,81 @@
+import json
+import os
+import time
+
+import pytest
+
+import upload_gc
+from db import db
+from models import Category, Product, UploadObject
+from upload_gc import collect_garbage, collect_garbage_exclusive
+
+LIVE = "products/" + "a" * 32 + ".jpg"
+ORPHAN = "products/" + "b" * 32 + ".jpg"
+
+
+def _old_file(app, key):
+    path = os.path.join(app.config["UPLOAD_FOLDER"], key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"x")
+    old = time.time() - 3 * 24 * 3600
+    os.utime(path, (old, old))
+    return path
+
+
+@pytest.fixture
+def uploads(app):
+    category = Category(name="Stol", name_uz="Stol", slug="stol")
+    db.session.add(category)
+    db.session.flush()
+    db.session.add(Product(name="P", name_uz="P", price=1, category_id=category.id, images=json.dumps([LIVE])))
+    db.session.add_all([UploadObject(key=LIVE, ref_count=0), UploadObject(key=ORPHAN, ref_count=3)])
+    db.session.commit()
+    return _old_file(app, LIVE), _old_file(app, ORPHAN)
+
+
+def _ref_count(key):
+    db.session.expire_all()
+    return UploadObject.query.filter_by(key=key).one().ref_count
+
+
+def test_reconciles_ref_counts_and_deletes_orphans(app, uploads):
+    live_path, orphan_path = uploads
+    report = collect_garbage(app, grace_hours=1)
+    assert report["refcounts_fixed"] == 2
+    assert _ref_count(LIVE) == 1
+    assert UploadObject.query.filter_by(key=ORPHAN).first() is None
+    assert os.path.exists(live_path) and not os.path.exists(orphan_path)
+
+
+def test_dry_run_changes_nothing(app, uploads):
+    report = collect_garbage(app, grace_hours=1, dry_run=True)
+    assert report["refcounts_fixed"] == 2 and report["orphaned"] == 1
+    assert _ref_count(ORPHAN) == 3
+    assert all(os.path.exists(path) for path in uploads)
+
+
+def test_concurrent_reference_is_not_overwritten(app, uploads, monkeypatch):
+    _, orphan_path = uploads
+    real_referenced_keys = upload_gc.referenced_keys
+
+    def upload_commits_meanwhile():
+        # GC ref_count larni o'qigandan keyin boshqa so'rov ORPHAN ni qayta ishlatdi (dedup)
+        stale = real_referenced_keys()
+        db.session.execute(db.text("UPDATE upload_object SET ref_count = ref_count + 1 WHERE key = :k"), {"k": ORPHAN})
+        db.session.commit()
+        return stale
+
+    monkeypatch.setattr(upload_gc, "referenced_keys", upload_commits_meanwhile)
+    collect_garbage(app, grace_hours=1)
+    assert _ref_count(ORPHAN) == 4
+    assert os.path.exists(orphan_path)
+
+
+def test_exclusive_skips_when_another_worker_runs(app, uploads):
+    from db import worker_lock
+
+    with worker_lock(app, upload_gc.GC_LOCK_ID, "upload-gc") as acquired:
+        assert acquired
+        assert collect_garbage_exclusive(app, grace_hours=1) is None
+    assert collect_garbage_exclusive(app, grace_hours=1)["deleted"] == 1
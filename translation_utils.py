@@ -0,0 +1,415 @@
+"""
+Tarjima xotirasi: (source_hash, source_lang, target_lang) bo'yicha DB jadvali va
+uning oldida jarayon ichidagi LRU kesh. Tashqi tarjima xizmatiga faqat yangi matnlar boradi.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import List, Optional
+
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from db import db
+from models import TranslationMemory
+
+
+def source_hash(text: str) -> str:
+    return hashlib.sha256(text.strip().encode("utf-8")).hexdigest()
+
+
+class _LRUCache:
+    """Oddiy thread-safe LRU (gthread worker lar uchun)."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = max(0, maxsize)
+        self._data: "OrderedDict[tuple, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value: str) -> None:
+        if not self.maxsize:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+_memory_cache = _LRUCache(int(os.environ.get("TRANSLATION_CACHE_SIZE", "2048")))
+
+
+def lookup_translation(text: str, source_lang: str, target_lang: str) -> Optional[str]:
+    """Avval LRU, keyin DB; topilmasa None."""
+    key = (source_hash(text), source_lang, target_lang)
+    cached = _memory_cache.get(key)
+    if cached is not None:
+        return cached
+    try:
+        row = TranslationMemory.query.filter_by(
+            source_hash=key[0], source_lang=source_lang, target_lang=target_lang
+        ).first()
+    except SQLAlchemyError as e:
+        print(f"Translation memory lookup error: {e}")
+        return None
+    if row is None:
+        return None
+    _memory_cache.set(key, row.translated_text)
+    return row.translated_text
+
+
+def remember_translation(text: str, source_lang: str, target_lang: str, translated: str) -> None:
+    """
+    Tarjimani xotiraga yozadi. SAVEPOINT ichida — boshqa worker bir vaqtda yozgan bo'lsa
+    (unique xato) asosiy tranzaksiya buzilmaydi. Commit chaqiruvchi view da.
+    """
+    key = (source_hash(text), source_lang, target_lang)
+    _memory_cache.set(key, translated)
+    try:
+        with db.session.begin_nested():
+            db.session.add(TranslationMemory(
+                source_hash=key[0],
+                source_lang=source_lang,
+                target_lang=target_lang,
+                source_text=text.strip(),
+                translated_text=translated,
+            ))
+    except IntegrityError:
+        pass
+    except SQLAlchemyError as e:
+        print(f"Translation memory save error: {e}")
+
+
+# ============ TARJIMA PROVAYDERLARI ============
+
+class TranslationProvider(ABC):
+    """Tashqi tarjima xizmati interfeysi: xato bo'lsa None qaytaradi."""
+
+    name = "base"
+
+    @abstractmethod
+    def translate(self, text: str, target_lang: str, source_lang: str = "uz") -> Optional[str]:
+        """Bitta matn; xato bo'lsa None."""
+
+    def translate_batch(self, texts: List[str], target_lang: str, source_lang: str = "uz") -> List[Optional[str]]:
+        """Bir nechta matn — bitta til. Standart: har biri alohida."""
+        return [self.translate(text, target_lang, source_lang) for text in texts]
+
+
+class GoogleTranslateProvider(TranslationProvider):
+    """
+    Google Translate (bepul, cheklangan) — translate.googleapis.com.
+    Bitta til uchun barcha maydonlar bitta POST da (translate_a/t, bir nechta q=),
+    ulanishlar keep-alive requests.Session havzasidan.
+    """
+
+    name = "google"
+    url = "https://translate.googleapis.com/translate_a/t"
+
+    def __init__(self, timeout: float = 5):
+        self.timeout = timeout
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    def _get_session(self):
+        with self._session_lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                pool = int(os.environ.get("TRANSLATION_WORKERS", "4"))
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool))
+                session.mount("https://", adapter)
+                session.headers["User-Agent"] = "Mozilla/5.0"
+                self._session = session
+            return self._session
+
+    def translate(self, text, target_lang, source_lang="uz"):
+        return self.translate_batch([text], target_lang, source_lang)[0]
+
+    def translate_batch(self, texts, target_lang, source_lang="uz"):
+        if not texts:
+            return []
+        try:
+            response = self._get_session().post(
+                self.url,
+                params={"client": "gtx", "sl": source_lang, "tl": target_lang, "format": "text"},
+                data=[("q", text) for text in texts],
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+            result = response.json()
+        except Exception as e:
+            print(f"Translation error: {e}")
+            return [None] * len(texts)
+        # Bitta q — satr yoki [satr, til]; bir nechta — ro'yxat
+        if len(texts) == 1 and not (isinstance(result, list) and len(result) == 1):
+            result = [result]
+        if not isinstance(result, list) or len(result) != len(texts):
+            print(f"Translation error: kutilmagan javob shakli ({type(result).__name__})")
+            return [None] * len(texts)
+        return [_translated_item(item) for item in result]
+
+
+def _translated_item(item) -> Optional[str]:
+    """translate_a/t elementi: 'matn' yoki ['matn', 'manba_til']."""
+    if isinstance(item, list):
+        item = item[0] if item else None
+    return item if isinstance(item, str) and item else None
+
+
+class StubTranslationProvider(TranslationProvider):
+    """Oflayn provayder (testlar va lokal ishlab chiqish): '[ru] matn'."""
+
+    name = "stub"
+
+    def translate(self, text, target_lang, source_lang="uz"):
+        return f"[{target_lang}] {text}"
+
+
+PROVIDERS = {
+    GoogleTranslateProvider.name: GoogleTranslateProvider,
+    StubTranslationProvider.name: StubTranslationProvider,
+}
+
+_provider: Optional[TranslationProvider] = None
+
+
+def get_provider() -> TranslationProvider:
+    global _provider
+    if _provider is None:
+        name = (os.environ.get("TRANSLATION_PROVIDER") or "google").strip().lower()
+        _provider = PROVIDERS.get(name, GoogleTranslateProvider)()
+    return _provider
+
+
+def set_provider(provider: Optional[TranslationProvider]) -> None:
+    """Provayderni almashtirish (testlarda StubTranslationProvider)."""
+    global _provider
+    _provider = provider
+
+
+def translate_text(text: str, target_lang: str, source_lang: str = "uz") -> Optional[str]:
+    """Tarjima xotirasi, keyin provayder. Bo'sh matn — o'zi; xato — None."""
+    return translate_texts([text], target_lang, source_lang)[0]
+
+
+def translate_texts(texts: List[str], target_lang: str, source_lang: str = "uz") -> List[Optional[str]]:
+    """
+    Bir nechta matnni bitta tilga: xotirada yo'qlari provayderga bitta batch so'rov
+    bilan yuboriladi, javob maydonlarga qaytib taqsimlanadi.
+    """
+    results: List[Optional[str]] = []
+    missing: List[str] = []
+    for text in texts:
+        if not text or not text.strip():
+            results.append(text)
+            continue
+        cached = lookup_translation(text, source_lang, target_lang)
+        results.append(cached)
+        if cached is None and text not in missing:
+            missing.append(text)
+    if not missing:
+        return results
+
+    fresh = dict(zip(missing, get_provider().translate_batch(missing, target_lang, source_lang)))
+    for text, translated in fresh.items():
+        if translated is not None:
+            remember_translation(text, source_lang, target_lang, translated)
+    return [fresh.get(text) if value is None else value for text, value in zip(texts, results)]
+
+
+# ============ FON TARJIMA NAVBATI ============
+
+TARGET_LANGUAGES = ("ru", "en")
+
+# Admin saqlaganda tarjima qilinadigan maydonlar (asos nomi; manba — <asos>_uz)
+TRANSLATABLE_FIELDS = {
+    "Product": ("name", "description", "material"),
+    "Category": ("name",),
+    "MainCategory": ("name", "description"),
+    "Brand": ("name", "tagline", "description"),
+    "Portfolio": ("title", "description"),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending: set = set()
+# Navbat chegarasi (bajarilayotgan + kutayotgan): to'lsa vazifa chaqiruvchi thread da bajariladi
+_queue_slots = threading.BoundedSemaphore(max(1, int(os.environ.get("TRANSLATION_QUEUE_SIZE", "200"))))
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+
+            workers = int(os.environ.get("TRANSLATION_WORKERS", "4"))
+            _executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="translate")
+        return _executor
+
+
+def _task_done(future) -> None:
+    with _executor_lock:
+        _pending.discard(future)
+    _queue_slots.release()
+
+
+def _submit_task(task, block: bool = False):
+    """Vazifani navbatga qo'yadi; navbat to'la bo'lsa (block=False) shu yerda bajaradi."""
+    if not _queue_slots.acquire(blocking=block):
+        print(f"Tarjima navbati to'la — {task[1].__name__}#{task[2]} -> {task[4]} shu so'rovda bajariladi")
+        return _run_translation_task(*task)
+    try:
+        future = _get_executor().submit(_run_translation_task, *task)
+    except RuntimeError:
+        # Executor yopilgan (shutdown) — shu yerda
+        _queue_slots.release()
+        return _run_translation_task(*task)
+    with _executor_lock:
+        _pending.add(future)
+    future.add_done_callback(_task_done)
+    return future
+
+
+def _column_limit(model, column_name: str) -> Optional[int]:
+    column = model.__table__.columns.get(column_name)
+    return getattr(getattr(column, "type", None), "length", None)
+
+
+def _run_translation_task(app, model, row_id, sources, target_lang, overwrite) -> bool:
+    """
+    Bitta qatorning barcha maydonlari bitta tilga (bitta batch so'rov);
+    natijalar <maydon>_<til> ustunlariga yoziladi.
+    """
+    with app.app_context():
+        try:
+            fields = list(sources)
+            translated = translate_texts([sources[f] for f in fields], target_lang)
+            row = db.session.get(model, row_id)
+            changed = False
+            for field_base, value in zip(fields, translated):
+                target = f"{field_base}_{target_lang}"
+                if value is None or row is None:
+                    continue
+                if (getattr(row, f"{field_base}_uz") or "") != sources[field_base]:
+                    # Keyinroq tahrirlangan — yangi vazifa bajaradi
+                    continue
+                if not overwrite and getattr(row, target):
+                    continue
+                limit = _column_limit(model, target)
+                setattr(row, target, value[:limit] if limit else value)
+                changed = True
+            db.session.commit()
+            return changed
+        except Exception as e:
+            print(f"Background translation error ({model.__name__}#{row_id} -> {target_lang}): {e}")
+            db.session.rollback()
+            return False
+
+
+def _submit(app, tasks):
+    if not app.config.get("TRANSLATION_ASYNC", True):
+        return [_run_translation_task(*task) for task in tasks]
+    return [_submit_task(task) for task in tasks]
+
+
+def enqueue_translations(app, row, fields=None, overwrite=True, targets=TARGET_LANGUAGES):
+    """
+    Commit qilingan qator uchun tarjima vazifalarini navbatga qo'yadi — har til uchun bitta.
+    fields: asos nomlari (default — TRANSLATABLE_FIELDS); overwrite=False — faqat bo'sh ustunlar.
+    TRANSLATION_ASYNC=0 bo'lsa vazifalar shu zahoti bajariladi.
+    """
+    model = type(row)
+    if fields is None:
+        fields = TRANSLATABLE_FIELDS.get(model.__name__, ())
+    tasks = []
+    for target_lang in targets:
+        sources = {}
+        for field_base in fields:
+            source_text = getattr(row, f"{field_base}_uz", None)
+            if not source_text or not source_text.strip():
+                continue
+            if not overwrite and getattr(row, f"{field_base}_{target_lang}", None):
+                continue
+            sources[field_base] = source_text
+        if sources:
+            tasks.append((app, model, row.id, sources, target_lang, overwrite))
+    return _submit(app, tasks)
+
+
+def wait_for_translations(timeout: Optional[float] = None) -> bool:
+    """
+    Navbatdagi vazifalarni ``timeout`` soniyagacha kutadi (shutdown / CLI), keyin boshlanmaganlarini
+    bekor qiladi. Hammasi tugagan bo'lsa True.
+    """
+    from concurrent.futures import wait
+
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+        pending = list(_pending)
+    if executor is None:
+        return True
+    _done, not_done = wait(pending, timeout=timeout)
+    executor.shutdown(wait=False, cancel_futures=True)
+    if not_done:
+        print(f"Tarjima navbati: {len(not_done)} ta vazifa {timeout}s ichida tugamadi — bekor qilindi")
+    return not not_done
+
+
+def backfill_translations(app, models, limit=None, dry_run=False):
+    """
+    ru/en ustunlari bo'sh qatorlarni topib, tarjima qiladi. {model_nomi: vazifalar_soni} qaytaradi.
+    """
+    from concurrent.futures import wait
+
+    report = {}
+    futures = []
+    with app.app_context():
+        for model in models:
+            fields = TRANSLATABLE_FIELDS.get(model.__name__, ())
+            conditions = []
+            for field_base in fields:
+                for target_lang in TARGET_LANGUAGES:
+                    col = getattr(model, f"{field_base}_{target_lang}")
+                    src = getattr(model, f"{field_base}_uz")
+                    conditions.append(db.and_(src.isnot(None), src != "", db.or_(col.is_(None), col == "")))
+            if not conditions:
+                continue
+            query = model.query.filter(db.or_(*conditions)).order_by(model.id)
+            if limit:
+                query = query.limit(limit)
+            rows = query.all()
+            count = 0
+            for row in rows:
+                for target_lang in TARGET_LANGUAGES:
+                    sources = {
+                        f: getattr(row, f"{f}_uz")
+                        for f in fields
+                        if (getattr(row, f"{f}_uz") or "").strip() and not getattr(row, f"{f}_{target_lang}")
+                    }
+                    count += len(sources)
+                    if sources and not dry_run:
+                        # CLI: navbat to'lsa bo'shashini kutadi
+                        futures.append(_submit_task((app, model, row.id, sources, target_lang, False), block=True))
+            report[model.__name__] = count
+    if futures:
+        wait(futures)
+    return report
@@ -258,18 +258,40 @@ TRANSLATIONS = {
     },
 }
 
+LANGUAGES = ('uz', 'ru', 'en')
+
+
+def compile_catalogs(translations, languages=LANGUAGES, fallback='uz'):
+    """
+    Ichma-ich TRANSLATIONS ni har til uchun tekis lug'atga aylantiradi:
+    {'ru': {'nav.home': 'Главная', ...}, ...}. Tarjima yo'q bo'lsa — o'zbekcha matn.
+    """
+    catalogs = {lang: {} for lang in languages}
+
+    def walk(node, prefix):
+        for key, value in node.items():
+            path = f"{prefix}.{key}" if prefix else key
+            if not isinstance(value, dict):
+                continue
+            if value and all(isinstance(v, str) for v in value.values()):
+                for lang in languages:
+                    catalogs[lang][path] = value.get(lang, value.get(fallback, path))
+            else:
+                walk(value, path)
+
+    walk(translations, '')
+    return catalogs
+
+
+# Ishga tushishda bir marta kompilyatsiya qilinadi
+CATALOGS = compile_catalogs(TRANSLATIONS)
+
+
 def get_translation(key_path, lang='uz'):
     """Get translation by dot-separated key path"""
-    keys = key_path.split('.')
-    value = TRANSLATIONS
-    try:
-        for key in keys:
-            value = value[key]
-        return value.get(lang, value.get('uz', key_path))
-    except (KeyError, TypeError):
-        return key_path
+    catalog = CATALOGS.get(lang) or CATALOGS['uz']
+    return catalog.get(key_path, key_path)
 
 def t(key_path, lang='uz'):
     """Shorthand for get_translation"""
     return get_translation(key_path, lang)
-
@@ -0,0 +1,240 @@
+"""
+Ishlatilmay qolgan yuklangan fayllarni tozalash (GC).
+Barcha yozuvlar (mahsulot, kategoriya, brend, portfolio, sozlamalar, buyurtma) dagi kalitlar
+to'planadi, so'ng saqlash joyi oqim bilan ro'yxatlanadi va hech kim ishlatmaydigan,
+``grace_hours`` dan eski fayllar partiyalab o'chiriladi. ``dry_run`` — faqat hisobot.
+Bir vaqtda faqat bitta jarayon (worker yoki CLI) ishlatadi — ``worker_lock``.
+"""
+from __future__ import annotations
+
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, List, Optional
+
+from sqlalchemy import update
+
+from db import db, worker_lock
+from models import (
+    Article, Brand, Category, Client, Collection, ImageAsset, MainCategory, Order, Portfolio,
+    Product, SiteSettings, UploadObject,
+)
+from storage_utils import delete_uploaded_files, is_content_key, list_uploaded_objects
+
+if TYPE_CHECKING:
+    from flask import Flask
+
+# Faqat shu papkalar tekshiriladi (icons/ — sayt dizayni, GC ga tegishli emas)
+GC_FOLDERS = ("products", "categories", "main_categories", "brands", "clients", "portfolio", "designs")
+# designs/ da sayt rasmlari (logo, fonlar) ham bor — ulardan faqat yuklanganlari GC nomzodi
+ASSET_FOLDERS = ("designs",)
+LEGACY_UPLOAD_PREFIXES = ("hero_",)
+# Shablonlarda to'g'ridan-to'g'ri ishlatiladigan fayllar (zaxira rasm)
+PROTECTED_KEYS = frozenset({"products/default.jpg"})
+VARIANT_RE = re.compile(r"^(?P<stem>.+)\.w\d+\.(jpg|png|webp)$")
+REPORT_SAMPLE_SIZE = 50
+# pg_try_advisory_lock kaliti (migratsiya va Telegram qulflaridan farqli)
+GC_LOCK_ID = 0x46474743
+
+
+def _json_list(value) -> list:
+    try:
+        data = json.loads(value) if value else []
+    except (TypeError, ValueError):
+        return []
+    return data if isinstance(data, list) else []
+
+
+def referenced_keys() -> Counter:
+    """Kalit -> uni ishlatayotgan joylar soni (barcha jadvallar bo'yicha)."""
+    refs: Counter = Counter()
+
+    def add(value) -> None:
+        if value and isinstance(value, str) and not value.startswith(("http://", "https://")):
+            refs[value.replace("\\", "/").lstrip("/")] += 1
+
+    for images, colors in db.session.query(Product.images, Product.colors):
+        for key in _json_list(images):
+            add(key)
+        for color in _json_list(colors):
+            if isinstance(color, dict):
+                add(color.get("image"))
+
+    columns = (
+        Category.image, MainCategory.image, Collection.image, Article.image, Brand.logo,
+        Client.photo, Portfolio.before_image, Portfolio.after_image,
+        SiteSettings.hero_background_image, Order.design_image,
+    )
+    for column in columns:
+        for (value,) in db.session.query(column).filter(column.isnot(None)):
+            add(value)
+    return refs
+
+
+def _stem(key: str) -> str:
+    return key.rsplit(".", 1)[0]
+
+
+def _is_candidate(key: str, referenced: Counter, referenced_stems: set) -> bool:
+    if key in referenced or key in PROTECTED_KEYS:
+        return False
+    match = VARIANT_RE.match(key)
+    if match and match.group("stem") in referenced_stems:
+        return False  # ishlatilayotgan rasmning o'lchamli varianti
+    folder, _, name = key.partition("/")
+    if folder in ASSET_FOLDERS:
+        return is_content_key(name) or name.startswith(LEGACY_UPLOAD_PREFIXES)
+    return True
+
+
+def collect_garbage(app: "Flask", grace_hours: float = 24, dry_run: bool = False,
+                    batch_size: int = 100, cache_days: Optional[float] = None) -> dict:
+    """
+    Ishlatilmayotgan fayllarni o'chiradi (app context ichida). ``cache_days`` berilsa
+    ``_cache/`` dagi o'lcham hosilalari ham shuncha kundan eski bo'lsa o'chiriladi
+    (kerak bo'lsa qayta yaratiladi). Hisobot lug'atini qaytaradi.
+    """
+    from image_utils import DERIVATIVE_PREFIX, image_index
+
+    now = datetime.utcnow()
+    grace_cutoff = now - timedelta(hours=grace_hours)
+    cache_cutoff = now - timedelta(days=cache_days) if cache_days else None
+
+    # ref_count lar havolalardan OLDIN o'qiladi: keyin commit qilingan yuklash yoki ref_count ni
+    # o'zgartiradi (pastdagi shartli UPDATE o'tmaydi), yoki havolalar ro'yxatiga tushadi
+    seen = db.session.query(UploadObject.id, UploadObject.key, UploadObject.ref_count).all()
+    db.session.rollback()  # SQLite snapshot yopiladi — havolalar eng yangi holatdan o'qiladi
+    referenced = referenced_keys()
+    referenced_stems = {_stem(key) for key in referenced}
+    report = {
+        "dry_run": dry_run,
+        "scanned": 0,
+        "referenced": len(referenced),
+        "orphaned": 0,
+        "recent": 0,
+        "deleted": 0,
+        "refcounts_fixed": 0,
+        "sample": [],
+    }
+
+    # ref_count ni haqiqiy havolalar bilan tenglashtirish — faqat o'qilganidan beri o'zgarmagan bo'lsa
+    # (compare-and-set: parallel yuklashning oshirishi ustidan yozilmaydi)
+    for obj_id, key, ref_count in seen:
+        actual = referenced.get(key, 0)
+        if ref_count == actual:
+            continue
+        if dry_run:
+            report["refcounts_fixed"] += 1
+            continue
+        result = db.session.execute(
+            update(UploadObject)
+            .where(UploadObject.id == obj_id, UploadObject.ref_count == ref_count)
+            .values(ref_count=actual)
+        )
+        report["refcounts_fixed"] += result.rowcount
+    db.session.commit()
+
+    batch: List[str] = []
+
+    def flush() -> None:
+        # O'chirishdan oldin qayta tekshiruv: GC davomida yangi havola paydo bo'lgan bo'lishi mumkin
+        in_use = {
+            key for (key,) in db.session.query(UploadObject.key)
+            .filter(UploadObject.key.in_(batch), UploadObject.ref_count > 0)
+        }
+        keys = [key for key in batch if key not in in_use]
+        delete_uploaded_files(app, keys)
+        ImageAsset.query.filter(ImageAsset.key.in_(keys)).delete(synchronize_session=False)
+        UploadObject.query.filter(UploadObject.key.in_(keys)).delete(synchronize_session=False)
+        db.session.commit()
+        report["deleted"] += len(keys)
+        batch.clear()
+
+    prefixes = list(GC_FOLDERS) + ([DERIVATIVE_PREFIX] if cache_cutoff else [])
+    for prefix in prefixes:
+        for key, modified in list_uploaded_objects(app, prefix):
+            report["scanned"] += 1
+            if prefix == DERIVATIVE_PREFIX:
+                if modified is None or modified >= cache_cutoff:
+                    continue
+            elif not _is_candidate(key, referenced, referenced_stems):
+                continue
+            elif modified is None or modified >= grace_cutoff:
+                report["recent"] += 1  # yangi yuklangan — hali yozuvga bog'lanmagan bo'lishi mumkin
+                continue
+            report["orphaned"] += 1
+            if len(report["sample"]) < REPORT_SAMPLE_SIZE:
+                report["sample"].append(key)
+            if dry_run:
+                continue
+            batch.append(key)
+            if len(batch) >= batch_size:
+                flush()
+    if batch:
+        flush()
+    if report["deleted"]:
+        image_index.invalidate()
+    if not dry_run:
+        from chunked_uploads import cleanup_stale_uploads
+
+        report["stale_uploads"] = cleanup_stale_uploads(app, max(grace_hours, 1))
+    return report
+
+
+def gc_settings(app: "Flask") -> dict:
+    cache_days = float(app.config.get("UPLOADS_GC_CACHE_DAYS") or 0)
+    return {
+        "grace_hours": float(app.config.get("UPLOADS_GC_GRACE_HOURS", 24)),
+        "batch_size": int(app.config.get("UPLOADS_GC_BATCH_SIZE", 100)),
+        "cache_days": cache_days or None,
+    }
+
+
+def collect_garbage_exclusive(app: "Flask", **options) -> Optional[dict]:
+    """``collect_garbage`` qulf ostida; boshqa jarayon ishlatayotgan bo'lsa None."""
+    with worker_lock(app, GC_LOCK_ID, "upload-gc") as acquired:
+        if not acquired:
+            return None
+        with app.app_context():
+            return collect_garbage(app, **options)
+
+
+class UploadGC:
+    """Har ``UPLOADS_GC_INTERVAL_HOURS`` soatda GC ni ishga tushiradigan fon thread (0 — o'chirilgan)."""
+
+    def __init__(self):
+        self._app: Optional["Flask"] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def ensure_running(self, app: "Flask") -> None:
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            return
+        if float(app.config.get("UPLOADS_GC_INTERVAL_HOURS") or 0) <= 0:
+            return
+        with self._lock:
+            self._app = app
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="upload-gc", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        interval = float(self._app.config["UPLOADS_GC_INTERVAL_HOURS"]) * 3600
+        while True:
+            # Bir nechta worker bir vaqtda boshlamasligi uchun tasodifiy siljish
+            time.sleep(interval * random.uniform(0.9, 1.1))
+            try:
+                report = collect_garbage_exclusive(self._app, **gc_settings(self._app))
+                if report is None:
+                    continue  # boshqa worker hozir tozalayapti
+                print(f"Upload GC: {report['deleted']} ta fayl o'chirildi ({report['scanned']} ta tekshirildi)")
+            except Exception as e:
+                print(f"Upload GC xatolik: {e}")
+
+
+upload_gc = UploadGC()
@@ -0,0 +1,205 @@
+"""
+/uploads fayllarini berish: ETag (kontent kalitida — kalitdagi xesh, boshqalarida mtime/hajm), barmoq izli (fingerprint) URL lar uchun
+``Cache-Control: immutable``, Range (206) va ixtiyoriy ravishda faylni nginx/Apache ga topshirish
+(X-Accel-Redirect / X-Sendfile). Fayl ma'lumotlari xotirada keshlanadi — har rasm uchun stat yo'q.
+Shablon va JSON uchun ``upload_url`` — yakuniy URL render vaqtida: mahalliy fayl bo'lsa
+``/uploads/<key>?v=<versiya>``, aks holda to'g'ridan-to'g'ri Supabase bucket URL (302 siz).
+"""
+from __future__ import annotations
+
+import hashlib
+import mimetypes
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, NamedTuple, Optional
+from urllib.parse import urlencode
+
+from flask import Response, request
+from werkzeug.http import is_resource_modified
+from werkzeug.security import safe_join
+from werkzeug.wsgi import wrap_file
+
+from storage_utils import CONTENT_KEY_RE, is_content_key, public_storage_url
+
+if TYPE_CHECKING:
+    from flask import Flask
+
+mimetypes.add_type("image/webp", ".webp")
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# ?v=<xesh> kamida shuncha belgi bo'lsa barmoq izi hisoblanadi
+MIN_FINGERPRINT_LENGTH = 8
+
+
+class FileInfo(NamedTuple):
+    path: str
+    size: int
+    mtime: float
+    etag: str
+
+
+def _file_etag(path: str, st: os.stat_result) -> str:
+    """
+    Kontent kalitida — kalitdagi xesh (yuklashda hisoblangan), qolganlarida mtime/hajmdan.
+    Fayl o'qilmaydi — shablon render vaqtida ham arzon.
+    """
+    name = os.path.basename(path)
+    if CONTENT_KEY_RE.match(name):
+        return os.path.splitext(name)[0]
+    return hashlib.sha256(f"{st.st_mtime_ns}:{st.st_size}".encode("ascii")).hexdigest()[:32]
+
+
+class _StatCache:
+    """
+    To'liq yo'l -> FileInfo (yoki yo'qligi) ``ttl`` soniya davomida.
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 4096):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: str) -> Optional[FileInfo]:
+        now = time.monotonic()
+        with self._lock:
+            cached = self._data.get(path)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+
+        info = None
+        try:
+            st = os.stat(path)
+        except OSError:
+            st = None
+        if st is not None and os.path.isfile(path):
+            info = FileInfo(path, st.st_size, st.st_mtime, _file_etag(path, st))
+
+        with self._lock:
+            self._data[path] = (now + self.ttl, info)
+            self._data.move_to_end(path)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return info
+
+    def invalidate(self, path: Optional[str] = None) -> None:
+        with self._lock:
+            if path is None:
+                self._data.clear()
+            else:
+                self._data.pop(path, None)
+
+
+stat_cache = _StatCache(ttl=float(os.environ.get("UPLOADS_STAT_TTL", "60")))
+
+
+def upload_info(app: "Flask", key: str) -> Optional[FileInfo]:
+    """Mahalliy fayl ma'lumoti (keshdan); fayl yo'q yoki yo'l xavfli bo'lsa None."""
+    root = os.path.abspath(app.config["UPLOAD_FOLDER"])
+    path = safe_join(root, key)
+    if path is None:
+        return None
+    return stat_cache.get(path)
+
+
+def upload_url(app: "Flask", key: str, **params) -> str:
+    """
+    Brauzer uchun yakuniy URL. ``params`` — ixtiyoriy o'lcham (w, fm, q): ular /uploads endpointida
+    ishlaydi; bucketda nusxa allaqachon yaratilgan bo'lsa (302 siz) to'g'ridan-to'g'ri uning URL i.
+    """
+    if not key:
+        return ""
+    key = str(key).strip()
+    if key.startswith("http://") or key.startswith("https://"):
+        return key
+    key = key.replace("\\", "/").lstrip("/")
+    query = {name: value for name, value in params.items() if value is not None}
+
+    info = upload_info(app, key)
+    if info is not None:
+        if not is_content_key(key):
+            query["v"] = info.etag[:12]
+    elif app.config.get("USE_SUPABASE_STORAGE"):
+        dkey = _known_derivative(app, key, query) if query else key
+        if dkey:
+            return public_storage_url(app, dkey)
+    return f"/uploads/{key}" + (f"?{urlencode(query)}" if query else "")
+
+
+def _known_derivative(app: "Flask", key: str, query: dict) -> Optional[str]:
+    """O'lcham parametrlari uchun bucketdagi tayyor nusxa kaliti; noma'lum bo'lsa None."""
+    from image_utils import derivative_cache, parse_resize_params
+
+    try:
+        params = parse_resize_params(app, key, query)
+    except ValueError:
+        return None
+    if params is None:
+        return None
+    return derivative_cache.known_key(app, key, *params)
+
+
+def is_fingerprinted(key: str, fingerprint: Optional[str], info: FileInfo) -> bool:
+    """URL o'zgarmas kontentga ishora qiladimi (kontent-adresli kalit yoki to'g'ri ?v=)."""
+    from image_utils import DERIVATIVE_PREFIX
+
+    if key.startswith(DERIVATIVE_PREFIX + "/") or is_content_key(key):
+        return True
+    return bool(
+        fingerprint
+        and len(fingerprint) >= MIN_FINGERPRINT_LENGTH
+        and info.etag.startswith(fingerprint)
+    )
+
+
+def serve_upload(app: "Flask", key: str, fingerprint: Optional[str] = None,
+                 immutable: Optional[bool] = None) -> Optional[Response]:
+    """
+    Faylni javob sifatida qaytaradi; mahalliy diskda bo'lmasa None.
+    ``immutable`` berilmasa kalit/``?v=`` bo'yicha aniqlanadi.
+    """
+    info = upload_info(app, key)
+    if info is None:
+        return None
+    if immutable is None:
+        immutable = is_fingerprinted(key, fingerprint, info)
+
+    mimetype = mimetypes.guess_type(info.path)[0] or "application/octet-stream"
+    offload = (app.config.get("UPLOADS_OFFLOAD") or "").lower()
+    last_modified = datetime.fromtimestamp(int(info.mtime), tz=timezone.utc)
+    if not is_resource_modified(request.environ, etag=info.etag, last_modified=last_modified):
+        # 304 — fayl ochilmaydi ham
+        response = Response(status=304, mimetype=mimetype)
+    elif offload in ("nginx", "accel"):
+        response = Response(mimetype=mimetype)
+        prefix = (app.config.get("UPLOADS_ACCEL_PREFIX") or "/_uploads/").rstrip("/")
+        response.headers["X-Accel-Redirect"] = f"{prefix}/{key}"
+    elif offload in ("sendfile", "apache"):
+        response = Response(mimetype=mimetype)
+        response.headers["X-Sendfile"] = info.path
+    else:
+        try:
+            f = open(info.path, "rb")
+        except OSError:
+            # Keshdagi ma'lumot eskirgan (fayl o'chirilgan)
+            stat_cache.invalidate(info.path)
+            return None
+        response = Response(wrap_file(request.environ, f), mimetype=mimetype, direct_passthrough=True)
+        response.content_length = info.size
+
+    response.last_modified = last_modified
+    response.set_etag(info.etag)
+    response.cache_control.public = True
+    if immutable:
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.max_age = int(app.config.get("UPLOADS_MAX_AGE", 86400))
+
+    if response.status_code == 304 or offload:
+        # Range va tanani proksi beradi
+        return response
+    return response.make_conditional(request.environ, accept_ranges=True, complete_length=info.size)